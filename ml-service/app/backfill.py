@@ -0,0 +1,325 @@
+"""
+Bulk classification of exported journal rows into ai_themes / ai_sentiment values
+Run from ml-service/: python -m app.backfill --input entries.jsonl --output labels.jsonl
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from app.models.linear_classifier import LinearClassifier, read_jsonl, record_text
+from app.models.ollama_classifier import OllamaClassifier, parse_keep_alive
+from app.utils.circuit_breaker import CircuitBreaker
+
+MODES = ('keyword', 'linear', 'ollama')
+
+OUTPUT_FIELDS = ('id', 'ai_themes', 'ai_sentiment', 'degraded')
+
+# Seconds between progress line updates
+PROGRESS_INTERVAL = 1.0
+
+# Classifier of this worker process, built once by _init_worker
+_worker_classifier: Optional[OllamaClassifier] = None
+
+
+def read_rows(path: str) -> Iterator[Dict[str, any]]:
+    """Stream rows of a .csv export, or of any other file as JSONL"""
+    if not path.endswith('.csv'):
+        yield from read_jsonl(path)
+        return
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def count_rows(path: str) -> int:
+    return sum(1 for _ in read_rows(path))
+
+
+def build_classifier(mode: str, linear_model_path: Optional[str] = None) -> OllamaClassifier:
+    """
+    Classifier for one backfill mode, configured like the service from OLLAMA_* variables
+
+    Results are not cached: a backfill sees each entry once, and several processes
+    writing one SQLite cache would only contend on it.
+    """
+    linear_model = None
+    if mode == 'linear':
+        path = linear_model_path or os.getenv('LINEAR_MODEL_PATH')
+        if not path:
+            raise ValueError("linear mode needs --linear-model or LINEAR_MODEL_PATH")
+        linear_model = LinearClassifier.load(path)
+
+    return OllamaClassifier(
+        model_name=os.getenv('OLLAMA_MODEL', 'llama3.2'),
+        use_ollama=mode == 'ollama',
+        max_concurrency=int(os.getenv('OLLAMA_MAX_CONCURRENCY', 4)),
+        request_timeout=float(os.getenv('OLLAMA_REQUEST_TIMEOUT', 20)),
+        linear_model=linear_model,
+        host=os.getenv('OLLAMA_HOST') or None,
+        keep_alive=parse_keep_alive(os.getenv('OLLAMA_KEEP_ALIVE')),
+        max_entry_tokens=int(os.getenv('OLLAMA_MAX_ENTRY_TOKENS', 1024)),
+        max_chunks=int(os.getenv('OLLAMA_MAX_CHUNKS', 4)),
+        breaker=CircuitBreaker.from_env('ollama')
+    )
+
+
+def _init_worker(mode: str, linear_model_path: Optional[str]):
+    global _worker_classifier
+    _worker_classifier = build_classifier(mode, linear_model_path)
+
+
+def _classify(texts: List[str], top_k: int):
+    """Worker task: (analysis, fell_back) for each text"""
+    return asyncio.run(_worker_classifier.analyze_grouped_async(texts, top_k))
+
+
+class Checkpoint:
+    def __init__(self, path: str):
+        """
+        Rows of the input already written, and the output size at that point
+
+        Args:
+            path: JSON file rewritten atomically after every written batch
+        """
+        self.path = path
+
+    def load(self) -> Dict[str, int]:
+        if not os.path.exists(self.path):
+            return {'rows': 0, 'output_bytes': 0}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, rows: int, output_bytes: int):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'rows': rows, 'output_bytes': output_bytes}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ResultWriter:
+    def __init__(self, path: str, resume_bytes: int = 0):
+        """
+        Append results to a .csv file, or to any other file as JSONL
+
+        Args:
+            path: Output file
+            resume_bytes: Size of the output at the checkpoint; anything after it
+                was written past the checkpoint and is cut off. 0 starts a new file.
+        """
+        self.csv = path.endswith('.csv')
+        if resume_bytes:
+            self.file = open(path, 'r+', newline='', encoding='utf-8')
+            self.file.truncate(resume_bytes)
+            self.file.seek(resume_bytes)
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+
+        if self.csv:
+            self.writer = csv.writer(self.file)
+            if not resume_bytes:
+                self.writer.writerow(OUTPUT_FIELDS)
+
+    def write(self, entry_id, result: Dict[str, any], fell_back: bool):
+        themes = [item['theme'] for item in result['themes']]
+        if self.csv:
+            self.writer.writerow((entry_id, json.dumps(themes), result['sentiment'], fell_back))
+        else:
+            self.file.write(json.dumps({
+                'id': entry_id,
+                'ai_themes': themes,
+                'ai_sentiment': result['sentiment'],
+                'degraded': fell_back
+            }) + '\n')
+
+    def flush(self) -> int:
+        """Flush to disk and return the output size"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class Progress:
+    def __init__(self, total: Optional[int], done: int = 0, stream=sys.stderr):
+        """
+        Single-line rows / throughput / ETA display
+
+        Args:
+            total: Input rows, or None when unknown
+            done: Rows already done before this run (resume)
+            stream: Where the line is written
+        """
+        self.total = total
+        self.done = done
+        self.stream = stream
+        self._start_done = done
+        self._start = time.monotonic()
+        self._last_shown = 0.0
+
+    def update(self, rows: int, force: bool = False):
+        self.done += rows
+        now = time.monotonic()
+        if not force and now - self._last_shown < PROGRESS_INTERVAL:
+            return
+        self._last_shown = now
+
+        elapsed = now - self._start
+        rate = (self.done - self._start_done) / elapsed if elapsed > 0 else 0.0
+        line = f"{self.done:,} rows"
+        if self.total:
+            line += f" / {self.total:,} ({self.done / self.total:.1%})"
+        line += f" | {rate:,.0f} rows/s"
+        if self.total and rate > 0:
+            line += f" | ETA {_format_duration((self.total - self.done) / rate)}"
+        self.stream.write('\r' + line.ljust(79))
+        self.stream.flush()
+
+    def finish(self):
+        self.update(0, force=True)
+        self.stream.write('\n')
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def _batches(rows: Iterator[Dict[str, any]], batch_size: int):
+    """Yield (input rows consumed, ids, texts); rows without text are consumed but not classified"""
+    consumed, ids, texts = 0, [], []
+    for row in rows:
+        consumed += 1
+        text = record_text(row)
+        if text:
+            ids.append(row.get('id'))
+            texts.append(text)
+        if len(texts) == batch_size:
+            yield consumed, ids, texts
+            consumed, ids, texts = 0, [], []
+    if consumed:
+        yield consumed, ids, texts
+
+
+def backfill(input_path: str, output_path: str, mode: str = 'keyword', workers: int = 1,
+             batch_size: int = 256, top_k: int = 3, checkpoint_path: Optional[str] = None,
+             resume: bool = False, linear_model_path: Optional[str] = None,
+             show_progress: bool = True) -> Dict[str, int]:
+    """
+    Classify every row of an export and stream the results to output_path
+
+    Batches are classified in a process pool; at most two batches per worker
+    are in flight, and results are written in input order, so memory stays
+    bounded by the batch size whatever the input size. After each written batch
+    the checkpoint records how many input rows are done.
+
+    Args:
+        input_path: JSONL or .csv export with id and content (or text) fields
+        output_path: JSONL or .csv file of id, ai_themes, ai_sentiment, degraded
+        mode: 'keyword', 'linear' or 'ollama'
+        workers: Worker processes
+        batch_size: Entries per classifier call
+        top_k: Themes per entry
+        checkpoint_path: Checkpoint file (default: output_path + '.checkpoint')
+        resume: Continue from the checkpoint instead of starting over
+        linear_model_path: Artifact for linear mode (default: LINEAR_MODEL_PATH)
+        show_progress: Write a progress line to stderr
+
+    Returns:
+        Counts of input rows, classified entries and degraded entries in this run
+    """
+    checkpoint = Checkpoint(checkpoint_path or output_path + '.checkpoint')
+    state = checkpoint.load() if resume else {'rows': 0, 'output_bytes': 0}
+    if resume and state['rows'] and not os.path.exists(output_path):
+        raise FileNotFoundError(f"Checkpoint is at row {state['rows']} but {output_path} is missing")
+
+    rows = read_rows(input_path)
+    for _ in range(state['rows']):
+        next(rows, None)
+
+    writer = ResultWriter(output_path, state['output_bytes'])
+    progress = Progress(count_rows(input_path), state['rows']) if show_progress else None
+    done = state['rows']
+    stats = {'rows': 0, 'classified': 0, 'degraded': 0}
+
+    def write_batch(consumed, ids, future):
+        nonlocal done
+        answers = future.result() if future is not None else []
+        for entry_id, (result, fell_back) in zip(ids, answers):
+            writer.write(entry_id, result, fell_back)
+            stats['degraded'] += fell_back
+        done += consumed
+        stats['rows'] += consumed
+        stats['classified'] += len(ids)
+        checkpoint.save(done, writer.flush())
+        if progress is not None:
+            progress.update(consumed)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(mode, linear_model_path))
+    pending = deque()
+    try:
+        for consumed, ids, texts in _batches(rows, batch_size):
+            pending.append((consumed, ids, pool.submit(_classify, texts, top_k) if texts else None))
+            if len(pending) >= 2 * workers:
+                write_batch(*pending.popleft())
+        while pending:
+            write_batch(*pending.popleft())
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+        if progress is not None:
+            progress.finish()
+
+    checkpoint.clear()
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Classify an export of journal rows in bulk')
+    parser.add_argument('--input', required=True, help='JSONL or .csv with id and content (or text)')
+    parser.add_argument('--output', required=True, help='JSONL or .csv of id, ai_themes, ai_sentiment')
+    parser.add_argument('--mode', choices=MODES,
+                        default='ollama' if os.getenv('USE_OLLAMA', 'false').lower() in ('1', 'true', 'yes')
+                        else 'linear' if os.getenv('LINEAR_MODEL_PATH') else 'keyword',
+                        help='Classifier tier (default: as the service is configured)')
+    parser.add_argument('--linear-model', help='Linear artifact (default: LINEAR_MODEL_PATH)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--batch-size', type=int, default=256, help='Entries per classifier call')
+    parser.add_argument('--top-k', type=int, default=3, help='Themes per entry')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: OUTPUT.checkpoint)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the checkpoint')
+    parser.add_argument('--no-progress', action='store_true', help='Do not show the progress line')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.monotonic()
+    try:
+        stats = backfill(args.input, args.output, args.mode, workers=args.workers,
+                         batch_size=args.batch_size, top_k=args.top_k,
+                         checkpoint_path=args.checkpoint, resume=args.resume,
+                         linear_model_path=args.linear_model, show_progress=not args.no_progress)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun with --resume to continue from the last checkpoint", file=sys.stderr)
+        sys.exit(130)
+
+    print(f"Classified {stats['classified']} entries from {stats['rows']} rows in "
+          f"{time.monotonic() - start:.1f}s ({stats['degraded']} fell back to keywords)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark harness for the ML service
+Run from ml-service/: python -m app.bench --sizes 100 1000 --output bench_results.json
+"""
+import argparse
+import json
+
+from app.bench.runner import SUITES, compare, run
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the journal ML service')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000],
+                        help='Corpus sizes (number of entries)')
+    parser.add_argument('--suites', nargs='+', default=list(SUITES), choices=list(SUITES),
+                        help='Suites to run (default: all)')
+    parser.add_argument('--seed', type=int, default=42, help='Corpus random seed')
+    parser.add_argument('--min-words', type=int, default=40, help='Minimum words per entry')
+    parser.add_argument('--max-words', type=int, default=200, help='Maximum words per entry')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='Timed runs for whole-corpus suites')
+    parser.add_argument('--ollama-latency', type=float, default=0.05,
+                        help='Seconds per stub Ollama generate call')
+    parser.add_argument('--ollama-jitter', type=float, default=0.0,
+                        help='Extra random stub latency, in seconds')
+    parser.add_argument('--ollama-concurrency', type=int, default=4,
+                        help='Concurrent Ollama requests for the ollama suite')
+    parser.add_argument('--ollama-max-entries', type=int, default=200,
+                        help='Cap on entries sent through the ollama suite')
+    parser.add_argument('--ollama-prompt-token-time', type=float, default=0.001,
+                        help='Stub seconds per uncached prompt token, for the prompt_eval suite')
+    parser.add_argument('--output', default='bench_results.json', help='JSON results file')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run(args)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
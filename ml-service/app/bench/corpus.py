@@ -0,0 +1,68 @@
+"""
+Seeded synthetic journal corpora for benchmarks
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+# Sentence pool in the style of mobile-app/scripts/generateTestData.js, mixing
+# entries that hit the classifier keywords with plain filler
+SENTENCES = [
+    "Today was an amazing day and I woke up feeling refreshed.",
+    "Reflecting on my journey so far, I realize how much I've grown.",
+    "Sometimes the smallest moments bring the greatest joy.",
+    "I'm grateful for the people in my life who support me.",
+    "Today I learned something new about myself.",
+    "The weather matched my mood, so I sat with a warm cup of tea.",
+    "I accomplished something I've been putting off for weeks.",
+    "I faced a challenge at work and I'm proud of how I handled it.",
+    "This evening I took time to think about my goals and dreams.",
+    "I made progress on my project and the meeting went well.",
+    "I spent quality time with family and friends.",
+    "Work was hard and the deadline left me stressed and anxious.",
+    "I feel frustrated that the same problem keeps coming back.",
+    "Went for a run in the morning, then a long workout at the gym.",
+    "I didn't sleep well and my whole day felt heavy.",
+    "I want to plan the next few months and hope the future is bright.",
+    "Played some music and sketched a design idea for the living room.",
+    "My colleague and I finally finished the report.",
+    "I had a sad conversation that left me upset for hours.",
+    "Cooked dinner, cleaned the kitchen and watched a show.",
+    "The commute was long and the train was late again.",
+    "Nothing special happened, just errands and emails.",
+    "I called my mom and we talked about the holidays.",
+    "I keep thinking about whether I should change careers.",
+]
+
+
+def generate_entries(count: int, min_words: int = 40, max_words: int = 200,
+                     seed: int = 42, days: int = 365) -> List[Dict[str, str]]:
+    """
+    Generate journal entries shaped like the rows the backend sends
+
+    Args:
+        count: Number of entries
+        min_words: Minimum words per entry
+        max_words: Maximum words per entry
+        seed: Random seed, so the same arguments always give the same corpus
+        days: Span of created_at dates, oldest first
+
+    Returns:
+        List of {'id', 'content', 'created_at'} dicts in ascending date order
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc) - timedelta(days=days)
+    offsets = sorted(rng.uniform(0, days * 86400) for _ in range(count))
+
+    entries = []
+    for index, offset in enumerate(offsets):
+        target = rng.randint(min_words, max_words)
+        words = []
+        while len(words) < target:
+            words.extend(rng.choice(SENTENCES).split())
+        entries.append({
+            'id': str(index),
+            'content': ' '.join(words[:target]),
+            'created_at': (start + timedelta(seconds=offset)).isoformat().replace('+00:00', 'Z')
+        })
+    return entries
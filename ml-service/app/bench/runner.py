@@ -0,0 +1,397 @@
+"""
+Benchmark suites and measurement helpers for the ML service
+"""
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.bench.corpus import generate_entries
+from app.bench.stub_ollama import StubOllamaServer
+
+SUITES: Dict[str, Callable] = {}
+
+# Synthetic prompts per corpus entry in the prompt_library suite
+PROMPTS_PER_ENTRY = 10
+
+# One corpus entry in this many gets an edited copy in the near_duplicates suite
+DUPLICATE_EVERY = 4
+
+
+def suite(name: str):
+    """Register a benchmark suite under name"""
+    def register(fn):
+        SUITES[name] = fn
+        return fn
+    return register
+
+
+def measure(fn: Callable, iterations: int, items_per_call: int = 1, warmup: int = 1) -> Dict[str, float]:
+    """
+    Time repeated calls of fn
+
+    Args:
+        fn: Zero-argument callable to benchmark
+        iterations: Number of timed calls
+        items_per_call: Entries processed by one call, for throughput
+        warmup: Untimed calls made first
+
+    Returns:
+        Latency percentiles (ms), throughput (entries/s) and peak traced memory (KiB)
+    """
+    for _ in range(warmup):
+        fn()
+
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - start
+
+    # Memory is traced in a separate call: tracemalloc slows everything it watches
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        'iterations': iterations,
+        'items_per_call': items_per_call,
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(latencies.mean() * 1000), 4),
+        'throughput_per_s': round(items_per_call * iterations / float(latencies.sum()), 1),
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def per_entry_calls(fn: Callable, texts: List[str]) -> Callable:
+    """Cycle fn over the corpus one entry per call"""
+    position = [0]
+
+    def call():
+        fn(texts[position[0] % len(texts)])
+        position[0] += 1
+    return call
+
+
+@suite('fast_sentiment')
+def bench_fast_sentiment(entries, args):
+    from app.models.ollama_classifier import OllamaClassifier
+    classifier = OllamaClassifier()
+    texts = [entry['content'] for entry in entries]
+    return measure(per_entry_calls(classifier._fast_sentiment, texts), iterations=len(texts))
+
+
+@suite('fallback_themes')
+def bench_fallback_themes(entries, args):
+    from app.models.ollama_classifier import OllamaClassifier
+    classifier = OllamaClassifier()
+    texts = [entry['content'] for entry in entries]
+    return measure(per_entry_calls(classifier._fallback_themes, texts), iterations=len(texts))
+
+
+@suite('analyze_batch')
+def bench_analyze_batch(entries, args):
+    from app.models.ollama_classifier import OllamaClassifier
+    classifier = OllamaClassifier()
+    texts = [entry['content'] for entry in entries]
+    return measure(lambda: classifier.analyze_batch(texts), iterations=args.repeats,
+                   items_per_call=len(texts))
+
+
+@suite('linear')
+def bench_linear(entries, args):
+    from app.models.linear_classifier import LinearClassifier
+    from app.models.ollama_classifier import OllamaClassifier
+    keyword = OllamaClassifier()
+    texts = [entry['content'] for entry in entries]
+    # Keyword labels stand in for distilled Ollama labels; only speed is measured here
+    records = [{'content': text, **result} for text, result in zip(texts, keyword.analyze_batch(texts))]
+    model = LinearClassifier.train(records, keyword.themes)
+    return measure(lambda: model.analyze_batch(texts), iterations=args.repeats,
+                   items_per_call=len(texts))
+
+
+@suite('parse')
+def bench_parse(entries, args):
+    from app.schemas import AnalyzeHistoryRequest
+    body = json.dumps({'entries': entries}).encode('utf-8')
+    # What FastAPI does for a model body parameter
+    return measure(lambda: AnalyzeHistoryRequest.model_validate(json.loads(body)),
+                   iterations=args.repeats, items_per_call=len(entries))
+
+
+@suite('parse_dict')
+def bench_parse_dict(entries, args):
+    body = json.dumps({'entries': entries}).encode('utf-8')
+
+    # The untyped baseline 'parse' is compared against: a dict body walked with .get
+    def parse():
+        request = json.loads(body)
+        return [(entry.get('id'), entry.get('content', ''), entry.get('created_at', ''))
+                for entry in request.get('entries', [])]
+
+    return measure(parse, iterations=args.repeats, items_per_call=len(entries))
+
+
+@suite('aggregate')
+def bench_aggregate(entries, args):
+    from app.models.ollama_classifier import OllamaClassifier
+    from app.utils.aggregation import HistoryAggregator
+    results = OllamaClassifier().analyze_batch([entry['content'] for entry in entries])
+
+    def aggregate():
+        aggregator = HistoryAggregator(len(entries))
+        for index, (entry, result) in enumerate(zip(entries, results)):
+            aggregator.add(index, entry['created_at'], result['themes'], result['sentiment'])
+        return aggregator.result()
+
+    return measure(aggregate, iterations=args.repeats, items_per_call=len(entries))
+
+
+def classified_aggregator(entries):
+    """HistoryAggregator fed with keyword classifications of the corpus"""
+    from app.models.ollama_classifier import OllamaClassifier
+    from app.utils.aggregation import HistoryAggregator
+    results = OllamaClassifier().analyze_batch([entry['content'] for entry in entries])
+    aggregator = HistoryAggregator(len(entries))
+    for index, (entry, result) in enumerate(zip(entries, results)):
+        aggregator.add(index, entry['created_at'], result['themes'], result['sentiment'])
+    return aggregator
+
+
+@suite('trend_loops')
+def bench_trend_loops(entries, args):
+    from collections import Counter
+    from app.utils.aggregation import summarize_sentiments
+    from app.utils.analytics import compare_halves
+    aggregator = classified_aggregator(entries)
+    timeline = [aggregator.timeline[i] for i in np.argsort(aggregator.indexes, kind='stable').tolist()]
+    observations = {}
+    for entry, theme_id, confidence in zip(aggregator.observation_entries, aggregator.observation_themes,
+                                           aggregator.observation_confidences):
+        observations.setdefault(theme_id, []).append((aggregator.indexes[entry], confidence))
+
+    # The per-theme and list-of-dicts loops over the timeline that the columnar
+    # summary replaced, for comparison with the summary suite
+    def trends():
+        for theme_observations in observations.values():
+            ordered = sorted(theme_observations, key=lambda o: o[0])
+            if len(ordered) >= 3:
+                mid = len(ordered) // 2
+                compare_halves(sum(c for _, c in ordered[:mid]) / mid,
+                               sum(c for _, c in ordered[mid:]) / (len(ordered) - mid))
+        positive = sum(1 for item in timeline if item['sentiment'] == 'positive')
+        negative = sum(1 for item in timeline if item['sentiment'] == 'negative')
+        summarize_sentiments(len(timeline), positive, negative, timeline[-10:])
+        unique_themes = set()
+        for item in timeline:
+            unique_themes.update(item['themes'])
+        Counter(theme for item in timeline[-5:] for theme in item['themes']).most_common(1)
+
+    return measure(trends, iterations=args.repeats, items_per_call=len(entries))
+
+
+@suite('summary')
+def bench_summary(entries, args):
+    aggregator = classified_aggregator(entries)
+    # The default analysis block from already classified entries, dates parsed included
+    return measure(aggregator.result, iterations=args.repeats, items_per_call=len(entries))
+
+
+@suite('trend_analytics')
+def bench_trend_analytics(entries, args):
+    from app.utils.analytics import time_analytics
+    aggregator = classified_aggregator(entries)
+    # Includes building the columns and parsing every date
+    return measure(lambda: time_analytics(aggregator.columns()), iterations=args.repeats,
+                   items_per_call=len(entries))
+
+
+@suite('pipeline')
+def bench_pipeline(entries, args):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    body = json.dumps({'entries': entries}).encode('utf-8')
+
+    with TestClient(app) as client:
+        def post():
+            response = client.post('/api/analyze-user-history', content=body,
+                                   headers={'Content-Type': 'application/json'})
+            response.raise_for_status()
+
+        return measure(post, iterations=args.repeats, items_per_call=len(entries))
+
+
+@suite('approximate_pipeline')
+def bench_approximate_pipeline(entries, args):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    body = json.dumps({'entries': entries, 'approximate': True}).encode('utf-8')
+
+    with TestClient(app) as client:
+        def post():
+            response = client.post('/api/analyze-user-history', content=body,
+                                   headers={'Content-Type': 'application/json'})
+            response.raise_for_status()
+            return response.json()
+
+        metrics = measure(post, iterations=args.repeats, items_per_call=len(entries))
+        metrics['sampled_entries'] = post()['sampled_entries']
+        return metrics
+
+
+@suite('near_duplicates')
+def bench_near_duplicates(entries, args):
+    from app.utils.dedup import near_duplicate_groups
+    rng = np.random.default_rng(args.seed)
+
+    # One entry in DUPLICATE_EVERY is re-saved with a dated prefix and a short edit
+    texts = [entry['content'] for entry in entries]
+    for i in rng.permutation(len(texts))[:len(texts) // DUPLICATE_EVERY].tolist():
+        texts.append(f"Day {i}: {texts[i]} Edit: fixed a typo.")
+
+    metrics = measure(lambda: near_duplicate_groups(texts, 0.8), iterations=args.repeats,
+                      items_per_call=len(texts))
+    metrics['classifications_saved'] = len(texts) - len(np.unique(near_duplicate_groups(texts, 0.8)))
+    return metrics
+
+
+@suite('prompt_library')
+def bench_prompt_library(entries, args):
+    import tempfile
+    from app.models.ollama_classifier import THEME_KEYWORDS
+    from app.utils.prompts import PromptLibrary
+    themes = list(THEME_KEYWORDS)
+    rng = np.random.default_rng(args.seed)
+
+    # PROMPTS_PER_ENTRY prompts per corpus entry, each tagged with one to three themes
+    library = {theme: [] for theme in themes}
+    for i in range(len(entries) * PROMPTS_PER_ENTRY):
+        tagged = rng.choice(themes, size=int(rng.integers(1, 4)), replace=False).tolist()
+        library[tagged[0]].append({'text': f"Prompt {i}: {entries[i % len(entries)]['content'][:80]}",
+                                   'themes': {theme: round(float(rng.random()), 2) for theme in tagged[1:]}})
+    users = [dict(zip(themes, rng.dirichlet(np.ones(len(themes))).tolist())) for _ in range(64)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'prompts.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(library, f)
+
+        start = time.perf_counter()
+        prompt_library = PromptLibrary(themes, path)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        position = [0]
+
+        def suggest():
+            prompt_library.suggest(users[position[0] % len(users)], limit=3)
+            position[0] += 1
+
+        metrics = measure(suggest, iterations=max(args.repeats, 200))
+        metrics['prompts'] = len(prompt_library.index.texts)
+        metrics['index_build_ms'] = round(build_ms, 1)
+        return metrics
+
+
+@suite('ollama')
+def bench_ollama(entries, args):
+    from app.models.ollama_classifier import OllamaClassifier
+    entries = entries[:args.ollama_max_entries]
+    texts = [entry['content'] for entry in entries]
+
+    with StubOllamaServer(latency=args.ollama_latency, jitter=args.ollama_jitter) as stub:
+        previous_host = os.environ.get('OLLAMA_HOST')
+        os.environ['OLLAMA_HOST'] = stub.url
+        try:
+            classifier = OllamaClassifier(use_ollama=True, max_concurrency=args.ollama_concurrency)
+            metrics = measure(lambda: asyncio.run(classifier.analyze_batch_async(texts)),
+                              iterations=args.repeats, items_per_call=len(texts), warmup=0)
+        finally:
+            if previous_host is None:
+                os.environ.pop('OLLAMA_HOST', None)
+            else:
+                os.environ['OLLAMA_HOST'] = previous_host
+
+        metrics['stub_requests'] = stub.requests
+        metrics['stub_latency_ms'] = args.ollama_latency * 1000
+        return metrics
+
+
+@suite('prompt_eval')
+def bench_prompt_eval(entries, args):
+    from app.models.ollama_classifier import OllamaClassifier
+    texts = [entry['content'] for entry in entries[:args.ollama_max_entries]]
+
+    # Sequential calls against a stub that charges only for prompt tokens
+    # missing from its prefix cache, as Ollama's KV cache does
+    with StubOllamaServer(latency=0.0, prompt_token_time=args.ollama_prompt_token_time) as stub:
+        classifier = OllamaClassifier(use_ollama=True, host=stub.url)
+        metrics = measure(lambda: [classifier.analyze(text) for text in texts],
+                          iterations=args.repeats, items_per_call=len(texts), warmup=0)
+
+        evaluated_per_call = stub.prompt_tokens_evaluated / stub.requests
+        metrics['ollama_calls_per_entry'] = round(stub.requests / ((args.repeats + 1) * len(texts)), 3)
+        metrics['prompt_tokens_per_call'] = round(stub.prompt_tokens / stub.requests, 1)
+        metrics['prompt_tokens_evaluated_per_call'] = round(evaluated_per_call, 1)
+        metrics['prompt_eval_ms_per_call'] = round(evaluated_per_call * args.ollama_prompt_token_time * 1000, 3)
+        return metrics
+
+
+def run(args) -> Dict[str, any]:
+    """Run the selected suites at every corpus size"""
+    results = []
+    for size in args.sizes:
+        entries = generate_entries(size, min_words=args.min_words, max_words=args.max_words,
+                                   seed=args.seed)
+        for name in args.suites:
+            metrics = SUITES[name](entries, args)
+            results.append({'suite': name, 'entries': size, **metrics})
+            print(f"{name:<16} {size:>7} entries  p50 {metrics['p50_ms']:>10.3f} ms  "
+                  f"p95 {metrics['p95_ms']:>10.3f} ms  p99 {metrics['p99_ms']:>10.3f} ms  "
+                  f"{metrics['throughput_per_s']:>12.1f} entries/s  "
+                  f"peak {metrics['peak_memory_kib']:>9.1f} KiB")
+    return {'meta': run_metadata(args), 'results': results}
+
+
+def run_metadata(args) -> Dict[str, any]:
+    import platform
+    import subprocess
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'sizes': args.sizes,
+        'min_words': args.min_words,
+        'max_words': args.max_words,
+        'repeats': args.repeats,
+    }
+
+
+def compare(current: Dict[str, any], baseline: Dict[str, any]):
+    """Print p50 and throughput changes against a previous results file"""
+    previous = {(r['suite'], r['entries']): r for r in baseline['results']}
+    print(f"\nvs {baseline['meta'].get('commit') or 'baseline'}:")
+    for result in current['results']:
+        before = previous.get((result['suite'], result['entries']))
+        if before is None:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        print(f"{result['suite']:<16} {result['entries']:>7} entries  p50 x{ratio:.2f}  "
+              f"({before['p50_ms']:.3f} -> {result['p50_ms']:.3f} ms)")
@@ -0,0 +1,219 @@
+"""
+Local stand-in for the Ollama HTTP API with configurable latency
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_THEMES = [
+    'gratitude', 'personal_growth', 'relationships', 'work',
+    'health', 'creativity', 'daily_life', 'reflection',
+    'challenges', 'achievements', 'emotions', 'future_planning'
+]
+
+# "[n] text" items of a multi-entry prompt, each running up to the next item
+ENTRY_NUMBER = re.compile(r'^\[(\d+)\] (.*?)(?=\n\n\[\d+\] |\Z)', re.MULTILINE | re.DOTALL)
+
+
+def stub_answer(prompt: str, output_format) -> str:
+    """Deterministic answer for a prompt, in the shape each classifier call expects"""
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+    sentiment = rng.choice(['positive', 'negative', 'neutral'])
+    themes = [{'theme': theme, 'confidence': round(rng.uniform(0.5, 0.95), 2)}
+              for theme in rng.sample(STUB_THEMES, 3)]
+
+    if output_format and 'Journal entries:' in prompt:
+        # One answer per numbered entry of a multi-entry prompt
+        entries = prompt.split('Journal entries:', 1)[1]
+        return json.dumps({'results': [
+            {'entry': int(number), **json.loads(stub_answer(text, output_format))}
+            for number, text in ENTRY_NUMBER.findall(entries)
+        ]})
+    if output_format:
+        return json.dumps({'sentiment': sentiment, 'themes': themes})
+    if 'ONLY one word' in prompt:
+        return sentiment
+    return json.dumps(themes)
+
+
+class _Server(ThreadingHTTPServer):
+    # Room for a burst of concurrent clients connecting at once
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients that cancel or time out hang up before the reply; that's expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubOllamaServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0,
+                 load_time: float = 0.0, prompt_token_time: float = 0.0, slots: int = 1):
+        """
+        Threaded stub of the Ollama endpoints the service uses
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free one)
+            latency: Seconds each generate call takes
+            jitter: Extra uniform random delay of up to this many seconds
+            failure_rate: Fraction of generate calls answered with HTTP 500
+            load_time: Extra seconds the first generate call for each model takes,
+                like Ollama loading a model into memory
+            prompt_token_time: Seconds per evaluated prompt token (whitespace
+                separated). Tokens shared with the start of a prompt still held in
+                one of the slots are treated as KV-cached and cost nothing, like
+                Ollama's prompt cache
+            slots: Prompt caches kept, like OLLAMA_NUM_PARALLEL
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.load_time = load_time
+        self.requests = 0
+        self.loaded_models = set()
+        self.keep_alive = []
+        self.prompt_token_time = prompt_token_time
+        self.prompt_tokens = 0
+        self.prompt_tokens_evaluated = 0
+        self._slots = [[] for _ in range(max(1, slots))]
+        self._rng = random.Random(0)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'StubOllamaServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _evaluate_prompt(self, prompt: str) -> int:
+        """Tokens of prompt not covered by the best-matching cached slot; updates that slot"""
+        tokens = prompt.split()
+        best, shared = 0, -1
+        for index, cached in enumerate(self._slots):
+            common = len(os.path.commonprefix([cached, tokens]))
+            if common > shared:
+                best, shared = index, common
+        self._slots[best] = tokens
+        evaluated = len(tokens) - shared
+        self.prompt_tokens += len(tokens)
+        self.prompt_tokens_evaluated += evaluated
+        return evaluated
+
+    def _next_call(self, model: str, keep_alive=None, prompt: str = ''):
+        with self._lock:
+            self.requests += 1
+            evaluated = self._evaluate_prompt(prompt)
+            self.keep_alive.append(keep_alive)
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+            if model not in self.loaded_models:
+                self.loaded_models.add(model)
+                extra += self.load_time
+            fail = self._rng.random() < self.failure_rate
+        prompt_eval = evaluated * self.prompt_token_time
+        return self.latency + extra + prompt_eval, fail, evaluated, prompt_eval
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send(200, {'models': [{'name': 'llama3.2:latest', 'model': 'llama3.2:latest'}]})
+                elif self.path == '/api/version':
+                    self._send(200, {'version': 'stub'})
+                else:
+                    self._send(200, {'status': 'Ollama is running'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+
+                if self.path != '/api/generate':
+                    self._send(404, {'error': f'unsupported endpoint {self.path}'})
+                    return
+
+                prompt = request.get('prompt', '')
+                delay, fail, evaluated, prompt_eval = stub._next_call(
+                    request.get('model', ''), request.get('keep_alive'), prompt)
+                started = time.perf_counter()
+                time.sleep(delay)
+                if fail:
+                    self._send(500, {'error': 'stub failure'})
+                    return
+
+                self._send(200, {
+                    'model': request.get('model', ''),
+                    'created_at': datetime.now(timezone.utc).isoformat(),
+                    'response': stub_answer(prompt, request.get('format')) if prompt else '',
+                    'done': True,
+                    'done_reason': 'stop',
+                    'total_duration': int((time.perf_counter() - started) * 1e9),
+                    'prompt_eval_count': evaluated,
+                    'prompt_eval_duration': int(prompt_eval * 1e9),
+                    'eval_count': 40,
+                    'eval_duration': int((delay - prompt_eval) * 1e9),
+                })
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a stub Ollama server')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--load-time', type=float, default=0.0,
+                        help='Extra seconds for the first call per model')
+    parser.add_argument('--prompt-token-time', type=float, default=0.0,
+                        help='Seconds per uncached prompt token')
+    parser.add_argument('--slots', type=int, default=1, help='Prompt cache slots')
+    args = parser.parse_args()
+
+    server = StubOllamaServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                              failure_rate=args.failure_rate, load_time=args.load_time,
+                              prompt_token_time=args.prompt_token_time, slots=args.slots)
+    print(f"Stub Ollama listening on {server.url}")
+    server.serve_forever()
@@ -1,10 +1,50 @@
 # type: ignore
 
-from fastapi import FastAPI
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 import uvicorn
 
-app = FastAPI(title="Journal AI Service")
+from app.utils.metrics import (
+    REQUEST_LATENCY, registry, request_timings, server_timing_header, timed
+)
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger("app.timing")
+
+# Attach per-stage timings to responses as a Server-Timing header
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """ORJSONResponse that records body serialization as the 'serialize' stage"""
+
+    def render(self, content) -> bytes:
+        with timed('serialize'):
+            return super().render(content)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open the shared Ollama client, start model warmup, open the job store and start
+    the job workers; stop them on shutdown
+    """
+    await inference.classifier.start()
+    await jobs.analysis_jobs.start()
+    yield
+    await jobs.analysis_jobs.close()
+    await inference.classifier.close()
+
+
+app = FastAPI(title="Journal AI Service", default_response_class=TimedORJSONResponse,
+              lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -16,13 +56,75 @@ app.add_middleware(
 )
 
 # Import routes
-from app.routes import inference
+from app.routes import inference, jobs
 
 app.include_router(inference.router, prefix="/api", tags=["inference"])
+app.include_router(jobs.router, prefix="/api", tags=["jobs"])
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Observe request latency per route and log one structured timing line per request"""
+    timings = {}
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        total = time.perf_counter() - start
+        request_timings.reset(token)
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.observe(total, method=request.method, route=route_path, status=status)
+        logger.info(json.dumps({
+            "method": request.method,
+            "route": route_path,
+            "status": status,
+            "total_ms": round(total * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+        }))
+
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing_header(timings, total)
+    return response
+
+
+def cache_gauges():
+    """Classification cache counters, read at scrape time"""
+    if inference.classifier.cache is None:
+        return {}
+    stats = inference.classifier.cache.stats()
+    return {
+        "ml_cache_hits": stats["hits"],
+        "ml_cache_misses": stats["misses"],
+        "ml_cache_evictions": stats["evictions"],
+        "ml_cache_entries": stats["entries"],
+        "ml_cache_bytes": stats["bytes"],
+    }
+
+registry.gauge_collector(cache_gauges)
+registry.gauge_collector(inference.admission.stats)
+registry.gauge_collector(inference.classifier.breaker.gauges)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of request, stage, Ollama and cache metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    """Liveness: the process is up and serving, and the state of the Ollama circuit breaker"""
+    status = {"status": "ok", "ready": inference.classifier.ready}
+    if inference.classifier.use_ollama:
+        status["circuit"] = inference.classifier.breaker.stats()
+    return status
+
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness: 503 until the configured classifier can answer without a cold start"""
+    status = inference.classifier.readiness()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Precompiled keyword index used by the classifier fast paths
+"""
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+
+# Every non-letter Latin-1 character plus common typographic punctuation splits words
+WORD_BREAKS = str.maketrans({
+    **{chr(c): ' ' for c in range(256) if not chr(c).isalpha()},
+    **{c: ' ' for c in '\u2018\u2019\u201c\u201d\u2013\u2014\u2026'}
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into words"""
+    return text.lower().translate(WORD_BREAKS).split()
+
+
+class KeywordIndex:
+    def __init__(self, groups: Dict[str, List[str]], forms: Dict[str, Iterable[str]] = None):
+        """
+        Build a single-pass keyword index
+
+        Keywords match whole words: the keyword itself, or one of the
+        inflections and compounds listed for it in forms. 'will' therefore
+        no longer fires on 'willow', nor 'hard' on 'hardware'. With word
+        boundaries a match is an exact word lookup, so one hash table from
+        every matchable word to its keyword ids serves as the compiled
+        matcher, and scoring a text is one tokenize plus one set intersection.
+
+        Args:
+            groups: Mapping of label (sentiment polarity or theme) to its keywords.
+                    A keyword may appear under several labels.
+            forms: Mapping of keyword to the other words it matches
+        """
+        self.labels = list(groups.keys())
+        self.vocabulary: List[str] = []
+        self.keyword_labels: List[List[int]] = []
+
+        keyword_ids: Dict[str, int] = {}
+        for label_id, keywords in enumerate(groups.values()):
+            for keyword in keywords:
+                if keyword not in keyword_ids:
+                    keyword_ids[keyword] = len(self.vocabulary)
+                    self.vocabulary.append(keyword)
+                    self.keyword_labels.append([])
+                self.keyword_labels[keyword_ids[keyword]].append(label_id)
+
+        # Map every matchable word straight to the keyword ids it stands for
+        self.forms: Dict[str, List[int]] = {}
+        for keyword, keyword_id in keyword_ids.items():
+            for form in (keyword, *(forms or {}).get(keyword, ())):
+                ids = self.forms.setdefault(form, [])
+                if keyword_id not in ids:
+                    ids.append(keyword_id)
+
+        # Keyword -> label incidence, used to score a whole document-term matrix at once
+        self.label_matrix = np.zeros((len(self.vocabulary), len(self.labels)), dtype=np.int32)
+        for keyword_id, label_ids in enumerate(self.keyword_labels):
+            self.label_matrix[keyword_id, label_ids] = 1
+
+    def match(self, text: str) -> Set[int]:
+        """Return the ids of all distinct keywords present in the text"""
+        matched = set()
+        for form in self.forms.keys() & tokenize(text):
+            matched.update(self.forms[form])
+        return matched
+
+    def score(self, text: str) -> Dict[str, int]:
+        """
+        Count distinct keyword hits per label in one pass over the text
+
+        Returns:
+            Mapping of every label to the number of its keywords found
+        """
+        counts = [0] * len(self.labels)
+        for keyword_id in self.match(text):
+            for label_id in self.keyword_labels[keyword_id]:
+                counts[label_id] += 1
+        return dict(zip(self.labels, counts))
+
+    def term_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Build the binary document-term matrix of texts against the keyword vocabulary
+
+        Returns:
+            Array of shape (len(texts), len(vocabulary)), 1 where the keyword occurs
+        """
+        n_terms = len(self.vocabulary)
+        cells = []
+        for row, text in enumerate(texts):
+            matched = self.match(text)
+            offset = row * n_terms
+            cells.extend(offset + keyword_id for keyword_id in matched)
+
+        matrix = np.zeros(len(texts) * n_terms, dtype=np.int32)
+        matrix[np.asarray(cells, dtype=np.intp)] = 1
+        return matrix.reshape(len(texts), n_terms)
+
+    def score_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Count distinct keyword hits per label for every text
+
+        Returns:
+            Array of shape (len(texts), len(labels)), columns ordered as self.labels
+        """
+        return self.term_matrix(texts) @ self.label_matrix
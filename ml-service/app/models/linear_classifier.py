@@ -0,0 +1,334 @@
+"""
+TF-IDF + linear model tier for sentiment and multi-label themes
+
+Sits between keyword matching and Ollama: trained offline from labelled JSONL
+(hand labels or answers distilled from the Ollama path), persisted as an
+uncompressed joblib artifact whose weight arrays are memory-mapped on load,
+and scored in batches on CPU.
+
+Train:   python -m app.models.linear_classifier train --data labelled.jsonl --output models/linear.joblib
+Distill: python -m app.models.linear_classifier distill --input entries.jsonl --output labelled.jsonl
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+import joblib
+import numpy as np
+
+SENTIMENT_LABELS = ['positive', 'negative', 'neutral']
+
+ARTIFACT_VERSION = 1
+
+# Themes below this probability are dropped, but the best theme is always kept
+MIN_THEME_CONFIDENCE = 0.3
+
+
+def read_jsonl(path: str) -> Iterable[Dict[str, any]]:
+    """Yield one dict per non-blank line of a JSONL file"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def record_text(record: Dict[str, any]) -> str:
+    return record.get('content') or record.get('text') or ''
+
+
+def record_themes(record: Dict[str, any]) -> List[str]:
+    """Theme names of a record; accepts plain names or {'theme', 'confidence'} dicts"""
+    themes = []
+    for item in record.get('themes') or []:
+        themes.append(item.get('theme') if isinstance(item, dict) else item)
+    return [theme for theme in themes if theme]
+
+
+class LinearClassifier:
+    def __init__(self, vectorizer, weights: np.ndarray, bias: np.ndarray,
+                 theme_labels: List[str]):
+        """
+        Fitted TF-IDF vectorizer plus one linear layer for every output
+
+        Args:
+            vectorizer: Fitted sklearn TfidfVectorizer
+            weights: (vocabulary x outputs) float32 matrix; the first
+                len(SENTIMENT_LABELS) columns are sentiment logits, the rest
+                one logit per theme
+            bias: Intercept per output column
+            theme_labels: Theme name for each theme column
+        """
+        self.vectorizer = vectorizer
+        self.weights = weights
+        self.bias = bias
+        self.theme_labels = list(theme_labels)
+
+    @classmethod
+    def train(cls, records: Iterable[Dict[str, any]], themes: List[str],
+              C: float = 4.0, max_features: int = 50000) -> 'LinearClassifier':
+        """
+        Fit the vectorizer, a multinomial sentiment model and one binary model per theme
+
+        Args:
+            records: Dicts with 'content' (or 'text'), 'sentiment' and 'themes'
+            themes: Theme label set; themes outside it are ignored
+            C: Inverse regularization strength for every logistic regression
+            max_features: Vocabulary cap for the vectorizer
+
+        Returns:
+            Trained LinearClassifier
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        records = [r for r in records if record_text(r)]
+        if not records:
+            raise ValueError("No labelled records with text to train on")
+
+        vectorizer = TfidfVectorizer(
+            lowercase=True, ngram_range=(1, 2), min_df=2 if len(records) >= 50 else 1,
+            max_features=max_features, sublinear_tf=True, dtype=np.float32
+        )
+        X = vectorizer.fit_transform([record_text(r) for r in records])
+
+        vocabulary_size = X.shape[1]
+        weights = np.zeros((vocabulary_size, len(SENTIMENT_LABELS) + len(themes)), dtype=np.float32)
+        bias = np.zeros(weights.shape[1], dtype=np.float32)
+
+        # Sentiment: one softmax over the three labels
+        sentiments = [str(r.get('sentiment', '')).strip().lower() for r in records]
+        labelled = [i for i, s in enumerate(sentiments) if s in SENTIMENT_LABELS]
+        present = sorted({sentiments[i] for i in labelled}, key=SENTIMENT_LABELS.index)
+        # Labels never seen in training can't be predicted
+        bias[:len(SENTIMENT_LABELS)] = -30.0
+        if len(present) == 1:
+            bias[SENTIMENT_LABELS.index(present[0])] = 0.0
+        elif len(present) > 1:
+            model = LogisticRegression(C=C, max_iter=1000)
+            model.fit(X[labelled], [sentiments[i] for i in labelled])
+            if len(model.classes_) == 2:
+                # Binary fit: logit of classes_[1] against classes_[0]
+                column = SENTIMENT_LABELS.index(model.classes_[1])
+                weights[:, column] = model.coef_[0]
+                bias[column] = model.intercept_[0]
+                bias[SENTIMENT_LABELS.index(model.classes_[0])] = 0.0
+            else:
+                for row, label in enumerate(model.classes_):
+                    column = SENTIMENT_LABELS.index(label)
+                    weights[:, column] = model.coef_[row]
+                    bias[column] = model.intercept_[row]
+
+        # Themes: independent one-vs-rest sigmoid per label
+        theme_sets = [set(record_themes(r)) for r in records]
+        for offset, theme in enumerate(themes):
+            column = len(SENTIMENT_LABELS) + offset
+            y = np.fromiter((theme in s for s in theme_sets), dtype=bool, count=len(records))
+            if y.all() or not y.any():
+                bias[column] = 30.0 if y.all() else -30.0
+                continue
+            model = LogisticRegression(C=C, max_iter=1000)
+            model.fit(X, y)
+            weights[:, column] = model.coef_[0]
+            bias[column] = model.intercept_[0]
+
+        return cls(vectorizer, weights, bias, themes)
+
+    def save(self, path: str):
+        """Write an uncompressed joblib artifact so load() can memory-map the arrays"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        joblib.dump({
+            'version': ARTIFACT_VERSION,
+            'vectorizer': self.vectorizer,
+            'weights': self.weights,
+            'bias': self.bias,
+            'theme_labels': self.theme_labels,
+        }, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'LinearClassifier':
+        """
+        Load an artifact written by save()
+
+        Args:
+            path: Artifact file
+            mmap: Memory-map the weight arrays read-only, so worker processes
+                share one copy through the page cache
+        """
+        artifact = joblib.load(path, mmap_mode='r' if mmap else None)
+        if artifact.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported linear model artifact version: {artifact.get('version')}")
+        return cls(artifact['vectorizer'], artifact['weights'], artifact['bias'],
+                   artifact['theme_labels'])
+
+    @classmethod
+    def from_env(cls) -> Optional['LinearClassifier']:
+        """Load the artifact named by LINEAR_MODEL_PATH, or None when it is unset"""
+        path = os.getenv('LINEAR_MODEL_PATH')
+        return cls.load(path) if path else None
+
+    def logits(self, texts: List[str]) -> np.ndarray:
+        """(texts x outputs) logits from one sparse-dense product"""
+        X = self.vectorizer.transform(texts)
+        return np.asarray(X @ self.weights) + self.bias
+
+    def analyze_batch(self, texts: List[str], top_k: int = 3) -> List[Dict[str, any]]:
+        """
+        Predict themes and sentiment for many journal entries at once
+
+        Args:
+            texts: Journal entry texts
+            top_k: Number of top themes to return per entry
+
+        Returns:
+            One {'themes': [...], 'sentiment': ...} dict per text, in order
+        """
+        return self.analyze_with_margins(texts, top_k)[0]
+
+    def analyze_with_margins(self, texts: List[str], top_k: int = 3):
+        """
+        analyze_batch plus a per-entry decision margin
+
+        The margin is the smaller of the probability gap between the two most
+        likely sentiments and the gap between the two most likely themes.
+
+        Returns:
+            Tuple of (results, margins array in [0, 1])
+        """
+        if not texts:
+            return [], np.zeros(0)
+
+        logits = self.logits(texts)
+        n_sentiment = len(SENTIMENT_LABELS)
+        sentiment_logits = logits[:, :n_sentiment]
+        sentiments = np.argmax(sentiment_logits, axis=1)
+        probabilities = 1.0 / (1.0 + np.exp(-logits[:, n_sentiment:]))
+
+        sentiment_probabilities = np.exp(sentiment_logits - sentiment_logits.max(axis=1, keepdims=True))
+        sentiment_probabilities /= sentiment_probabilities.sum(axis=1, keepdims=True)
+        margins = np.minimum(top_two_gap(sentiment_probabilities), top_two_gap(probabilities))
+
+        k = max(0, min(top_k, probabilities.shape[1]))
+        if k:
+            top = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+
+        results = []
+        for row in range(len(texts)):
+            themes = []
+            for position in (top[row] if k else ()):
+                confidence = float(probabilities[row, position])
+                if themes and confidence < MIN_THEME_CONFIDENCE:
+                    break
+                themes.append({'theme': self.theme_labels[position],
+                               'confidence': round(confidence, 2)})
+            if not themes:
+                themes = [{'theme': 'daily_life', 'confidence': 0.6}]
+            results.append({'themes': themes, 'sentiment': SENTIMENT_LABELS[sentiments[row]]})
+        return results, margins
+
+
+def top_two_gap(values: np.ndarray) -> np.ndarray:
+    """Per-row gap between the largest and second-largest value"""
+    if values.shape[1] < 2:
+        return values[:, 0] if values.shape[1] else np.zeros(len(values))
+    top_two = -np.partition(-values, 1, axis=1)[:, :2]
+    return top_two[:, 0] - top_two[:, 1]
+
+
+def evaluate(model: LinearClassifier, records: List[Dict[str, any]], top_k: int = 3) -> Dict[str, float]:
+    """Sentiment accuracy and theme micro precision/recall/F1 against labelled records"""
+    predictions = model.analyze_batch([record_text(r) for r in records], top_k)
+    correct = true_positive = predicted = actual = 0
+    for record, prediction in zip(records, predictions):
+        correct += prediction['sentiment'] == str(record.get('sentiment', '')).strip().lower()
+        predicted_themes = {t['theme'] for t in prediction['themes']}
+        labelled_themes = set(record_themes(record))
+        true_positive += len(predicted_themes & labelled_themes)
+        predicted += len(predicted_themes)
+        actual += len(labelled_themes)
+
+    precision = true_positive / predicted if predicted else 0.0
+    recall = true_positive / actual if actual else 0.0
+    return {
+        'sentiment_accuracy': round(correct / len(records), 3) if records else 0.0,
+        'theme_precision': round(precision, 3),
+        'theme_recall': round(recall, 3),
+        'theme_f1': round(2 * precision * recall / (precision + recall), 3) if precision + recall else 0.0,
+    }
+
+
+def distill(input_path: str, output_path: str, batch_size: int = 64):
+    """Label unlabelled entries with the Ollama path and write them as training JSONL"""
+    import asyncio
+    from app.models.ollama_classifier import OllamaClassifier
+
+    teacher = OllamaClassifier(
+        model_name=os.getenv('OLLAMA_MODEL', 'llama3.2'), use_ollama=True,
+        max_concurrency=int(os.getenv('OLLAMA_MAX_CONCURRENCY', 4)),
+        request_timeout=float(os.getenv('OLLAMA_REQUEST_TIMEOUT', 20))
+    )
+    written = skipped = 0
+
+    async def run(out):
+        batch = []
+        for record in read_jsonl(input_path):
+            if record_text(record):
+                batch.append(record)
+            if len(batch) == batch_size:
+                await label(batch, out)
+                batch = []
+        if batch:
+            await label(batch, out)
+
+    async def label(batch, out):
+        nonlocal written, skipped
+        texts = [record_text(r) for r in batch]
+        async for index, result, fell_back, _ in teacher.analyze_iter_async(texts):
+            # Keyword fallbacks would teach the model the keyword rules
+            if fell_back:
+                skipped += 1
+                continue
+            out.write(json.dumps({'content': texts[index], **result}) + '\n')
+            written += 1
+
+    with open(output_path, 'w', encoding='utf-8') as out:
+        asyncio.run(run(out))
+    print(f"Wrote {written} labelled entries to {output_path} ({skipped} fell back and were skipped)")
+
+
+if __name__ == '__main__':
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description='Train or distill data for the linear classifier tier')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help='Train a model from labelled JSONL')
+    train_parser.add_argument('--data', required=True, help='Labelled JSONL: content, sentiment, themes')
+    train_parser.add_argument('--output', required=True, help='Artifact path (.joblib)')
+    train_parser.add_argument('--holdout', type=float, default=0.2,
+                              help='Fraction of records held out for evaluation')
+    train_parser.add_argument('--C', type=float, default=4.0, help='Inverse regularization strength')
+    train_parser.add_argument('--seed', type=int, default=0)
+
+    distill_parser = commands.add_parser('distill', help='Label entries with Ollama')
+    distill_parser.add_argument('--input', required=True, help='JSONL with a content (or text) field')
+    distill_parser.add_argument('--output', required=True, help='Labelled JSONL to write')
+
+    args = parser.parse_args()
+
+    if args.command == 'distill':
+        distill(args.input, args.output)
+    else:
+        from app.models.ollama_classifier import OllamaClassifier
+
+        records = [r for r in read_jsonl(args.data) if record_text(r)]
+        random.Random(args.seed).shuffle(records)
+        split = int(len(records) * (1 - args.holdout)) if args.holdout else len(records)
+        model = LinearClassifier.train(records[:split], OllamaClassifier().themes, C=args.C)
+        if split < len(records):
+            print(f"Held-out metrics ({len(records) - split} entries): "
+                  f"{evaluate(model, records[split:])}")
+        model.save(args.output)
+        print(f"Saved model ({model.weights.shape[0]} features) to {args.output}")
@@ -1,28 +1,236 @@
 """
 Ollama-based sentiment and theme classifier for journal entries
 """
+import asyncio
+import httpx
+import logging
 import ollama
 import json
+import os
 import re
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from app.models.keyword_index import KeywordIndex
+from app.models.linear_classifier import LinearClassifier, top_two_gap
+from app.utils.cache import ClassificationCache
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpen, OPEN
+from app.utils.chunking import estimate_tokens, merge_sentiments, merge_themes, split_to_budget
+from app.utils.metrics import record_cascade, record_fallback, record_ollama_call
+
+logger = logging.getLogger(__name__)
+
+POSITIVE_WORDS = ['happy', 'great', 'amazing', 'wonderful', 'grateful', 'thankful',
+                  'excited', 'love', 'proud', 'accomplished', 'blessed', 'joy',
+                  'fantastic', 'excellent', 'perfect', 'beautiful', 'good']
+
+NEGATIVE_WORDS = ['sad', 'angry', 'frustrated', 'upset', 'difficult', 'hard',
+                  'struggle', 'worry', 'anxious', 'stress', 'bad', 'terrible',
+                  'awful', 'hate', 'pain', 'hurt', 'disappointed']
+
+THEME_KEYWORDS = {
+    'gratitude': ['grateful', 'thankful', 'appreciate', 'blessed', 'fortunate'],
+    'personal_growth': ['learn', 'grow', 'improve', 'develop', 'progress'],
+    'relationships': ['friend', 'family', 'love', 'relationship', 'together'],
+    'work': ['work', 'job', 'career', 'project', 'meeting', 'colleague'],
+    'health': ['health', 'exercise', 'fitness', 'sleep', 'workout'],
+    'creativity': ['create', 'art', 'music', 'write', 'design', 'idea'],
+    'daily_life': ['day', 'morning', 'evening', 'routine', 'daily'],
+    'reflection': ['reflect', 'think', 'realize', 'understand', 'discover'],
+    'challenges': ['challenge', 'difficult', 'struggle', 'hard', 'problem'],
+    'achievements': ['achieve', 'accomplish', 'success', 'goal', 'proud'],
+    'emotions': ['feel', 'emotion', 'happy', 'sad', 'angry', 'excited'],
+    'future_planning': ['plan', 'future', 'goal', 'hope', 'dream', 'will']
+}
+
+# Keywords match whole words only. Besides itself, a keyword matches just the
+# inflections and compounds listed here ('day' in 'today', 'achieve' in
+# 'achievement'); unrelated words that merely contain it ('willow', 'airplane',
+# 'crusade') and negations ('unhappy', 'imperfect') do not count. Every form
+# contains its keyword, so scores never exceed the old substring scans.
+KEYWORD_FORMS = {
+    'happy': [],
+    'great': ['greater', 'greatest', 'greatly', 'greatness'],
+    'amazing': ['amazingly'],
+    'wonderful': ['wonderfully'],
+    'grateful': ['gratefully', 'gratefulness'],
+    'thankful': ['thankfully', 'thankfulness'],
+    'excited': ['excitedly'],
+    'love': ['loved', 'loves', 'lovely', 'lover', 'lovers', 'beloved'],
+    'proud': ['prouder', 'proudest', 'proudly'],
+    'accomplished': [],
+    'blessed': [],
+    'joy': ['joys', 'joyful', 'joyfully', 'joyous', 'enjoy', 'enjoys', 'enjoyed', 'enjoying',
+            'enjoyment', 'enjoyable'],
+    'fantastic': ['fantastically'],
+    'excellent': ['excellently'],
+    'perfect': ['perfectly', 'perfection', 'perfected', 'perfecting'],
+    'beautiful': ['beautifully'],
+    'good': ['goodness'],
+    'sad': ['sadder', 'saddest', 'sadly', 'sadness'],
+    'angry': [],
+    'frustrated': [],
+    'upset': ['upsets', 'upsetting'],
+    'difficult': ['difficulty', 'difficulties'],
+    'hard': ['harder', 'hardest', 'hardship', 'hardships'],
+    'struggle': ['struggles', 'struggled'],
+    'worry': ['worrying'],
+    'anxious': ['anxiously'],
+    'stress': ['stresses', 'stressed', 'stressing', 'stressful', 'stressor', 'stressors'],
+    'bad': ['badly'],
+    'terrible': [],
+    'awful': ['awfully'],
+    'hate': ['hated', 'hates', 'hateful'],
+    'pain': ['pains', 'painful', 'painfully'],
+    'hurt': ['hurts', 'hurting', 'hurtful'],
+    'disappointed': [],
+    'appreciate': ['appreciated', 'appreciates'],
+    'fortunate': ['fortunately'],
+    'learn': ['learns', 'learned', 'learnt', 'learning', 'learner', 'learners', 'relearn'],
+    'grow': ['grows', 'growing', 'grown', 'growth', 'grower', 'outgrow', 'outgrown'],
+    'improve': ['improves', 'improved', 'improvement', 'improvements'],
+    'develop': ['develops', 'developed', 'developing', 'development', 'developments'],
+    'progress': ['progresses', 'progressed', 'progressing', 'progression'],
+    'friend': ['friends', 'friendly', 'friendship', 'friendships', 'befriend', 'befriended',
+               'boyfriend', 'girlfriend'],
+    'family': [],
+    'relationship': ['relationships'],
+    'together': ['togetherness'],
+    'work': ['works', 'worked', 'working', 'worker', 'workers', 'workday', 'workdays', 'workload',
+             'workplace', 'workshop', 'workweek', 'workout', 'workouts', 'coworker', 'coworkers',
+             'homework', 'teamwork', 'overworked'],
+    'job': ['jobs'],
+    'career': ['careers'],
+    'project': ['projects'],
+    'meeting': ['meetings'],
+    'colleague': ['colleagues'],
+    'health': ['healthy', 'healthier', 'healthiest', 'unhealthy', 'healthcare'],
+    'exercise': ['exercises', 'exercised'],
+    'fitness': [],
+    'sleep': ['sleeps', 'sleeping', 'sleepy', 'sleepless', 'asleep', 'oversleep'],
+    'workout': ['workouts'],
+    'create': ['creates', 'created'],
+    'art': ['arts', 'artist', 'artists', 'artistic', 'artwork', 'artworks'],
+    'music': ['musical', 'musician', 'musicians'],
+    'write': ['writes', 'writer', 'writers', 'rewrite'],
+    'design': ['designs', 'designed', 'designing', 'designer'],
+    'idea': ['ideas'],
+    'day': ['days', 'today', 'yesterday', 'someday', 'everyday', 'midday', 'daytime', 'daylight',
+            'daydream', 'birthday', 'birthdays', 'holiday', 'holidays', 'weekday', 'weekdays',
+            'workday', 'workdays', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+            'saturday', 'sunday'],
+    'morning': ['mornings'],
+    'evening': ['evenings'],
+    'routine': ['routines'],
+    'daily': [],
+    'reflect': ['reflects', 'reflected', 'reflecting', 'reflection', 'reflections', 'reflective'],
+    'think': ['thinks', 'thinking', 'thinker', 'rethink', 'overthink', 'overthinking'],
+    'realize': ['realizes', 'realized'],
+    'understand': ['understands', 'understanding', 'misunderstand', 'misunderstanding'],
+    'discover': ['discovers', 'discovered', 'discovering', 'discovery', 'discoveries'],
+    'challenge': ['challenges', 'challenged'],
+    'problem': ['problems', 'problematic'],
+    'achieve': ['achieves', 'achieved', 'achievement', 'achievements', 'achiever'],
+    'accomplish': ['accomplishes', 'accomplished', 'accomplishing', 'accomplishment',
+                   'accomplishments'],
+    'success': ['successes', 'successful', 'successfully'],
+    'goal': ['goals'],
+    'feel': ['feels', 'feeling', 'feelings'],
+    'emotion': ['emotions', 'emotional', 'emotionally'],
+    'plan': ['plans', 'planned', 'planning', 'planner', 'planners'],
+    'future': ['futures'],
+    'hope': ['hopes', 'hoped', 'hopeful', 'hopefully'],
+    'dream': ['dreams', 'dreamed', 'dreamt', 'dreaming', 'daydream'],
+    'will': [],
+}
+
+ANALYSIS_OPTIONS = {
+    'temperature': 0.2,
+    'num_predict': 120,
+    'top_k': 10,
+}
+
+# Entries scored per step when streaming keyword results
+STREAM_CHUNK_SIZE = 256
+
+# Seconds between warmup attempts while Ollama is unreachable
+WARMUP_RETRY_INTERVAL = 5.0
+
+# Most entries answered by one multi-entry prompt
+MAX_GROUP_ENTRIES = 16
 
 
 class OllamaClassifier:
-    def __init__(self, model_name: str = "llama3.2", use_ollama: bool = False):
+    def __init__(self, model_name: str = "llama3.2", use_ollama: bool = False,
+                 cache: Optional[ClassificationCache] = None,
+                 max_concurrency: int = 4, request_timeout: float = 20.0,
+                 linear_model: Optional[LinearClassifier] = None,
+                 cascade_threshold: Optional[float] = None,
+                 host: Optional[str] = None, keep_alive: Optional[str] = None,
+                 max_entry_tokens: int = 1024, max_chunks: int = 4,
+                 breaker: Optional[CircuitBreaker] = None):
         """
         Initialize Ollama classifier
 
         Args:
             model_name: Name of the Ollama model to use (e.g., 'llama3.2', 'mistral', 'phi')
             use_ollama: Whether to use Ollama or fallback to fast keyword matching (default: False for speed)
+            cache: Optional result cache so repeated entries skip the Ollama call
+            max_concurrency: Maximum Ollama requests in flight for batch analysis
+            request_timeout: Seconds to wait for one Ollama request before falling back
+            linear_model: Optional trained TF-IDF + linear model used instead of
+                keyword matching when Ollama is disabled
+            cascade_threshold: With Ollama enabled, answer entries locally when
+                their local margin is at least this, and send only the rest to
+                Ollama (None sends every entry). Keyword margins are counts,
+                linear model margins are probabilities; see _local_analysis
+            host: Ollama server URL (default: OLLAMA_HOST or http://localhost:11434)
+            keep_alive: How long Ollama keeps the model loaded after a call ('30m', or seconds; -1 for ever)
+            max_entry_tokens: Estimated token budget for the entry part of one prompt;
+                longer entries are split into chunks whose answers are merged
+            max_chunks: Chunks analyzed per entry; text beyond them is dropped
+            breaker: Circuit breaker around Ollama calls; while it is open entries
+                go straight to keyword analysis. A background probe started by
+                start() decides when to try Ollama again
         """
         self.model_name = model_name
         self.use_ollama = use_ollama
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.linear_model = linear_model
+        self.cascade_threshold = cascade_threshold
+        self.host = host
+        self.keep_alive = keep_alive
+        self.max_entry_tokens = max_entry_tokens
+        self.max_chunks = max_chunks
+        self.breaker = breaker or CircuitBreaker('ollama')
+        # Pooled clients reused across calls; the async one is created by start()
+        # because its connections belong to the server's event loop
+        self.client = ollama.Client(host=host, timeout=request_timeout, limits=self._pool_limits())
+        self.async_client: Optional[ollama.AsyncClient] = None
+        self.ready = not use_ollama
+        self.warmup_error: Optional[str] = None
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._probe_task: Optional[asyncio.Task] = None
         self.themes = [
             'gratitude', 'personal_growth', 'relationships', 'work',
             'health', 'creativity', 'daily_life', 'reflection',
             'challenges', 'achievements', 'emotions', 'future_planning'
         ]
+        # Sentiment and theme keywords share one index so a single pass
+        # over the text scores both
+        self.keyword_index = KeywordIndex({
+            'positive': POSITIVE_WORDS,
+            'negative': NEGATIVE_WORDS,
+            **THEME_KEYWORDS
+        }, KEYWORD_FORMS)
+        self.theme_labels = list(THEME_KEYWORDS)
+        # Instruction prefixes by (mode, top_k); identical bytes on every call
+        # let Ollama reuse the prefix's KV cache and only evaluate the entry
+        self._prefixes: Dict[tuple, str] = {}
 
     def predict_sentiment(self, text: str) -> str:
         """
@@ -34,57 +242,92 @@ class OllamaClassifier:
         Returns:
             Sentiment: 'positive', 'negative', or 'neutral'
         """
-        # Use fast keyword matching if Ollama is disabled
+        # Use the local model or fast keyword matching if Ollama is disabled
         if not self.use_ollama:
+            if self.linear_model is not None:
+                return self.linear_model.analyze_batch([text])[0]['sentiment']
             return self._fast_sentiment(text)
 
-        prompt = f"""Analyze the sentiment of this journal entry.
-Respond with ONLY one word: positive, negative, or neutral.
+        cache_key = self._cache_key(text, 'sentiment')
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        if self.breaker.is_open():
+            record_fallback('sentiment', 'circuit_open')
+            return self._fast_sentiment(text)
 
-Journal entry:
-{text}
+        chunks = self._chunks(text)
+        sentiments = []
+        try:
+            for chunk in chunks:
+                response = self._generate(
+                    'sentiment',
+                    prompt=self._prompt_prefix('sentiment') + chunk,
+                    options={
+                        'temperature': 0.1,  # Low temperature for consistent results
+                        'num_predict': 5,    # Very short response
+                        'top_k': 1,          # Only consider most likely token
+                    }
+                )
 
-Sentiment:"""
+                sentiment = response['response'].strip().lower()
 
-        try:
-            response = ollama.generate(
-                model=self.model_name,
-                prompt=prompt,
-                options={
-                    'temperature': 0.1,  # Low temperature for consistent results
-                    'num_predict': 5,    # Very short response
-                    'top_k': 1,          # Only consider most likely token
-                }
-            )
-
-            sentiment = response['response'].strip().lower()
-
-            # Extract sentiment from response
-            if 'positive' in sentiment:
-                return 'positive'
-            elif 'negative' in sentiment:
-                return 'negative'
-            else:
-                return 'neutral'
+                # Extract sentiment from response
+                if 'positive' in sentiment:
+                    sentiment = 'positive'
+                elif 'negative' in sentiment:
+                    sentiment = 'negative'
+                else:
+                    sentiment = 'neutral'
+                sentiments.append(sentiment)
 
         except Exception as e:
-            print(f"Error in sentiment prediction: {e}")
+            self._ollama_failed('sentiment', e)
             return self._fast_sentiment(text)
 
-    def _fast_sentiment(self, text: str) -> str:
-        """Fast sentiment detection using keyword matching"""
-        text_lower = text.lower()
+        sentiment = merge_sentiments(sentiments, [len(chunk) for chunk in chunks])
+        self._cache_set(cache_key, sentiment)
+        return sentiment
 
-        positive_words = ['happy', 'great', 'amazing', 'wonderful', 'grateful', 'thankful',
-                         'excited', 'love', 'proud', 'accomplished', 'blessed', 'joy',
-                         'fantastic', 'excellent', 'perfect', 'beautiful', 'good']
+    def _cache_key(self, text: str, mode: str, top_k: Optional[int] = None) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return ClassificationCache.make_key(text, self.model_name, mode, top_k)
 
-        negative_words = ['sad', 'angry', 'frustrated', 'upset', 'difficult', 'hard',
-                         'struggle', 'worry', 'anxious', 'stress', 'bad', 'terrible',
-                         'awful', 'hate', 'pain', 'hurt', 'disappointed']
+    def _cache_get(self, key: Optional[str]):
+        return self.cache.get(key) if key is not None else None
 
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
+    async def _cache_get_many(self, keys: List[Optional[str]]) -> Dict[str, any]:
+        """Cached results of several keys, read from disk without blocking the event loop"""
+        if self.cache is None:
+            return {}
+        return await self.cache.get_many_async(keys)
+
+    def _cache_set(self, key: Optional[str], value):
+        # Only LLM answers are stored; keyword fallbacks are cheap to recompute
+        # and caching them would hide the real answer once Ollama recovers
+        if key is not None:
+            self.cache.set(key, value)
+
+    def _keyword_scores(self, text: str) -> Dict[str, int]:
+        """Score sentiment polarities and all themes in one pass over the text"""
+        return self.keyword_index.score(text)
+
+    def _keyword_analysis(self, text: str, top_k: int = 3) -> Dict[str, any]:
+        """Keyword-based themes and sentiment sharing a single scan of the text"""
+        scores = self._keyword_scores(text)
+        return {
+            'themes': self._fallback_themes(text, top_k, scores=scores),
+            'sentiment': self._fast_sentiment(text, scores=scores)
+        }
+
+    def _fast_sentiment(self, text: str, scores: Dict[str, int] = None) -> str:
+        """Fast sentiment detection using keyword matching"""
+        if scores is None:
+            scores = self._keyword_scores(text)
+
+        positive_count = scores['positive']
+        negative_count = scores['negative']
 
         if positive_count > negative_count + 1:
             return 'positive'
@@ -93,6 +336,91 @@ Sentiment:"""
         else:
             return 'neutral'
 
+    def analyze_batch(self, texts: List[str], top_k: int = 3) -> List[Dict[str, any]]:
+        """
+        Predict themes and sentiment for many journal entries at once
+
+        Args:
+            texts: Journal entry texts
+            top_k: Number of top themes to return per entry
+
+        Returns:
+            One {'themes': [...], 'sentiment': ...} dict per text, in order
+        """
+        if self.use_ollama:
+            return [self.analyze(text, top_k) for text in texts]
+        return self.analyze_local(texts, top_k)
+
+    def analyze_local(self, texts: List[str], top_k: int = 3) -> List[Dict[str, any]]:
+        """Answer from the local tier (linear model, or keywords) even with Ollama enabled"""
+        return self._local_analysis(texts, top_k)[0]
+
+    def _local_analysis(self, texts: List[str], top_k: int = 3):
+        """
+        Analyze entries with the linear model, or keywords without one, and
+        report how decisive each answer is
+
+        Keyword margin: the smaller of the positive/negative keyword count gap
+        and the gap between the two best theme scores. Linear model margin:
+        the smaller of the equivalent probability gaps.
+
+        Returns:
+            Tuple of (results in the same order as texts, margins array)
+        """
+        if self.linear_model is not None:
+            return self.linear_model.analyze_with_margins(texts, top_k)
+
+        # One document-term matrix feeds both theme and sentiment scoring
+        scores = self.keyword_index.score_batch(texts)
+        results = [
+            {'themes': themes, 'sentiment': sentiment}
+            for themes, sentiment in zip(self._fallback_themes_batch(scores, top_k),
+                                         self._fast_sentiment_batch(scores))
+        ]
+        margins = np.minimum(np.abs(scores[:, 0] - scores[:, 1]), top_two_gap(scores[:, 2:]))
+        return results, margins
+
+    def _cascade_split(self, texts: List[str], top_k: int):
+        """
+        Split entries into those answered locally and those escalated to Ollama
+
+        Returns:
+            Tuple of ({index: local result} for decisive entries, indexes to escalate)
+        """
+        if self.cascade_threshold is None or not texts:
+            return {}, list(range(len(texts)))
+
+        results, margins = self._local_analysis(texts, top_k)
+        confident = margins >= self.cascade_threshold
+        local = {index: results[index] for index in np.flatnonzero(confident).tolist()}
+        escalate = np.flatnonzero(~confident).tolist()
+        record_cascade(len(local), len(escalate))
+        return local, escalate
+
+    def predict_sentiment_batch(self, texts: List[str]) -> List[str]:
+        """
+        Predict sentiment for many journal entries at once
+
+        Args:
+            texts: Journal entry texts
+
+        Returns:
+            Sentiments in the same order as texts
+        """
+        if self.use_ollama:
+            return [self.predict_sentiment(text) for text in texts]
+        if self.linear_model is not None:
+            return [result['sentiment'] for result in self.linear_model.analyze_batch(texts)]
+        return self._fast_sentiment_batch(self.keyword_index.score_batch(texts))
+
+    def _fast_sentiment_batch(self, scores: np.ndarray) -> List[str]:
+        """Vectorized _fast_sentiment over a (texts x labels) score matrix"""
+        positive = scores[:, 0]
+        negative = scores[:, 1]
+        sentiments = np.where(positive > negative + 1, 'positive',
+                              np.where(negative > positive + 1, 'negative', 'neutral'))
+        return sentiments.tolist()
+
     def predict(self, text: str, top_k: int = 3) -> List[Dict[str, any]]:
         """
         Predict themes from journal entry
@@ -104,90 +432,683 @@ Sentiment:"""
         Returns:
             List of theme predictions with confidence scores
         """
-        # Use fast keyword matching if Ollama is disabled
+        # Use the local model or fast keyword matching if Ollama is disabled
         if not self.use_ollama:
+            if self.linear_model is not None:
+                return self.linear_model.analyze_batch([text], top_k)[0]['themes']
+            return self._fallback_themes(text, top_k)
+
+        cache_key = self._cache_key(text, 'themes', top_k)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        if self.breaker.is_open():
+            record_fallback('themes', 'circuit_open')
             return self._fallback_themes(text, top_k)
 
+        chunks = self._chunks(text)
+        chunk_themes = []
+        weights = []
+        reason = 'no_valid_themes'
+        for chunk in chunks:
+            try:
+                response = self._generate(
+                    'themes',
+                    prompt=self._prompt_prefix('themes', top_k) + chunk,
+                    options={
+                        'temperature': 0.3,
+                        'num_predict': 100,  # Reduced for faster response
+                        'top_k': 10,
+                    }
+                )
+                response_text = response['response'].strip()
+
+            except Exception as e:
+                self._ollama_failed('themes', e)
+                return self._fallback_themes(text, top_k)
+
+            # Extract JSON from response
+            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+            try:
+                themes_data = json.loads(json_match.group()) if json_match else None
+            except ValueError:
+                themes_data = None
+
+            if themes_data is None:
+                logger.warning("Theme prediction returned no parseable JSON")
+                reason = 'json_parse'
+                continue
+
+            valid_themes = self._validate_themes(themes_data, top_k)
+            if valid_themes:
+                chunk_themes.append(valid_themes)
+                weights.append(len(chunk))
+
+        # If we got valid themes, return them
+        if chunk_themes:
+            if len(chunks) == 1:
+                valid_themes = chunk_themes[0]
+            else:
+                valid_themes = merge_themes(chunk_themes, weights, top_k)
+            self._cache_set(cache_key, valid_themes)
+            return valid_themes
+
+        # Fallback: return default themes
+        record_fallback('themes', reason)
+        return self._fallback_themes(text, top_k)
+
+    def _validate_themes(self, themes_data, top_k: int) -> List[Dict[str, any]]:
+        """Keep only well-formed theme predictions whose theme is in self.themes"""
+        valid_themes = []
+        if not isinstance(themes_data, list):
+            return valid_themes
+
+        for item in themes_data[:top_k]:
+            if isinstance(item, dict) and 'theme' in item and 'confidence' in item:
+                theme = str(item['theme']).lower().replace(' ', '_')
+                if theme in self.themes:
+                    valid_themes.append({
+                        'theme': theme,
+                        'confidence': float(item['confidence'])
+                    })
+        return valid_themes
+
+    def analyze(self, text: str, top_k: int = 3) -> Dict[str, any]:
+        """
+        Predict themes and sentiment of a journal entry with a single LLM request
+
+        Args:
+            text: Journal entry text
+            top_k: Number of top themes to return
+
+        Returns:
+            {'themes': [...], 'sentiment': 'positive' | 'negative' | 'neutral'}
+        """
+        if not self.use_ollama:
+            if self.linear_model is not None:
+                return self.linear_model.analyze_batch([text], top_k)[0]
+            return self._keyword_analysis(text, top_k)
+
+        local, _ = self._cascade_split([text], top_k)
+        if local:
+            return local[0]
+
+        cache_key = self._cache_key(text, 'analysis', top_k)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        if self.breaker.is_open():
+            record_fallback('analysis', 'circuit_open')
+            return self._keyword_analysis(text, top_k)
+
+        chunks = self._chunks(text)
+        parts = []
+        for chunk in chunks:
+            try:
+                response = self._generate(
+                    'analysis',
+                    prompt=self._analysis_prompt(chunk, top_k),
+                    format='json',
+                    options=ANALYSIS_OPTIONS
+                )
+            except Exception as e:
+                self._ollama_failed('analysis', e)
+                parts.append((self._keyword_analysis(chunk, top_k), True))
+                continue
+            parts.append(self._parse_analysis(chunk, response['response'], top_k))
+
+        result, fell_back = self._merge_analyses(parts, chunks, top_k)
+        if not fell_back:
+            self._cache_set(cache_key, result)
+        return result
+
+    async def analyze_batch_async(self, texts: List[str], top_k: int = 3, local: bool = False):
+        """
+        Analyze many journal entries with concurrent, bounded Ollama requests
+
+        Requests run at most self.max_concurrency at a time and each one is
+        limited to self.request_timeout seconds; entries that fail or time out
+        fall back to keyword analysis.
+
+        Args:
+            texts: Journal entry texts
+            top_k: Number of top themes to return per entry
+            local: Use the local tier only, e.g. to shed load
+
+        Returns:
+            Tuple of (results in the same order as texts, number of entries that
+            fell back, number of entries sent to Ollama)
+        """
+        results = [None] * len(texts)
+        degraded = escalated = 0
+        async for index, result, fell_back, sent in self.analyze_iter_async(texts, top_k, local):
+            results[index] = result
+            degraded += fell_back
+            escalated += sent
+        return results, degraded, escalated
+
+    async def analyze_iter_async(self, texts: List[str], top_k: int = 3, local: bool = False):
+        """
+        Analyze many journal entries, yielding each result as soon as it is ready
+
+        Args:
+            texts: Journal entry texts
+            top_k: Number of top themes to return per entry
+            local: Use the local tier only, e.g. to shed load
+
+        Yields:
+            Tuples of (index into texts, analysis, whether it fell back to keywords,
+            whether it was sent to Ollama)
+        """
+        if not self.use_ollama or local:
+            # Keyword and linear modes are CPU-bound; score in chunks so the first results
+            # go out without waiting for the whole history
+            for start in range(0, len(texts), STREAM_CHUNK_SIZE):
+                chunk = self.analyze_local(texts[start:start + STREAM_CHUNK_SIZE], top_k)
+                for offset, result in enumerate(chunk):
+                    yield start + offset, result, False, False
+                await asyncio.sleep(0)
+            return
+
+        # Decisive entries go out first without touching Ollama
+        local, escalate = self._cascade_split(texts, top_k)
+        for index, result in local.items():
+            yield index, result, False, False
+        if not escalate:
+            return
+
+        keys = {index: self._cache_key(texts[index], 'analysis', top_k) for index in escalate}
+        cached = await self._cache_get_many(list(keys.values()))
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Outside the service lifespan (scripts, benchmarks) use a client for this call only
+        client = self.async_client or self._make_async_client()
+
+        async def analyze_chunk(chunk):
+            async with semaphore:
+                try:
+                    response = await self._generate_async(
+                        client,
+                        'analysis',
+                        prompt=self._analysis_prompt(chunk, top_k),
+                        format='json',
+                        options=ANALYSIS_OPTIONS
+                    )
+                except Exception as e:
+                    self._ollama_failed('analysis', e)
+                    return self._keyword_analysis(chunk, top_k), True
+
+            return self._parse_analysis(chunk, response['response'], top_k)
+
+        async def analyze_one(index, text):
+            cache_key = keys[index]
+            if cache_key in cached:
+                return index, cached[cache_key], False, True
+            if self.breaker.is_open():
+                record_fallback('analysis', 'circuit_open')
+                return index, self._keyword_analysis(text, top_k), True, False
+
+            chunks = self._chunks(text)
+            parts = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks))
+            result, fell_back = self._merge_analyses(parts, chunks, top_k)
+            if not fell_back:
+                self._cache_set(cache_key, result)
+            return index, result, fell_back, True
+
+        tasks = [asyncio.ensure_future(analyze_one(index, texts[index])) for index in escalate]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            if client is not self.async_client:
+                await client._client.aclose()
+
+    async def analyze_grouped_async(self, texts: List[str], top_k: int = 3):
+        """
+        Analyze a batch of independent entries with as few Ollama requests as possible
+
+        Entries (or the chunks of long ones) are packed into multi-entry prompts
+        of up to max_entry_tokens and MAX_GROUP_ENTRIES entries. Entries missing
+        from an answer, or answered invalidly, fall back to keyword analysis.
+
+        Args:
+            texts: Journal entry texts
+            top_k: Number of top themes to return per entry
+
+        Returns:
+            List of (analysis, whether it fell back to keywords) in the same order as texts
+        """
+        if not self.use_ollama:
+            return [(result, False) for result in self.analyze_batch(texts, top_k)]
+
+        results = [None] * len(texts)
+        local, escalate = self._cascade_split(texts, top_k)
+        for index, result in local.items():
+            results[index] = (result, False)
+
+        keys = {index: self._cache_key(texts[index], 'analysis', top_k) for index in escalate}
+        cached = await self._cache_get_many(list(keys.values()))
+        chunks = {}
+        for index in escalate:
+            if keys[index] in cached:
+                results[index] = (cached[keys[index]], False)
+            else:
+                chunks[index] = self._chunks(texts[index])
+        if not chunks:
+            return results
+        if self.breaker.is_open():
+            record_fallback('multi_analysis', 'circuit_open', len(chunks))
+            for index in chunks:
+                results[index] = (self._keyword_analysis(texts[index], top_k), True)
+            return results
+
+        items = [(index, chunk) for index, entry_chunks in chunks.items() for chunk in entry_chunks]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        client = self.async_client or self._make_async_client()
+
+        async def analyze_group(group):
+            group_chunks = [chunk for _, chunk in group]
+            async with semaphore:
+                try:
+                    response = await self._generate_async(
+                        client,
+                        'multi_analysis',
+                        prompt=self._multi_analysis_prompt(group_chunks, top_k),
+                        format='json',
+                        options={**ANALYSIS_OPTIONS,
+                                 'num_predict': ANALYSIS_OPTIONS['num_predict'] * len(group)}
+                    )
+                except Exception as e:
+                    self._ollama_failed('multi_analysis', e, len(group))
+                    return [(self._keyword_analysis(chunk, top_k), True) for chunk in group_chunks]
+
+            return self._parse_multi_analysis(group_chunks, response['response'], top_k)
+
+        try:
+            answers = await asyncio.gather(*(analyze_group(group) for group in self._groups(items)))
+        finally:
+            if client is not self.async_client:
+                await client._client.aclose()
+
+        parts = {index: [] for index in chunks}
+        for (index, _), part in zip(items, (part for answer in answers for part in answer)):
+            parts[index].append(part)
+
+        for index, entry_chunks in chunks.items():
+            result, fell_back = self._merge_analyses(parts[index], entry_chunks, top_k)
+            if not fell_back:
+                self._cache_set(keys[index], result)
+            results[index] = (result, fell_back)
+        return results
+
+    def _groups(self, items: List[tuple]) -> List[List[tuple]]:
+        """Pack (index, chunk) items in order into groups within the prompt token budget"""
+        groups = []
+        group, tokens = [], 0
+        for item in items:
+            item_tokens = estimate_tokens(item[1])
+            if group and (tokens + item_tokens > self.max_entry_tokens or len(group) == MAX_GROUP_ENTRIES):
+                groups.append(group)
+                group, tokens = [], 0
+            group.append(item)
+            tokens += item_tokens
+        if group:
+            groups.append(group)
+        return groups
+
+    def _pool_limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_concurrency,
+                            max_keepalive_connections=self.max_concurrency)
+
+    def _make_async_client(self) -> ollama.AsyncClient:
+        return ollama.AsyncClient(host=self.host, timeout=self.request_timeout,
+                                  limits=self._pool_limits())
+
+    async def start(self):
+        """
+        Open the shared async client and, with Ollama enabled, preload and warm
+        the model in the background so startup is not blocked by model loading
+        """
+        self.async_client = self._make_async_client()
+        if self.use_ollama:
+            self._warmup_task = asyncio.create_task(self._warm_up())
+            self.breaker.probing = True
+            self._probe_task = asyncio.create_task(self._probe())
+
+    async def close(self):
+        """
+        Stop any pending warmup and the breaker probe, close the pooled clients and
+        write out cached results still pending
+        """
+        for task in (self._warmup_task, self._probe_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._warmup_task = self._probe_task = None
+        self.breaker.probing = False
+        if self.async_client is not None:
+            await self.async_client._client.aclose()
+            self.async_client = None
+        self.client._client.close()
+        if self.cache is not None:
+            self.cache.flush()
+
+    async def _warm_up(self):
+        """Load the model into memory, then run one analysis so the first request is fast"""
+        while not self.ready:
+            try:
+                start = time.perf_counter()
+                # An empty prompt only loads the model
+                await self.async_client.generate(model=self.model_name, prompt='',
+                                                 keep_alive=self.keep_alive)
+                await self.async_client.generate(
+                    model=self.model_name,
+                    prompt=self._analysis_prompt("Today was a good day.", 3),
+                    format='json',
+                    options=ANALYSIS_OPTIONS,
+                    keep_alive=self.keep_alive
+                )
+                self.ready = True
+                self.warmup_error = None
+                logger.info("Ollama model %s warmed up in %.1fs", self.model_name,
+                            time.perf_counter() - start)
+            except Exception as e:
+                self.warmup_error = repr(e)
+                logger.warning("Ollama warmup failed, retrying in %gs: %r", WARMUP_RETRY_INTERVAL, e)
+                await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+
+    async def _probe(self):
+        """
+        While the breaker is open, check every probe_interval seconds whether
+        Ollama answers again, and let trial requests through once it does
+        """
+        while True:
+            await asyncio.sleep(self.breaker.probe_interval)
+            if self.breaker.state != OPEN:
+                continue
+            try:
+                # An empty prompt only checks the model is loaded (and loads it)
+                await asyncio.wait_for(
+                    self.async_client.generate(model=self.model_name, prompt='',
+                                               keep_alive=self.keep_alive),
+                    timeout=self.request_timeout
+                )
+            except Exception as e:
+                logger.info("Ollama probe failed: %r", e)
+                continue
+            self.breaker.half_open()
+
+    def readiness(self) -> Dict[str, any]:
+        """Which tier serves requests and whether it is ready to"""
+        if self.use_ollama:
+            mode = 'ollama'
+        elif self.linear_model is not None:
+            mode = 'linear'
+        else:
+            mode = 'keyword'
+        status = {'ready': self.ready, 'mode': mode}
+        if self.use_ollama:
+            status['model'] = self.model_name
+            if self.warmup_error:
+                status['error'] = self.warmup_error
+            status['circuit'] = self.breaker.state
+        return status
+
+    def mode_key(self) -> str:
+        """Everything about this classifier's configuration that changes its answers"""
+        mode = self.readiness()['mode']
+        return f"{mode}:{self.model_name}:{self.cascade_threshold}:{self.max_entry_tokens}:{self.max_chunks}"
+
+    def _ollama_failed(self, call: str, error: Exception, count: int = 1):
+        """Log a failed Ollama call and count the keyword fallbacks it causes"""
+        if isinstance(error, CircuitOpen):
+            record_fallback(call, 'circuit_open', count)
+            return
+        logger.warning("Ollama %s call failed: %r", call, error)
+        timed_out = isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException))
+        record_fallback(call, 'timeout' if timed_out else 'exception', count)
+
+    def _generate(self, call: str, **kwargs):
+        """Pooled client generate with call count, latency and token metrics, behind the breaker"""
+        start = time.perf_counter()
+        try:
+            with self.breaker.guard():
+                response = self.client.generate(model=self.model_name, keep_alive=self.keep_alive, **kwargs)
+        except CircuitOpen:
+            raise
+        except Exception:
+            record_ollama_call(call, time.perf_counter() - start, outcome='error')
+            raise
+        record_ollama_call(call, time.perf_counter() - start, response)
+        return response
+
+    async def _generate_async(self, client, call: str, **kwargs):
+        """AsyncClient.generate bounded by request_timeout, with the same metrics as _generate"""
+        start = time.perf_counter()
+        try:
+            with self.breaker.guard():
+                response = await asyncio.wait_for(
+                    client.generate(model=self.model_name, keep_alive=self.keep_alive, **kwargs),
+                    timeout=self.request_timeout
+                )
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            outcome = 'timeout' if isinstance(e, asyncio.TimeoutError) else 'error'
+            record_ollama_call(call, time.perf_counter() - start, outcome=outcome)
+            raise
+        record_ollama_call(call, time.perf_counter() - start, response)
+        return response
+
+    def _analysis_prompt(self, text: str, top_k: int) -> str:
+        return self._prompt_prefix('analysis', top_k) + text
+
+    def _multi_analysis_prompt(self, texts: List[str], top_k: int) -> str:
+        entries = '\n\n'.join(f"[{number}] {text}" for number, text in enumerate(texts, 1))
+        return self._prompt_prefix('multi_analysis', top_k) + entries
+
+    def _prompt_prefix(self, mode: str, top_k: Optional[int] = None) -> str:
+        """
+        Fixed instructions for a prompt mode, ending where the entry text goes
+
+        The entry always comes last so consecutive prompts share the longest
+        possible prefix.
+        """
+        key = (mode, top_k)
+        prefix = self._prefixes.get(key)
+        if prefix is not None:
+            return prefix
+
         themes_str = ', '.join(self.themes)
+        if mode == 'sentiment':
+            prefix = """Analyze the sentiment of the journal entry below.
+Respond with ONLY one word: positive, negative, or neutral.
 
-        prompt = f"""Analyze this journal entry and identify the top {top_k} themes.
+Journal entry:
+"""
+        elif mode == 'themes':
+            prefix = f"""Analyze the journal entry below and identify the top {top_k} themes.
 Choose ONLY from these themes: {themes_str}
 
 For each theme, provide a confidence score between 0 and 1.
 
-Respond in this EXACT JSON format:
+Respond with JSON only, in this EXACT format:
 [
   {{"theme": "theme_name", "confidence": 0.85}},
   {{"theme": "theme_name", "confidence": 0.72}}
 ]
 
 Journal entry:
-{text}
+"""
+        elif mode == 'multi_analysis':
+            prefix = f"""Analyze each numbered journal entry below on its own.
+For each entry, identify its overall sentiment (positive, negative, or neutral) and its top {top_k} themes.
+Choose themes ONLY from: {themes_str}
 
-Themes (JSON only):"""
+For each theme, provide a confidence score between 0 and 1.
+
+Respond with a JSON object with one result per entry, in this EXACT format:
+{{"results": [{{"entry": 1, "sentiment": "positive", "themes": [{{"theme": "theme_name", "confidence": 0.85}}]}}]}}
 
+Journal entries:
+"""
+        else:
+            prefix = f"""Analyze the journal entry below.
+Identify its overall sentiment (positive, negative, or neutral) and its top {top_k} themes.
+Choose themes ONLY from: {themes_str}
+
+For each theme, provide a confidence score between 0 and 1.
+
+Respond with a JSON object in this EXACT format:
+{{"sentiment": "positive", "themes": [{{"theme": "theme_name", "confidence": 0.85}}]}}
+
+Journal entry:
+"""
+        self._prefixes[key] = prefix
+        return prefix
+
+    def _chunks(self, text: str) -> List[str]:
+        return split_to_budget(text, self.max_entry_tokens, self.max_chunks)
+
+    def _merge_analyses(self, parts, chunks: List[str], top_k: int):
+        """
+        Reduce per-chunk (analysis, fell_back) pairs to one answer for the entry
+
+        Returns:
+            Tuple of (analysis, whether any chunk fell back to keyword matching)
+        """
+        if len(parts) == 1:
+            return parts[0]
+
+        weights = [len(chunk) for chunk in chunks]
+        result = {
+            'themes': merge_themes([part['themes'] for part, _ in parts], weights, top_k),
+            'sentiment': merge_sentiments([part['sentiment'] for part, _ in parts], weights)
+        }
+        return result, any(fell_back for _, fell_back in parts)
+
+    def _parse_analysis(self, text: str, response_text: str, top_k: int):
+        """
+        Validate a combined analysis response
+
+        Returns:
+            Tuple of (analysis, whether it fell back to keyword matching)
+        """
         try:
-            response = ollama.generate(
-                model=self.model_name,
-                prompt=prompt,
-                options={
-                    'temperature': 0.3,
-                    'num_predict': 100,  # Reduced for faster response
-                    'top_k': 10,
-                }
-            )
-
-            response_text = response['response'].strip()
+            data = json.loads(response_text)
+        except ValueError as e:
+            logger.warning("Error parsing combined analysis: %s", e)
+            data = None
+        return self._validate_analysis(text, data, top_k)
 
-            # Extract JSON from response
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
-                themes_data = json.loads(json_match.group())
-
-                # Validate and clean themes
-                valid_themes = []
-                for item in themes_data[:top_k]:
-                    if isinstance(item, dict) and 'theme' in item and 'confidence' in item:
-                        theme = item['theme'].lower().replace(' ', '_')
-                        if theme in self.themes:
-                            valid_themes.append({
-                                'theme': theme,
-                                'confidence': float(item['confidence'])
-                            })
-
-                # If we got valid themes, return them
-                if valid_themes:
-                    return valid_themes
-
-            # Fallback: return default themes
-            return self._fallback_themes(text, top_k)
+    def _parse_multi_analysis(self, texts: List[str], response_text: str, top_k: int):
+        """
+        Validate a multi-entry analysis response
 
-        except Exception as e:
-            print(f"Error in theme prediction: {e}")
-            return self._fallback_themes(text, top_k)
+        Returns:
+            List of (analysis, whether it fell back to keyword matching), one per text
+        """
+        try:
+            data = json.loads(response_text)
+        except ValueError as e:
+            logger.warning("Error parsing multi-entry analysis: %s", e)
+            data = None
+
+        answers = {}
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            for item in data['results']:
+                if isinstance(item, dict) and isinstance(item.get('entry'), int):
+                    answers.setdefault(item['entry'], item)
+
+        parsed = []
+        for number, text in enumerate(texts, 1):
+            if number not in answers:
+                record_fallback('multi_analysis', 'missing_entry' if answers else 'json_parse')
+                parsed.append((self._keyword_analysis(text, top_k), True))
+            else:
+                parsed.append(self._validate_analysis(text, answers[number], top_k, 'multi_analysis'))
+        return parsed
+
+    def _validate_analysis(self, text: str, data, top_k: int, call: str = 'analysis'):
+        """Check one parsed {'sentiment', 'themes'} answer, falling back to keywords"""
+        if not isinstance(data, dict):
+            record_fallback(call, 'json_parse')
+            return self._keyword_analysis(text, top_k), True
+
+        themes = self._validate_themes(data.get('themes'), top_k)
+        sentiment = str(data.get('sentiment', '')).strip().lower()
+
+        if not themes:
+            # Fallback: keyword analysis
+            record_fallback(call, 'no_valid_themes')
+            return self._keyword_analysis(text, top_k), True
+
+        if sentiment not in ('positive', 'negative', 'neutral'):
+            # Usable themes but no usable sentiment label
+            record_fallback(call, 'invalid_sentiment')
+            return {'themes': themes, 'sentiment': self._fast_sentiment(text)}, True
+
+        return {'themes': themes, 'sentiment': sentiment}, False
+
+    def predict_batch(self, texts: List[str], top_k: int = 3) -> List[List[Dict[str, any]]]:
+        """
+        Predict themes for many journal entries at once
+
+        Args:
+            texts: Journal entry texts
+            top_k: Number of top themes to return per entry
+
+        Returns:
+            Theme predictions for each text, in the same order as texts
+        """
+        if self.use_ollama:
+            return [self.predict(text, top_k) for text in texts]
+        if self.linear_model is not None:
+            return [result['themes'] for result in self.linear_model.analyze_batch(texts, top_k)]
+        return self._fallback_themes_batch(self.keyword_index.score_batch(texts), top_k)
+
+    def _fallback_themes_batch(self, scores: np.ndarray, top_k: int = 3) -> List[List[Dict[str, any]]]:
+        """Vectorized _fallback_themes over a (texts x labels) score matrix"""
+        theme_scores = scores[:, 2:]
+        n_texts, n_themes = theme_scores.shape
+        k = min(top_k, n_themes)
+        if k <= 0:
+            return [[{'theme': 'daily_life', 'confidence': 0.6}] for _ in range(n_texts)]
+
+        # Break score ties by theme order, matching the stable sort in _fallback_themes
+        rank_keys = theme_scores * n_themes + np.arange(n_themes - 1, -1, -1)
+        top = np.argpartition(-rank_keys, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(rank_keys, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        top_scores = np.take_along_axis(theme_scores, top, axis=1)
+        confidences = np.minimum(0.5 + top_scores * 0.1, 0.9)
 
-    def _fallback_themes(self, text: str, top_k: int = 3) -> List[Dict[str, any]]:
+        results = []
+        for theme_ids, row_scores, row_confidences in zip(top.tolist(), top_scores.tolist(),
+                                                          confidences.tolist()):
+            themes = [
+                {'theme': self.theme_labels[theme_id], 'confidence': confidence}
+                for theme_id, score, confidence in zip(theme_ids, row_scores, row_confidences)
+                if score > 0
+            ]
+            results.append(themes or [{'theme': 'daily_life', 'confidence': 0.6}])
+        return results
+
+    def _fallback_themes(self, text: str, top_k: int = 3,
+                         scores: Dict[str, int] = None) -> List[Dict[str, any]]:
         """Fallback theme detection using simple keyword matching"""
-        text_lower = text.lower()
-
-        theme_keywords = {
-            'gratitude': ['grateful', 'thankful', 'appreciate', 'blessed', 'fortunate'],
-            'personal_growth': ['learn', 'grow', 'improve', 'develop', 'progress'],
-            'relationships': ['friend', 'family', 'love', 'relationship', 'together'],
-            'work': ['work', 'job', 'career', 'project', 'meeting', 'colleague'],
-            'health': ['health', 'exercise', 'fitness', 'sleep', 'workout'],
-            'creativity': ['create', 'art', 'music', 'write', 'design', 'idea'],
-            'daily_life': ['day', 'morning', 'evening', 'routine', 'daily'],
-            'reflection': ['reflect', 'think', 'realize', 'understand', 'discover'],
-            'challenges': ['challenge', 'difficult', 'struggle', 'hard', 'problem'],
-            'achievements': ['achieve', 'accomplish', 'success', 'goal', 'proud'],
-            'emotions': ['feel', 'emotion', 'happy', 'sad', 'angry', 'excited'],
-            'future_planning': ['plan', 'future', 'goal', 'hope', 'dream', 'will']
-        }
+        if scores is None:
+            scores = self._keyword_scores(text)
 
         theme_scores = {}
-        for theme, keywords in theme_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
+        for theme in THEME_KEYWORDS:
+            score = scores[theme]
             if score > 0:
                 theme_scores[theme] = score
 
@@ -209,5 +1130,28 @@ Themes (JSON only):"""
         return results
 
 
+def parse_keep_alive(value: Optional[str]):
+    """Ollama keep_alive from an env string: a duration like '30m', or seconds (-1 keeps the model loaded)"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
 # Create a singleton instance
-classifier = OllamaClassifier()
+classifier = OllamaClassifier(
+    model_name=os.getenv('OLLAMA_MODEL', 'llama3.2'),
+    use_ollama=os.getenv('USE_OLLAMA', 'false').lower() in ('1', 'true', 'yes'),
+    cache=ClassificationCache.from_env(),
+    max_concurrency=int(os.getenv('OLLAMA_MAX_CONCURRENCY', 4)),
+    request_timeout=float(os.getenv('OLLAMA_REQUEST_TIMEOUT', 20)),
+    linear_model=LinearClassifier.from_env(),
+    cascade_threshold=float(os.getenv('CASCADE_THRESHOLD')) if os.getenv('CASCADE_THRESHOLD') else None,
+    host=os.getenv('OLLAMA_HOST') or None,
+    keep_alive=parse_keep_alive(os.getenv('OLLAMA_KEEP_ALIVE')),
+    max_entry_tokens=int(os.getenv('OLLAMA_MAX_ENTRY_TOKENS', 1024)),
+    max_chunks=int(os.getenv('OLLAMA_MAX_CHUNKS', 4)),
+    breaker=CircuitBreaker.from_env('ollama')
+)
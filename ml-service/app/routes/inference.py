@@ -1,6 +1,13 @@
 # type: ignore
 
+import os
+from contextlib import AsyncExitStack
+
+import numpy as np
+import orjson
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import List, Optional
 
@@ -8,219 +15,411 @@ router = APIRouter()
 
 # Import Ollama classifier
 from app.models.ollama_classifier import classifier
+from app.utils.admission import AdmissionController, Overloaded
+from app.utils.aggregation import HistoryAggregator
+from app.utils.analytics import parse_days, weekday_counts
+from app.utils.batching import MicroBatcher
+from app.utils.dedup import near_duplicate_groups
+from app.utils.insights_store import InsightsStore
+from app.utils.metrics import timed
+from app.utils.prompts import PromptLibrary
+from app.utils.sampling import stratified_sample
+from app.utils.singleflight import SingleFlight, payload_digest
+from app.schemas import (
+    AnalyzeHistoryRequest, AnalyzeHistoryResponse, ClassifyEntryRequest, ClassifyEntryResponse,
+    InsightsSyncRequest, InsightsResponse, RandomPromptResponse, SuggestPromptRequest,
+    SuggestPromptResponse
+)
+
+# Per-user running insights, fed with entry deltas
+insights_store = InsightsStore(max_users=int(os.getenv('INSIGHTS_STORE_MAX_USERS', 1000)))
+
+# Writing prompts indexed by classifier theme, reloaded when the file changes
+prompt_library = PromptLibrary.from_env(classifier.themes)
+
+# Shingle similarity at which history entries share one classification (unset: off)
+near_duplicate_threshold = float(os.getenv('NEAR_DUPLICATE_THRESHOLD')) if os.getenv('NEAR_DUPLICATE_THRESHOLD') else None
 
-@router.post("/analyze-user-history")
-async def analyze_user_history(request: dict):
+# Identical concurrent history analyses (pull-to-refresh, retries) share one computation
+history_flights = SingleFlight('analyze-user-history')
+
+# Bounded in-flight budgets per classifier mode, with load-based degradation to the local tier
+admission = AdmissionController.from_env(classifier)
+
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e),
+                         headers={"Retry-After": str(admission.retry_after)})
+
+async def classify_micro_batch(texts: List[str]) -> List[tuple]:
+    """
+    Classify one micro-batch of /classify-entry texts under a single admission slot
+
+    Admitting the batch rather than each request keeps the LLM lane's budget
+    and queue depth counted in Ollama-bound batches, so a burst of requests
+    waiting to be batched together is not degraded by its own size.
+
+    Args:
+        texts: Entry texts of the batch
+
+    Returns:
+        List of (analysis, whether it fell back to keywords, whether the batch was degraded)
+    """
+    async with admission.slot() as degraded_mode:
+        if degraded_mode:
+            return [(result, False, True) for result in classifier.analyze_local(texts)]
+        return [(result, fell_back, False)
+                for result, fell_back in await classifier.analyze_grouped_async(texts)]
+
+# Concurrent single-entry requests are classified together, one admission slot
+# and one batched call per micro-batch
+entry_batcher = MicroBatcher(
+    classify_micro_batch,
+    'classify-entry',
+    max_batch_size=int(os.getenv('CLASSIFY_BATCH_MAX_SIZE', 32)),
+    max_wait=float(os.getenv('CLASSIFY_BATCH_MAX_WAIT_MS', 10)) / 1000
+)
+
+@router.post("/classify-entry", response_model=ClassifyEntryResponse)
+async def classify_entry(request: ClassifyEntryRequest):
+    """Classify a single journal entry"""
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="No text provided")
+
+    try:
+        with timed('classify'):
+            result, fell_back, degraded_mode = await entry_batcher.submit(request.text)
+
+        return {
+            "success": True,
+            "themes": result['themes'],
+            "sentiment": result['sentiment'],
+            "degraded": fell_back,
+            "degraded_mode": degraded_mode
+        }
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Fields the handler did not set (margins and sampling of approximate analyses) stay out of the response
+@router.post("/analyze-user-history", response_model=AnalyzeHistoryResponse,
+             response_model_exclude_unset=True)
+async def analyze_user_history(request: AnalyzeHistoryRequest):
     """
     Comprehensive analysis of all user entries
     Returns themes, sentiment trends, patterns over time
+
+    With "approximate": true only a time-stratified sample is classified, sized
+    so theme and sentiment shares are within max_error at the given confidence;
+    estimates then carry *_margin fields.
+
+    With a near-duplicate threshold (near_duplicate_threshold, or the
+    NEAR_DUPLICATE_THRESHOLD default), entries whose word shingles are at
+    least that similar are classified once, through the longest of them;
+    a request threshold of 0 turns this off.
+
+    With "time_analytics": true, full-history analyses add weekly, monthly and
+    weekday trends computed from the entries' dates.
     """
     try:
-        entries = request.get('entries', [])
+        entries = request.entries
 
         if not entries:
             raise HTTPException(status_code=400, detail="No entries provided")
 
-        # Analyze each entry
-        all_themes = {}
-        sentiments_over_time = []
-        theme_timeline = []
+        approximate = (request.max_error, request.confidence) if request.approximate else None
+        dedup_threshold = near_duplicate_threshold
+        if request.near_duplicate_threshold is not None:
+            # An explicit 0 turns grouping off, overriding the service default
+            dedup_threshold = request.near_duplicate_threshold or None
+        key = payload_digest(
+            [(entry.get('id'), entry.get('content', ''), entry.get('created_at', '')) for entry in entries],
+            classifier.mode_key(),
+            approximate,
+            dedup_threshold,
+            request.time_analytics
+        )
+        if approximate:
+            # Seeded by the payload, so retries of one request see the same sample
+            return await history_flights.run(key, lambda: run_history_analysis(
+                entries, *approximate, seed=int(key[:16], 16), dedup_threshold=dedup_threshold))
+        return await history_flights.run(key, lambda: run_history_analysis(
+            entries, dedup_threshold=dedup_threshold, with_time_analytics=request.time_analytics))
 
-        for entry in entries:
-            text = entry.get('content', '')
-            date = entry.get('created_at', '')
+    except HTTPException:
+        raise
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            if not text:
-                continue
 
-            # Use Ollama classifier
-            themes = classifier.predict(text)
-            sentiment = classifier.predict_sentiment(text)
-            
-            # Aggregate themes
-            for theme_obj in themes:
-                theme = theme_obj['theme']
-                confidence = theme_obj['confidence']
-                
-                if theme not in all_themes:
-                    all_themes[theme] = {
-                        'count': 0,
-                        'total_confidence': 0,
-                        'entries': []
-                    }
-                
-                all_themes[theme]['count'] += 1
-                all_themes[theme]['total_confidence'] += confidence
-                all_themes[theme]['entries'].append({
-                    'date': date,
-                    'confidence': confidence
-                })
-            
-            # Track sentiment over time
-            sentiments_over_time.append({
-                'date': date,
-                'sentiment': sentiment
-            })
-            
-            # Track theme timeline
-            theme_timeline.append({
-                'date': date,
-                'themes': [t['theme'] for t in themes[:2]],  # Top 2 themes
-                'sentiment': sentiment
-            })
-        
-        # Calculate theme statistics
-        theme_stats = []
-        for theme, data in all_themes.items():
-            avg_confidence = data['total_confidence'] / data['count']
-            theme_stats.append({
-                'theme': theme,
-                'count': data['count'],
-                'percentage': round((data['count'] / len(entries)) * 100, 1),
-                'avg_confidence': round(avg_confidence, 3),
-                'trend': analyze_theme_trend(data['entries'])
-            })
-        
-        # Sort by count
-        theme_stats.sort(key=lambda x: x['count'], reverse=True)
-        
-        # Analyze sentiment trends
-        sentiment_trends = analyze_sentiment_trends(sentiments_over_time)
-        
-        # Find patterns
-        patterns = find_writing_patterns(entries, theme_timeline)
-        
-        return {
+async def run_history_analysis(entries, max_error: Optional[float] = None,
+                               confidence: float = 0.95, seed: Optional[int] = None,
+                               dedup_threshold: Optional[float] = None,
+                               with_time_analytics: bool = False):
+    """
+    Classify and aggregate a history into the /analyze-user-history response
+
+    With max_error, only a time-stratified sample of the entries is classified
+    (when it is smaller than the history) and the analysis holds estimates.
+    With dedup_threshold, one entry per group of near-duplicates is classified
+    and its result reused for the others. with_time_analytics adds the
+    time_analytics block to full-history analyses.
+    """
+    entries_with_text = [entry for entry in entries if entry.get('content')]
+
+    sample = None
+    if max_error is not None:
+        with timed('sample'):
+            days = parse_days([entry.get('created_at', '') for entry in entries_with_text])
+            sample = stratified_sample(days, weekday_counts(days), max_error, confidence, seed=seed)
+    positions = sample.indexes.tolist() if sample is not None else range(len(entries_with_text))
+    texts = [entries_with_text[index]['content'] for index in positions]
+
+    # Classify one representative per near-duplicate group
+    representative = None
+    if dedup_threshold is not None and texts:
+        with timed('dedup'):
+            representative = near_duplicate_groups(texts, dedup_threshold)
+            distinct, representative = np.unique(representative, return_inverse=True)
+            texts = [texts[index] for index in distinct.tolist()]
+
+    # Classify the whole history in one batched call; with Ollama enabled
+    # the requests fan out concurrently without blocking the event loop.
+    # Coalesced callers share the leader's admission and answer
+    async with admission.slot() as degraded_mode:
+        with timed('classify'):
+            results, degraded_entries, escalated_entries = await classifier.analyze_batch_async(
+                texts, local=degraded_mode
+            )
+
+    if representative is not None:
+        results = [results[group] for group in representative.tolist()]
+
+    with timed('aggregate'):
+        aggregator = HistoryAggregator(len(entries), sample, with_time_analytics)
+        for index, result in zip(positions, results):
+            entry = entries_with_text[index]
+            aggregator.add(index, entry.get('created_at', ''), result['themes'], result['sentiment'])
+
+    response = {
+        "success": True,
+        "total_entries": len(entries),
+        "degraded_entries": degraded_entries,
+        "escalated_entries": escalated_entries,
+        "degraded_mode": degraded_mode,
+        "analysis": aggregator.result()
+    }
+    if max_error is not None:
+        response["sampled_entries"] = len(positions)
+        response["confidence"] = confidence
+    if representative is not None:
+        response["classifications_saved"] = len(positions) - len(texts)
+    return response
+
+
+@router.post("/analyze-user-history/stream")
+async def analyze_user_history_stream(request: AnalyzeHistoryRequest):
+    """
+    Streaming variant of /analyze-user-history
+
+    Emits newline-delimited JSON: one {"type": "entry"} line per entry as soon
+    as it is classified, then a final {"type": "summary"} line carrying the
+    same fields as the non-streaming response.
+    """
+    entries = request.entries
+
+    if not entries:
+        raise HTTPException(status_code=400, detail="No entries provided")
+
+    # The admission slot is taken before the response starts, so overload is still a 503,
+    # and released once the response has been sent (or the client went away)
+    admitted = AsyncExitStack()
+    try:
+        degraded_mode = await admitted.enter_async_context(admission.slot())
+    except Overloaded as e:
+        raise overloaded(e)
+
+    return StreamingResponse(stream_history_analysis(entries, degraded_mode, request.time_analytics),
+                             media_type="application/x-ndjson",
+                             background=BackgroundTask(admitted.aclose))
+
+
+async def stream_history_analysis(entries, degraded_mode: bool = False,
+                                  with_time_analytics: bool = False):
+    """Classify entries and yield NDJSON lines, aggregating as results arrive"""
+    positions = [index for index, entry in enumerate(entries) if entry.get('content')]
+    texts = [entries[index]['content'] for index in positions]
+
+    aggregator = HistoryAggregator(len(entries), with_time_analytics=with_time_analytics)
+    degraded_entries = escalated_entries = 0
+
+    try:
+        async for index, result, fell_back, escalated in classifier.analyze_iter_async(
+                texts, local=degraded_mode):
+            entry = entries[positions[index]]
+            aggregator.add(index, entry.get('created_at', ''), result['themes'], result['sentiment'])
+            degraded_entries += fell_back
+            escalated_entries += escalated
+
+            yield orjson.dumps({
+                "type": "entry",
+                "index": positions[index],
+                "id": entry.get('id'),
+                "date": entry.get('created_at', ''),
+                "themes": result['themes'],
+                "sentiment": result['sentiment'],
+                "degraded": fell_back,
+                "escalated": escalated
+            }) + b"\n"
+
+        yield orjson.dumps({
+            "type": "summary",
             "success": True,
             "total_entries": len(entries),
-            "analysis": {
-                "themes": theme_stats[:7],  # Top 7 themes
-                "sentiment_trends": sentiment_trends,
-                "patterns": patterns,
-                "timeline": theme_timeline[-10:]  # Last 10 entries
-            }
+            "degraded_entries": degraded_entries,
+            "escalated_entries": escalated_entries,
+            "degraded_mode": degraded_mode,
+            "analysis": aggregator.result()
+        }) + b"\n"
+
+    except Exception as e:
+        yield orjson.dumps({"type": "error", "detail": str(e)}) + b"\n"
+
+
+# Like the GET, fields only approximate analyses fill (margins, sampling) stay out of the response
+@router.post("/insights/{user_id}/entries", response_model=InsightsResponse,
+             response_model_exclude_none=True)
+async def sync_user_entries(user_id: str, request: InsightsSyncRequest):
+    """
+    Apply new, edited and deleted entries to a user's stored insights
+
+    Only upserted entries whose content or date changed are classified, so the
+    cost is proportional to the delta rather than the full history.
+    Body: {"upserts": [{"id", "content", "created_at"}], "deletes": [ids], "reset": false}
+    """
+    upserts = request.upserts
+    deletes = request.deletes
+
+    if any(entry.get('id') is None for entry in upserts):
+        raise HTTPException(status_code=400, detail="Every upserted entry needs an id")
+
+    try:
+        # One sync per user at a time, so a concurrent reset cannot swap the state out
+        # from under this one. Admitted before touching the stored state, so a 503
+        # leaves it as it was
+        async with insights_store.syncing(user_id), admission.slot() as degraded_mode:
+            if request.reset:
+                insights_store.reset(user_id)
+            state = insights_store.get(user_id, create=True)
+
+            changed = [
+                entry for entry in upserts
+                if not state.is_current(entry['id'], entry.get('content') or '', entry.get('created_at', ''))
+            ]
+            to_classify = [entry for entry in changed if entry.get('content')]
+            with timed('classify'):
+                results, degraded_entries, escalated_entries = await classifier.analyze_batch_async(
+                    [entry['content'] for entry in to_classify], local=degraded_mode
+                )
+            results_by_entry = {id(entry): result for entry, result in zip(to_classify, results)}
+            # Other users' syncs may have evicted the state while this one classified
+            insights_store.put(user_id, state)
+
+            with timed('aggregate'):
+                for entry_id in deletes:
+                    state.remove(entry_id)
+
+                for entry in changed:
+                    result = results_by_entry.get(id(entry), {'themes': None, 'sentiment': None})
+                    state.upsert(entry['id'], entry.get('content') or '', entry.get('created_at', ''),
+                                 result['themes'], result['sentiment'])
+
+                analysis = state.result()
+
+        return {
+            "success": True,
+            "total_entries": state.total_entries,
+            "classified_entries": len(to_classify),
+            "degraded_entries": degraded_entries,
+            "escalated_entries": escalated_entries,
+            "degraded_mode": degraded_mode,
+            "analysis": analysis
         }
-        
+
+    except Overloaded as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def analyze_theme_trend(entries):
-    """Determine if theme is increasing, decreasing, or stable"""
-    if len(entries) < 3:
-        return 'stable'
-    
-    # Compare first half vs second half
-    mid = len(entries) // 2
-    first_half = entries[:mid]
-    second_half = entries[mid:]
-    
-    first_avg = sum(e['confidence'] for e in first_half) / len(first_half)
-    second_avg = sum(e['confidence'] for e in second_half) / len(second_half)
-    
-    if second_avg > first_avg * 1.2:
-        return 'increasing'
-    elif second_avg < first_avg * 0.8:
-        return 'decreasing'
-    else:
-        return 'stable'
-
-
-def analyze_sentiment_trends(sentiments_over_time):
-    """Analyze how sentiment changes over time"""
-    if not sentiments_over_time:
-        return {}
-    
-    total = len(sentiments_over_time)
-    positive_count = sum(1 for s in sentiments_over_time if s['sentiment'] == 'positive')
-    negative_count = sum(1 for s in sentiments_over_time if s['sentiment'] == 'negative')
-    neutral_count = total - positive_count - negative_count
-    
-    # Recent trend (last 10 entries)
-    recent = sentiments_over_time[-10:]
-    recent_positive = sum(1 for s in recent if s['sentiment'] == 'positive')
-    
+@router.get("/insights/{user_id}", response_model=InsightsResponse, response_model_exclude_none=True)
+def get_user_insights(user_id: str):
+    """Insights from a user's stored state, without reprocessing any entries"""
+    state = insights_store.get(user_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No stored insights for this user; sync entries first")
+
     return {
-        'overall': {
-            'positive': positive_count,
-            'negative': negative_count,
-            'neutral': neutral_count,
-            'positive_percentage': round((positive_count / total) * 100, 1)
-        },
-        'recent_trend': 'mostly_positive' if recent_positive >= 6 else 
-                       'mostly_negative' if recent_positive <= 3 else 'mixed'
+        "success": True,
+        "total_entries": state.total_entries,
+        "analysis": state.result()
     }
 
 
-def find_writing_patterns(entries, theme_timeline):
-    """Find interesting patterns in writing behavior"""
-    patterns = []
-    
-    # Writing frequency
-    if len(entries) >= 30:
-        patterns.append({
-            'type': 'consistency',
-            'message': f'You\'ve written {len(entries)} entries! You\'re building a strong journaling habit.'
-        })
-    
-    # Theme diversity
-    unique_themes = set()
-    for item in theme_timeline:
-        unique_themes.update(item['themes'])
-    
-    if len(unique_themes) >= 5:
-        patterns.append({
-            'type': 'diversity',
-            'message': f'You explore {len(unique_themes)} different themes in your writing.'
-        })
-    
-    # Recent activity
-    if len(theme_timeline) > 0:
-        recent_themes = theme_timeline[-5:]
-        recent_theme_list = []
-        for item in recent_themes:
-            recent_theme_list.extend(item['themes'])
-        
-        from collections import Counter
-        most_common = Counter(recent_theme_list).most_common(1)
-        if most_common:
-            patterns.append({
-                'type': 'recent_focus',
-                'message': f'Recently, you\'ve been focusing on {most_common[0][0]}.'
-            })
-    
-    return patterns
+@router.get("/cache-stats")
+def cache_stats():
+    """Classification cache hit/miss counters"""
+    if classifier.cache is None:
+        return {"success": True, "enabled": False}
+    return {"success": True, "enabled": True, **classifier.cache.stats()}
+
+
+@router.post("/suggest-prompt", response_model=SuggestPromptResponse)
+async def suggest_prompt(request: SuggestPromptRequest):
+    """
+    Suggest writing prompts for a user's themes
+
+    Body: {"themes": analysis.themes from /analyze-user-history (or [{"theme", "weight"}]),
+    "limit": 3}; older clients may send {"recent_themes": [names, most relevant first]}
+    """
+    weights = {}
+    for item in request.themes:
+        if item.weight is not None:
+            weight = item.weight
+        else:
+            weight = (item.percentage / 100 if item.percentage is not None else 1.0) * \
+                (item.avg_confidence if item.avg_confidence is not None else 1.0)
+        weights[item.theme] = weights.get(item.theme, 0.0) + weight
+    for rank, theme in enumerate(request.recent_themes):
+        weights[theme] = weights.get(theme, 0.0) + 1.0 / (rank + 1)
+
+    try:
+        with timed('prompts'):
+            prompts = prompt_library.suggest(weights, request.limit)
+        return {"success": True, "prompts": prompts}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/random-prompt", response_model=RandomPromptResponse)
+async def random_prompt():
+    """Get a random prompt"""
+    return {"success": True, **prompt_library.random_prompt()}
 
 
 # from fastapi import APIRouter, HTTPException
 # from pydantic import BaseModel
 # from typing import List, Optional
 # from app.models.bert_classifier import classifier
-# from app.utils.prompts import prompt_library
 
 # router = APIRouter()
 
-# class EntryRequest(BaseModel):
-#     text: str
-
 # class AnalysisRequest(BaseModel):
 #     entries: List[str]
 
-# @router.post("/classify-entry")
-# async def classify_entry(request: EntryRequest):
-#     """Classify a single journal entry"""
-#     try:
-#         themes = classifier.predict(request.text)
-#         sentiment = classifier.predict_sentiment(request.text)
-        
-#         return {
-#             "success": True,
-#             "themes": themes,
-#             "sentiment": sentiment
-#         }
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=str(e))
-
 # @router.post("/analyze-patterns")
 # async def analyze_patterns(request: AnalysisRequest):
 #     """Analyze multiple entries for patterns"""
@@ -254,34 +453,6 @@ def find_writing_patterns(entries, theme_timeline):
 #     except Exception as e:
 #         raise HTTPException(status_code=500, detail=str(e))
 
-# @router.post("/suggest-prompt")
-# async def suggest_prompt(request: dict):
-#     """Suggest writing prompt based on themes"""
-#     try:
-#         themes = request.get('recent_themes', ['daily_life'])
-#         prompts = prompt_library.get_prompts_by_themes(themes)
-        
-#         return {
-#             "success": True,
-#             "prompts": prompts
-#         }
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=str(e))
-
-# @router.get("/random-prompt")
-# async def random_prompt():
-#     """Get a random prompt"""
-#     import random
-#     themes = list(prompt_library.prompts.keys())
-#     theme = random.choice(themes)
-#     prompt = prompt_library.get_prompt_by_theme(theme)
-    
-#     return {
-#         "success": True,
-#         "theme": theme,
-#         "prompt": prompt
-#     }
-
 
 
 
@@ -0,0 +1,63 @@
+# type: ignore
+
+from fastapi import APIRouter, HTTPException
+
+router = APIRouter()
+
+from app.models.ollama_classifier import classifier
+from app.routes.inference import admission
+from app.utils.jobs import AnalysisJobs, COMPLETED, JobQueueFull
+from app.schemas import AnalyzeHistoryRequest, AnalyzeHistoryResponse, JobStatusResponse
+
+# Background history analyses; the app lifespan opens the job store and starts the workers.
+# Job batches share the interactive routes' admission budgets
+analysis_jobs = AnalysisJobs.from_env(classifier, admission)
+
+@router.post("/jobs/analyze-user-history", response_model=JobStatusResponse, status_code=202)
+async def submit_history_analysis(request: AnalyzeHistoryRequest):
+    """
+    Queue a full history analysis and return at once
+
+    Poll GET /jobs/{job_id} for progress, then fetch GET /jobs/{job_id}/result.
+    Same body as /analyze-user-history, without its size or time limits.
+    """
+    if not request.entries:
+        raise HTTPException(status_code=400, detail="No entries provided")
+
+    try:
+        status = analysis_jobs.submit(request.entries, request.time_analytics)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    return {"success": True, **status}
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job_status(job_id: str):
+    """Status and progress of an analysis job"""
+    status = analysis_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {"success": True, **status}
+
+
+# Like /analyze-user-history, fields the analysis did not set stay out of the response
+@router.get("/jobs/{job_id}/result", response_model=AnalyzeHistoryResponse,
+            response_model_exclude_unset=True)
+def get_job_result(job_id: str):
+    """Result of a completed job, in the /analyze-user-history response format"""
+    status = analysis_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if status["status"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}")
+    return analysis_jobs.result(job_id)
+
+
+@router.delete("/jobs/{job_id}", response_model=JobStatusResponse)
+def cancel_job(job_id: str):
+    """Cancel a queued or running job; finished jobs are returned unchanged"""
+    status = analysis_jobs.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {"success": True, **status}
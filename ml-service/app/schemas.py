@@ -0,0 +1,212 @@
+"""
+Request and response models for the inference API
+"""
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field
+from typing_extensions import NotRequired, TypedDict
+
+EntryId = Union[int, str]
+
+
+# A TypedDict rather than a model: histories run to tens of thousands of entries and
+# validating into plain dicts costs little more than json.loads, where one model
+# instance per entry doubled the parse time. Absent fields read as .get(field, '').
+class JournalEntry(TypedDict):
+    # The backend sends full journal rows (ai_themes, ai_sentiment, ...); only these fields are used
+    __pydantic_config__ = ConfigDict(extra='ignore')
+
+    id: NotRequired[Optional[EntryId]]
+    content: NotRequired[Optional[str]]
+    created_at: NotRequired[Optional[str]]
+
+
+class AnalyzeHistoryRequest(BaseModel):
+    entries: List[JournalEntry] = []
+    # Add the weekly/monthly/weekday time_analytics block to full-history analyses
+    time_analytics: bool = False
+    # Classify a time-stratified sample instead of every entry and return estimates
+    approximate: bool = False
+    # Half-width of the confidence interval wanted for theme and sentiment shares
+    max_error: float = Field(0.05, gt=0, lt=0.5)
+    confidence: float = Field(0.95, gt=0, lt=1)
+    # Word shingle (Jaccard) similarity at which entries share one classification;
+    # overrides NEAR_DUPLICATE_THRESHOLD, and 0 disables grouping for this request
+    near_duplicate_threshold: Optional[float] = Field(None, ge=0, le=1)
+
+
+class ClassifyEntryRequest(BaseModel):
+    text: str
+
+
+class InsightsSyncRequest(BaseModel):
+    upserts: List[JournalEntry] = []
+    deletes: List[EntryId] = []
+    reset: bool = False
+
+
+class ThemeScore(BaseModel):
+    theme: str
+    confidence: float
+
+
+class ClassifyEntryResponse(BaseModel):
+    success: bool
+    themes: List[ThemeScore]
+    sentiment: str
+    degraded: bool = False
+    # Answered by the local tier because the service was shedding LLM load
+    degraded_mode: bool = False
+
+
+class ThemeStat(BaseModel):
+    theme: str
+    count: int
+    percentage: float
+    avg_confidence: float
+    trend: str
+    # Approximate analyses only: CI half-widths of the estimates
+    percentage_margin: Optional[float] = None
+    avg_confidence_margin: Optional[float] = None
+
+
+class SentimentOverall(BaseModel):
+    positive: int
+    negative: int
+    neutral: int
+    positive_percentage: float
+    # Approximate analyses only
+    positive_percentage_margin: Optional[float] = None
+
+
+class SentimentTrends(BaseModel):
+    overall: SentimentOverall
+    recent_trend: str
+
+
+class Pattern(BaseModel):
+    type: str
+    message: str
+
+
+class TimelineItem(BaseModel):
+    date: Optional[str] = ''
+    themes: List[str]
+    sentiment: str
+
+
+class TimeBucket(BaseModel):
+    period_start: str
+    entries: int
+    positive: int
+    negative: int
+    neutral: int
+    positive_ratio: Optional[float] = None
+    rolling_positive_ratio: Optional[float] = None
+
+
+class ThemeSlope(BaseModel):
+    theme: str
+    entries: int
+    slope_per_30_days: float
+    trend: str
+
+
+class WeekdayActivity(BaseModel):
+    day: str
+    entries: int
+    positive_ratio: Optional[float] = None
+
+
+class TimeAnalytics(BaseModel):
+    undated_entries: int
+    weekly: List[TimeBucket]
+    monthly: List[TimeBucket]
+    theme_slopes: List[ThemeSlope]
+    day_of_week: List[WeekdayActivity]
+
+
+class HistoryAnalysis(BaseModel):
+    themes: List[ThemeStat]
+    # Empty object when no entry had any text
+    sentiment_trends: Union[SentimentTrends, Dict[str, Any]]
+    patterns: List[Pattern]
+    timeline: List[TimelineItem]
+    # Full-history analyses requested with time_analytics only; empty object when
+    # no entry had a usable date
+    time_analytics: Optional[Union[TimeAnalytics, Dict[str, Any]]] = None
+
+
+class AnalyzeHistoryResponse(BaseModel):
+    success: bool
+    total_entries: int
+    degraded_entries: int = 0
+    escalated_entries: int = 0
+    degraded_mode: bool = False
+    # Approximate analyses only: entries classified and the confidence level of the margins
+    sampled_entries: Optional[int] = None
+    confidence: Optional[float] = None
+    # Near-duplicate detection only: entries that reused another entry's classification
+    classifications_saved: Optional[int] = None
+    analysis: HistoryAnalysis
+
+
+class InsightsResponse(BaseModel):
+    success: bool
+    total_entries: int
+    classified_entries: Optional[int] = None
+    degraded_entries: Optional[int] = None
+    escalated_entries: Optional[int] = None
+    degraded_mode: Optional[bool] = None
+    analysis: HistoryAnalysis
+
+
+class WeightedTheme(BaseModel):
+    # Accepts an analysis ThemeStat as is; weight, when given, overrides percentage x avg_confidence
+    model_config = ConfigDict(extra='ignore')
+
+    theme: str
+    weight: Optional[float] = None
+    percentage: Optional[float] = None
+    avg_confidence: Optional[float] = None
+
+
+class SuggestPromptRequest(BaseModel):
+    # A user's themes, e.g. analysis.themes of /analyze-user-history
+    themes: List[WeightedTheme] = []
+    # Older clients: theme names, most relevant first
+    recent_themes: List[str] = []
+    limit: int = Field(3, ge=1, le=20)
+
+
+class PromptSuggestion(BaseModel):
+    theme: str
+    prompt: str
+    score: float
+
+
+class SuggestPromptResponse(BaseModel):
+    success: bool
+    prompts: List[PromptSuggestion]
+
+
+class RandomPromptResponse(BaseModel):
+    success: bool
+    theme: str
+    prompt: str
+
+
+class JobStatusResponse(BaseModel):
+    success: bool
+    job_id: str
+    status: str
+    total_entries: int
+    entries_to_classify: int
+    processed_entries: int
+    degraded_entries: int
+    escalated_entries: int
+    progress: float
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
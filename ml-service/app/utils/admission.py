@@ -0,0 +1,158 @@
+"""
+Admission control for inference requests: bounded budgets and load-based degradation
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from app.utils.metrics import ADMISSIONS, OLLAMA_RECENT_LATENCY
+
+logger = logging.getLogger(__name__)
+
+LLM = 'llm'
+LOCAL = 'local'
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionLane:
+    def __init__(self, name: str, limit: int, max_queued: int, queue_timeout: float):
+        """
+        Requests of one mode allowed to run at once, with a bounded wait for a slot
+
+        Args:
+            name: Lane label for metrics and errors
+            limit: Requests running at the same time
+            max_queued: Requests waiting for a slot before new ones are refused
+            queue_timeout: Seconds a request waits for a slot before it is refused
+        """
+        self.name = name
+        self.limit = limit
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @property
+    def queued(self) -> int:
+        """Requests that would wait for a slot if all waiters were woken now"""
+        return max(0, self.in_flight + self.waiting - self.limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the lane's slots; raises Overloaded when the queue is full or too slow"""
+        if self.queued >= self.max_queued:
+            ADMISSIONS.inc(lane=self.name, decision='rejected')
+            raise Overloaded(f"{self.queued} {self.name} requests already queued")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            ADMISSIONS.inc(lane=self.name, decision='rejected')
+            raise Overloaded(f"No {self.name} slot free within {self.queue_timeout:g}s")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+class AdmissionController:
+    def __init__(self, classifier, llm_limit: int = 4, llm_queue: int = 32,
+                 local_limit: int = 32, local_queue: int = 256, queue_timeout: float = 10.0,
+                 degrade_queue_depth: int = 8, degrade_latency: float = 8.0, retry_after: int = 5):
+        """
+        Admission for the inference routes, one lane per classifier mode
+
+        While Ollama is enabled, requests switch to the local tier (keywords,
+        or the linear model when loaded) once the LLM lane's queue reaches
+        degrade_queue_depth or Ollama calls of the last 30s average
+        degrade_latency seconds. A fast, lower-fidelity answer then replaces
+        a timeout.
+
+        Args:
+            classifier: OllamaClassifier whose mode decides the lane
+            llm_limit: Ollama-backed requests running at once
+            llm_queue: Ollama-backed requests waiting before 503
+            local_limit: Local-tier requests running at once
+            local_queue: Local-tier requests waiting before 503
+            queue_timeout: Seconds a request may wait for a slot before 503
+            degrade_queue_depth: LLM queue depth at which requests degrade
+            degrade_latency: Recent Ollama call latency (s) at which requests degrade
+            retry_after: Retry-After seconds sent with 503
+        """
+        self.classifier = classifier
+        self.degrade_queue_depth = degrade_queue_depth
+        self.degrade_latency = degrade_latency
+        self.retry_after = retry_after
+        self.lanes: Dict[str, AdmissionLane] = {
+            LLM: AdmissionLane(LLM, llm_limit, llm_queue, queue_timeout),
+            LOCAL: AdmissionLane(LOCAL, local_limit, local_queue, queue_timeout),
+        }
+        self._was_degraded = False
+
+    @classmethod
+    def from_env(cls, classifier) -> 'AdmissionController':
+        """Build a controller configured through ADMISSION_* environment variables"""
+        return cls(
+            classifier,
+            llm_limit=int(os.getenv('ADMISSION_LLM_LIMIT', 4)),
+            llm_queue=int(os.getenv('ADMISSION_LLM_QUEUE', 32)),
+            local_limit=int(os.getenv('ADMISSION_LOCAL_LIMIT', 32)),
+            local_queue=int(os.getenv('ADMISSION_LOCAL_QUEUE', 256)),
+            queue_timeout=float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10)),
+            degrade_queue_depth=int(os.getenv('ADMISSION_DEGRADE_QUEUE_DEPTH', 8)),
+            degrade_latency=float(os.getenv('ADMISSION_DEGRADE_LATENCY', 8)),
+            retry_after=int(os.getenv('ADMISSION_RETRY_AFTER', 5))
+        )
+
+    def degraded(self) -> bool:
+        """Whether a request arriving now should be answered by the local tier"""
+        if not self.classifier.use_ollama:
+            return False
+
+        llm = self.lanes[LLM]
+        latency = OLLAMA_RECENT_LATENCY.mean()
+        degraded = llm.queued >= self.degrade_queue_depth or latency >= self.degrade_latency
+        if degraded != self._was_degraded:
+            self._was_degraded = degraded
+            if degraded:
+                logger.warning("Degrading to the local tier: %d queued LLM requests, %.2fs recent Ollama latency",
+                               llm.queued, latency)
+            else:
+                logger.info("Load back under thresholds; using Ollama again")
+        return degraded
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Admit a request and hold a slot in the lane for its mode while it runs
+
+        Yields:
+            Whether the request is degraded and must be answered by the local tier
+        """
+        # Decided as the request joins its lane, so a burst sees its own queue
+        degraded = self.degraded()
+        lane = self.lanes[LLM if self.classifier.use_ollama and not degraded else LOCAL]
+        async with lane.slot():
+            ADMISSIONS.inc(lane=lane.name, decision='degraded' if degraded else 'admitted')
+            yield degraded
+
+    def stats(self) -> Dict[str, float]:
+        """Gauges for /metrics"""
+        gauges = {}
+        for name, lane in self.lanes.items():
+            gauges[f'ml_admission_{name}_in_flight'] = lane.in_flight
+            gauges[f'ml_admission_{name}_queued'] = lane.queued
+        gauges['ml_admission_degraded'] = int(self._was_degraded)
+        return gauges
@@ -0,0 +1,276 @@
+"""
+Aggregation of per-entry classifications into history-level insights
+"""
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.analytics import (
+    WEEKDAYS, EntryColumns, compare_halves, parse_days, time_analytics, weekday_counts
+)
+from app.utils.metrics import timed
+from app.utils.sampling import StratifiedSample, estimate_history
+
+
+# Dated entries needed before a favourite writing day is reported
+MIN_WEEKDAY_ENTRIES = 14
+
+# Sentiments as stored by HistoryAggregator; anything else counts as neutral
+SENTIMENT_CODES = {'positive': 1, 'negative': -1}
+
+
+class HistoryAggregator:
+    def __init__(self, total_entries: int, sample: Optional[StratifiedSample] = None,
+                 with_time_analytics: bool = False):
+        """
+        Incrementally aggregate classified entries
+
+        Entries can be added in any order (e.g. as concurrent classifications
+        complete); the summary is always computed in history order. add() only
+        appends to flat typed arrays; result() views them as NumPy columns and
+        derives every figure from those.
+
+        Args:
+            total_entries: Number of entries in the history, including empty ones
+            sample: When only a sample of the entries with text is added, the
+                design it was drawn with (indexes are positions among those
+                entries). Theme and sentiment figures are then estimates with
+                CI margins, and time_analytics is left out
+            with_time_analytics: Add the weekly/monthly/weekday time_analytics
+                block (full histories only)
+        """
+        self.total_entries = total_entries
+        self.sample = sample
+        self.with_time_analytics = with_time_analytics and sample is None
+        self.theme_ids: Dict[str, int] = {}
+
+        # One item per added entry, in the order added
+        self.indexes = array('q')
+        self.sentiments = array('b')  # SENTIMENT_CODES
+        self.dates: List[Optional[str]] = []
+        self.timeline: List[Dict[str, any]] = []  # {'date', 'themes', 'sentiment'}
+        self.timeline_themes = set()
+
+        # One item per theme prediction, entry by entry in rank order: the entry's
+        # position in the arrays above, the theme and its confidence
+        self.observation_entries = array('q')
+        self.observation_themes = array('q')
+        self.observation_confidences = array('d')
+
+    def add(self, index: int, date: Optional[str], themes: List[Dict[str, any]], sentiment: str):
+        """
+        Add one classified entry
+
+        Args:
+            index: Position of the entry in the history
+            date: Entry creation date
+            themes: Theme predictions for the entry
+            sentiment: Sentiment of the entry
+        """
+        entry = len(self.indexes)
+        for theme_obj in themes:
+            theme_id = self.theme_ids.setdefault(theme_obj['theme'], len(self.theme_ids))
+            self.observation_entries.append(entry)
+            self.observation_themes.append(theme_id)
+            self.observation_confidences.append(theme_obj['confidence'])
+
+        timeline_item = {
+            'date': date,
+            'themes': [t['theme'] for t in themes[:2]],  # Top 2 themes
+            'sentiment': sentiment
+        }
+        self.indexes.append(index)
+        self.sentiments.append(SENTIMENT_CODES.get(sentiment, 0))
+        self.dates.append(date)
+        self.timeline.append(timeline_item)
+        self.timeline_themes.update(timeline_item['themes'])
+
+    def result(self) -> Dict[str, any]:
+        """Compute themes, sentiment trends, patterns and timeline over everything added so far"""
+        with timed('analytics'):
+            order, rows = self._history_order()
+            columns = self._columns(order, rows)
+            analytics = time_analytics(columns) if self.with_time_analytics else None
+        recent = [self.timeline[entry] for entry in order[-10:].tolist()]  # Last 10 entries
+
+        estimates = None
+        if self.sample is not None:
+            with timed('estimates'):
+                estimates = estimate_history(self.sample, columns.themes, columns.confidence,
+                                             columns.positive, columns.negative, self.total_entries)
+
+        with timed('themes'):
+            theme_stats = self._theme_stats(rows)
+            if estimates is not None:
+                for stats in theme_stats:
+                    stats.update(estimates['themes'][stats['theme']])
+            # Sort by count
+            theme_stats.sort(key=lambda x: x['count'], reverse=True)
+
+        with timed('trends'):
+            sentiment_trends = {}
+            if len(order):
+                sentiment_trends = summarize_sentiments(len(order), int(columns.positive.sum()),
+                                                        int(columns.negative.sum()), recent)
+                if estimates is not None:
+                    sentiment_trends['overall'] = estimates['sentiment']
+
+        with timed('patterns'):
+            weekdays = weekday_counts(columns.days) if self.sample is None else self.sample.weekdays
+            patterns = describe_patterns(self.total_entries, len(self.timeline_themes), recent[-5:], weekdays)
+
+        result = {
+            "themes": theme_stats[:7],  # Top 7 themes
+            "sentiment_trends": sentiment_trends,
+            "patterns": patterns,
+            "timeline": recent,
+        }
+        if self.with_time_analytics:
+            result["time_analytics"] = analytics
+        return result
+
+    def columns(self) -> EntryColumns:
+        """Everything added so far as columnar arrays in history order, dates parsed once"""
+        return self._columns(*self._history_order())
+
+    def _history_order(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Added entries in history order, and the history row of each added entry"""
+        order = np.argsort(np.frombuffer(self.indexes, dtype=np.int64), kind='stable')
+        rows = np.empty_like(order)
+        rows[order] = np.arange(len(order))
+        return order, rows
+
+    def _columns(self, order: np.ndarray, rows: np.ndarray) -> EntryColumns:
+        sentiments = np.frombuffer(self.sentiments, dtype=np.int8)[order]
+        confidence = np.zeros((len(order), len(self.theme_ids)), dtype=np.float32)
+        confidence[rows[np.frombuffer(self.observation_entries, dtype=np.int64)],
+                   np.frombuffer(self.observation_themes, dtype=np.int64)] = \
+            np.frombuffer(self.observation_confidences, dtype=np.float64)
+
+        return EntryColumns(
+            # Parsed in the order added; only the resulting column is reordered
+            days=parse_days(self.dates)[order],
+            positive=sentiments == SENTIMENT_CODES['positive'],
+            negative=sentiments == SENTIMENT_CODES['negative'],
+            themes=list(self.theme_ids),
+            confidence=confidence
+        )
+
+    def _theme_stats(self, rows: np.ndarray) -> List[Dict[str, any]]:
+        """
+        Count, average confidence and trend per theme, in first-seen order
+
+        A theme's trend compares the average confidence of the first and second
+        half of the entries that carry it, in history order. Prefix sums are
+        accumulated sequentially, as InsightsStore's theme series are, so
+        incremental and full analyses agree to the last bit.
+        """
+        observation_rows = rows[np.frombuffer(self.observation_entries, dtype=np.int64)]
+        observation_themes = np.frombuffer(self.observation_themes, dtype=np.int64)
+
+        # Observations grouped by theme, each group in history order; the stable sort keeps
+        # an entry's predictions in rank order
+        by_theme = np.argsort(observation_themes * (len(rows) + 1) + observation_rows, kind='stable')
+        counts = np.bincount(observation_themes, minlength=len(self.theme_ids))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        confidences = np.frombuffer(self.observation_confidences, dtype=np.float64)[by_theme]
+        # Rank of each theme's first prediction within its entry
+        first_rows = observation_rows[by_theme][starts]
+        first_ranks = by_theme[starts] - np.searchsorted(
+            np.frombuffer(self.observation_entries, dtype=np.int64),
+            np.frombuffer(self.observation_entries, dtype=np.int64)[by_theme[starts]])
+
+        themes = list(self.theme_ids)
+        theme_stats = []
+        # Keep first-seen order (by entry, then rank within it) for equal counts
+        for theme_id in np.lexsort((first_ranks, first_rows)).tolist():
+            count = int(counts[theme_id])
+            sums = np.cumsum(confidences[starts[theme_id]:ends[theme_id]])
+            theme_stats.append({
+                'theme': themes[theme_id],
+                'count': count,
+                'percentage': round((count / self.total_entries) * 100, 1),
+                'avg_confidence': round(float(sums[-1]) / count, 3),
+                'trend': half_trend(sums)
+            })
+        return theme_stats
+
+
+def half_trend(sums: np.ndarray) -> str:
+    """Compare the average of the first and second half of a series, given its prefix sums"""
+    count = len(sums)
+    if count < 3:
+        return 'stable'
+
+    # Compare first half vs second half
+    mid = count // 2
+    first = float(sums[mid - 1])
+    return compare_halves(first / mid, (float(sums[-1]) - first) / (count - mid))
+
+
+def summarize_sentiments(total, positive_count, negative_count, recent):
+    """Build the sentiment trend block from overall counts and the most recent entries"""
+    neutral_count = total - positive_count - negative_count
+    recent_positive = sum(1 for s in recent if s['sentiment'] == 'positive')
+
+    return {
+        'overall': {
+            'positive': positive_count,
+            'negative': negative_count,
+            'neutral': neutral_count,
+            'positive_percentage': round((positive_count / total) * 100, 1)
+        },
+        'recent_trend': 'mostly_positive' if recent_positive >= 6 else
+                       'mostly_negative' if recent_positive <= 3 else 'mixed'
+    }
+
+
+def describe_patterns(total_entries, unique_theme_count, recent_timeline, weekdays=None):
+    """
+    Pattern messages from entry count, theme diversity, the last few timeline items
+    and, when given, dated entries per weekday (Monday first)
+    """
+    patterns = []
+
+    # Writing frequency
+    if total_entries >= 30:
+        patterns.append({
+            'type': 'consistency',
+            'message': f'You\'ve written {total_entries} entries! You\'re building a strong journaling habit.'
+        })
+
+    # Theme diversity
+    if unique_theme_count >= 5:
+        patterns.append({
+            'type': 'diversity',
+            'message': f'You explore {unique_theme_count} different themes in your writing.'
+        })
+
+    # Recent activity
+    recent_theme_list = []
+    for item in recent_timeline:
+        recent_theme_list.extend(item['themes'])
+
+    most_common = Counter(recent_theme_list).most_common(1)
+    if most_common:
+        patterns.append({
+            'type': 'recent_focus',
+            'message': f'Recently, you\'ve been focusing on {most_common[0][0]}.'
+        })
+
+    # Favourite writing day, once there are a couple of weeks' worth of dated entries
+    # and one day clearly stands out (half again its even share)
+    if weekdays is not None:
+        dated = int(sum(weekdays))
+        busiest = int(np.argmax(weekdays))
+        if dated >= MIN_WEEKDAY_ENTRIES and weekdays[busiest] * 7 >= dated * 1.5:
+            patterns.append({
+                'type': 'day_of_week',
+                'message': f'You write most often on {WEEKDAYS[busiest]}s '
+                           f'({round(weekdays[busiest] / dated * 100)}% of your entries).'
+            })
+
+    return patterns
@@ -0,0 +1,225 @@
+"""
+Date-aware, vectorized trend analytics over a classified history
+"""
+import warnings
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Most recent buckets returned per granularity
+WEEKLY_BUCKETS = 26
+MONTHLY_BUCKETS = 24
+
+# Buckets in the rolling positive ratio window
+ROLLING_WEEKS = 4
+ROLLING_MONTHS = 3
+
+# 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+_EPOCH_WEEKDAY = 3
+
+
+@dataclass(slots=True)
+class EntryColumns:
+    """One history as columnar arrays, one row per classified entry in history order"""
+    days: np.ndarray          # float64 days since the epoch (UTC), NaN for unparseable dates
+    positive: np.ndarray      # bool
+    negative: np.ndarray      # bool
+    themes: List[str]
+    confidence: np.ndarray    # float32 (entries x themes), 0 where the entry lacks the theme
+
+
+def parse_days(dates: List[Optional[str]]) -> np.ndarray:
+    """Parse ISO dates once into float days since the epoch; NaN where missing or invalid"""
+    try:
+        # Fast path for UTC ('Z') and offset-free dates, which is what the backend sends
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # numpy only warns about UTC offsets
+            parsed = np.array([date[:-1] if date and date.endswith('Z') else date for date in dates],
+                              dtype='datetime64[us]')
+    except (ValueError, TypeError, UserWarning):
+        parsed = pd.to_datetime(pd.Series(dates, dtype=object), utc=True, errors='coerce',
+                                format='ISO8601').dt.tz_localize(None).to_numpy(dtype='datetime64[us]')
+
+    missing = np.isnat(parsed)
+    days = parsed.astype(np.int64) / 86400e6
+    days[missing] = np.nan
+    return days
+
+
+def weekday_counts(days: np.ndarray) -> np.ndarray:
+    """Entries per weekday, Monday first"""
+    dated = days[~np.isnan(days)]
+    return np.bincount((np.floor(dated).astype(np.int64) + _EPOCH_WEEKDAY) % 7, minlength=7)
+
+
+def weekday_of(date: Optional[str]) -> Optional[int]:
+    """Weekday (0 = Monday, UTC) of one ISO date, as parse_days would place it; None if unparseable"""
+    try:
+        parsed = datetime.fromisoformat(date)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.weekday()
+
+
+def time_analytics(columns: EntryColumns) -> Dict[str, any]:
+    """
+    Weekly and monthly buckets, rolling sentiment, theme slopes and weekday activity
+
+    Entries without a parseable date are left out and counted in undated_entries.
+
+    Args:
+        columns: Classified history, see EntryColumns
+
+    Returns:
+        Analytics block, or {} when no entry has a usable date
+    """
+    dated = ~np.isnan(columns.days)
+    if not dated.any():
+        return {}
+
+    days = columns.days[dated]
+    positive = columns.positive[dated]
+    negative = columns.negative[dated]
+    confidence = columns.confidence[dated]
+
+    day_numbers = np.floor(days).astype(np.int64)
+    weeks = (day_numbers + _EPOCH_WEEKDAY) // 7
+    months = _month_numbers(day_numbers)
+
+    weekdays = weekday_counts(days)
+    weekday_positive = np.bincount((day_numbers[positive] + _EPOCH_WEEKDAY) % 7, minlength=7)
+
+    return {
+        'undated_entries': int((~dated).sum()),
+        'weekly': _buckets(weeks, positive, negative, WEEKLY_BUCKETS, ROLLING_WEEKS, _week_start),
+        'monthly': _buckets(months, positive, negative, MONTHLY_BUCKETS, ROLLING_MONTHS, _month_start),
+        'theme_slopes': _theme_slopes(columns.themes, days, confidence),
+        'day_of_week': [
+            {
+                'day': day,
+                'entries': int(weekdays[i]),
+                'positive_ratio': _ratio(weekday_positive[i], weekdays[i])
+            }
+            for i, day in enumerate(WEEKDAYS)
+        ]
+    }
+
+
+def compare_halves(first_avg, second_avg):
+    """Classify the change between an earlier and a later average confidence"""
+    if second_avg > first_avg * 1.2:
+        return 'increasing'
+    elif second_avg < first_avg * 0.8:
+        return 'decreasing'
+    else:
+        return 'stable'
+
+
+def _month_numbers(day_numbers: np.ndarray) -> np.ndarray:
+    """Months since January 1970 for each day number"""
+    months = day_numbers.astype('datetime64[D]').astype('datetime64[M]')
+    return months.astype(np.int64)
+
+
+def _week_start(week: int) -> str:
+    return str(np.datetime64(week * 7 - _EPOCH_WEEKDAY, 'D'))
+
+
+def _month_start(month: int) -> str:
+    return str(np.datetime64(month, 'M').astype('datetime64[D]'))
+
+
+def _ratio(part, whole) -> Optional[float]:
+    return round(float(part) / float(whole), 3) if whole else None
+
+
+def _buckets(periods: np.ndarray, positive: np.ndarray, negative: np.ndarray,
+             keep: int, window: int, label) -> List[Dict[str, any]]:
+    """
+    Sentiment counts per period over the history's whole range, empty periods included
+
+    rolling_positive_ratio pools the last `window` periods, so a quiet week
+    does not swing it to 0 or 1.
+    """
+    first = periods.min()
+    offsets = periods - first
+    size = int(offsets.max()) + 1
+
+    entries = np.bincount(offsets, minlength=size)
+    positives = np.bincount(offsets[positive], minlength=size)
+    negatives = np.bincount(offsets[negative], minlength=size)
+
+    rolling_entries = _window_sums(entries, window)
+    rolling_positives = _window_sums(positives, window)
+
+    start = max(0, size - keep)
+    return [
+        {
+            'period_start': label(int(first) + i),
+            'entries': int(entries[i]),
+            'positive': int(positives[i]),
+            'negative': int(negatives[i]),
+            'neutral': int(entries[i] - positives[i] - negatives[i]),
+            'positive_ratio': _ratio(positives[i], entries[i]),
+            'rolling_positive_ratio': _ratio(rolling_positives[i], rolling_entries[i])
+        }
+        for i in range(start, size)
+    ]
+
+
+def _window_sums(counts: np.ndarray, window: int) -> np.ndarray:
+    """Sum of each position and the window - 1 before it"""
+    totals = np.cumsum(counts)
+    return totals - np.concatenate((np.zeros(window, totals.dtype), totals))[:len(totals)]
+
+
+def _theme_slopes(themes: List[str], days: np.ndarray, confidence: np.ndarray) -> List[Dict[str, any]]:
+    """
+    Least-squares slope of each theme's confidence against its entries' dates
+
+    All themes are fitted at once from masked sums. Only entries that carry a
+    theme count for it, as in the half-split theme trend; trend compares the fitted
+    confidence at the theme's first and last date with the same thresholds.
+    """
+    present = confidence > 0
+    x = days - days.min()
+    weights = present.astype(np.float64)
+    values = confidence.astype(np.float64)
+
+    n = weights.sum(axis=0)
+    sum_x = x @ weights
+    sum_xx = (x * x) @ weights
+    sum_y = values.sum(axis=0)
+    sum_xy = x @ values
+
+    denominator = n * sum_xx - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercepts = np.where(n > 0, (sum_y - slopes * sum_x) / n, 0.0)
+
+    x_first = np.where(present, x[:, None], np.inf).min(axis=0)
+    x_last = np.where(present, x[:, None], -np.inf).max(axis=0)
+
+    results = []
+    for j in np.argsort(-n, kind='stable'):
+        if n[j] == 0:
+            continue
+        if n[j] < 3 or denominator[j] <= 0:
+            trend = 'stable'
+        else:
+            trend = compare_halves(intercepts[j] + slopes[j] * x_first[j],
+                                   intercepts[j] + slopes[j] * x_last[j])
+        results.append({
+            'theme': themes[j],
+            'entries': int(n[j]),
+            'slope_per_30_days': round(float(slopes[j]) * 30, 4) + 0.0,
+            'trend': trend
+        })
+    return results
@@ -0,0 +1,78 @@
+"""
+Dynamic micro-batching of concurrent single-item requests
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from app.utils.metrics import BATCH_QUEUE_WAIT, BATCH_SIZE
+
+
+class MicroBatcher:
+    def __init__(self, process: Callable[[List[Any]], Awaitable[List[Any]]], name: str,
+                 max_batch_size: int = 32, max_wait: float = 0.01):
+        """
+        Collect items from concurrent callers and process them in one call
+
+        A batch is dispatched when it reaches max_batch_size items or when its
+        oldest item has waited max_wait seconds, whichever comes first.
+
+        Args:
+            process: Async function mapping a list of items to results in the same order
+            name: Label for the batch-size and queue-wait histograms
+            max_batch_size: Items per batch
+            max_wait: Seconds the first item of a batch waits for company
+        """
+        self.process = process
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: List[tuple] = []  # (item, future, enqueued_at)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Add item to the current batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        # Drop callers that gave up (disconnected) before the batch left
+        batch = [pending for pending in batch if not pending[1].cancelled()]
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]):
+        started = time.perf_counter()
+        BATCH_SIZE.observe(len(batch), name=self.name)
+        for _, _, enqueued_at in batch:
+            BATCH_QUEUE_WAIT.observe(started - enqueued_at, name=self.name)
+
+        try:
+            results = await self.process([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,300 @@
+"""
+Content-addressed cache for classification results
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Pending results that wake the writer thread before its interval is up
+WRITE_BATCH = 64
+
+# Keys looked up per SQLite query, under the default bound-variable limit
+LOAD_BATCH = 500
+
+
+class ClassificationCache:
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: Optional[float] = None, db_path: Optional[str] = None,
+                 flush_interval: float = 1.0, db_max_entries: Optional[int] = 250_000,
+                 prune_interval: float = 300.0):
+        """
+        Initialize the cache
+
+        Writes to the SQLite file are batched by a background thread, so set()
+        never waits on the disk; results not yet written are still served
+        from memory. The same thread prunes the file: expired results, and
+        the oldest ones beyond db_max_entries. get_many_async() reads the file
+        in a worker thread, so async callers never wait on it either.
+
+        Args:
+            max_entries: Maximum number of results held in memory
+            max_bytes: Maximum total size of keys and serialized results held in memory
+            ttl: Seconds a result stays valid (None keeps results until evicted)
+            db_path: Optional SQLite file backing the memory tier so results survive restarts
+            flush_interval: Seconds between batched writes to db_path
+            db_max_entries: Maximum number of results kept in db_path (None for no limit)
+            prune_interval: Seconds between prunes of db_path
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.db_max_entries = db_max_entries
+        self.prune_interval = prune_interval
+
+        self._entries = OrderedDict()  # key -> (serialized value, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, tuple] = {}  # key -> item, not yet written to db_path
+        self._writing: Dict[str, tuple] = {}  # the batch being written, until committed
+        self._write_lock = threading.Lock()   # one batch written at a time
+        self._read_lock = threading.Lock()    # lookups share one connection
+        self._wake = threading.Event()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = self._writer_db = None
+        if db_path:
+            self._db = self._connect()
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS classification_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            # Pruning drops the oldest results first
+            self._db.execute("CREATE INDEX IF NOT EXISTS classification_cache_stored_at "
+                             "ON classification_cache (stored_at)")
+            self._db.commit()
+            # Writes get a connection of their own; in WAL mode lookups are not blocked by them
+            self._writer_db = self._connect()
+            threading.Thread(target=self._write_behind, name='classification-cache-writer',
+                             daemon=True).start()
+
+    @classmethod
+    def from_env(cls) -> 'ClassificationCache':
+        """Build a cache configured through CLASSIFICATION_CACHE_* environment variables"""
+        ttl = os.getenv('CLASSIFICATION_CACHE_TTL')
+        return cls(
+            max_entries=int(os.getenv('CLASSIFICATION_CACHE_SIZE', 10000)),
+            max_bytes=int(os.getenv('CLASSIFICATION_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+            ttl=float(ttl) if ttl else None,
+            db_path=os.getenv('CLASSIFICATION_CACHE_DB') or None,
+            flush_interval=float(os.getenv('CLASSIFICATION_CACHE_FLUSH_INTERVAL', 1.0)),
+            db_max_entries=int(os.getenv('CLASSIFICATION_CACHE_DB_MAX_ENTRIES', 250_000)) or None
+        )
+
+    @staticmethod
+    def make_key(text: str, model_name: str, mode: str, top_k: Optional[int] = None) -> str:
+        """Hash the entry text together with everything that changes its classification"""
+        digest = hashlib.sha256()
+        digest.update(f"{model_name}\0{mode}\0{top_k}\0".encode('utf-8'))
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached result for key, or None on a miss"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Look up several results at once, reading db_path in the calling thread
+
+        Returns:
+            Mapping of the keys that hit to their results
+        """
+        keys = list(dict.fromkeys(keys))
+        found, missing = self._get_memory(keys)
+        if missing and self._db is not None:
+            found.update(self._load(missing))
+        return self._decode(found, len(keys))
+
+    async def get_many_async(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Like get_many, with db_path read in a worker thread so the event loop never waits on it"""
+        keys = list(dict.fromkeys(keys))
+        found, missing = self._get_memory(keys)
+        if missing and self._db is not None:
+            found.update(await asyncio.to_thread(self._load, missing))
+        return self._decode(found, len(keys))
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable classification result"""
+        item = (json.dumps(value), time.time())
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, item)
+            if self._db is not None:
+                self._pending[key] = item
+                if len(self._pending) >= WRITE_BATCH:
+                    self._wake.set()
+
+    def flush(self):
+        """Write pending results to db_path now (e.g. before shutdown)"""
+        if self._writer_db is None:
+            return
+        with self._write_lock:
+            with self._lock:
+                batch = self._writing = self._pending
+                self._pending = {}
+            if not batch:
+                return
+            try:
+                self._writer_db.executemany(
+                    "INSERT OR REPLACE INTO classification_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                    [(key, value, stored_at) for key, (value, stored_at) in batch.items()]
+                )
+                self._writer_db.commit()
+            finally:
+                with self._lock:
+                    self._writing = {}
+
+    def prune(self):
+        """Delete expired results from db_path, then the oldest beyond db_max_entries"""
+        if self._writer_db is None:
+            return
+        with self._write_lock:
+            if self.ttl is not None:
+                self._writer_db.execute("DELETE FROM classification_cache WHERE stored_at < ?",
+                                        (time.time() - self.ttl,))
+            if self.db_max_entries is not None:
+                self._writer_db.execute(
+                    "DELETE FROM classification_cache WHERE key IN ("
+                    "SELECT key FROM classification_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.db_max_entries,)
+                )
+            self._writer_db.commit()
+
+    def clear(self):
+        """Drop every cached result, including the on-disk store"""
+        with self._write_lock, self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._pending.clear()
+            if self._writer_db is not None:
+                self._writer_db.execute("DELETE FROM classification_cache")
+                self._writer_db.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'persistent': self._db is not None
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        # WAL with NORMAL sync: one fsync per checkpoint rather than per commit
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _write_behind(self):
+        """
+        Writer thread: flush pending results every flush_interval, or sooner
+        once a batch is full, and prune db_path every prune_interval
+        """
+        last_prune = None
+        while True:
+            if last_prune is None or time.monotonic() - last_prune >= self.prune_interval:
+                last_prune = time.monotonic()
+                try:
+                    self.prune()
+                except sqlite3.Error:
+                    logger.exception("Pruning the classification cache failed")
+
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Writing classification cache batch failed")
+
+    def _get_memory(self, keys: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """Serialized results of the keys held in memory or waiting to be written, and the other keys"""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                item = self._entries.get(key)
+                if item is not None and self._expired(item[1], now):
+                    self._remove(key)
+                    item = None
+                if item is not None:
+                    self._entries.move_to_end(key)
+                else:
+                    item = self._pending.get(key) or self._writing.get(key)
+
+                if item is not None:
+                    found[key] = item[0]
+                else:
+                    missing.append(key)
+        return found, missing
+
+    def _load(self, keys: List[str]) -> Dict[str, str]:
+        """Read keys from db_path and keep the results found in memory"""
+        now = time.time()
+        rows = []
+        with self._read_lock:
+            for start in range(0, len(keys), LOAD_BATCH):
+                batch = keys[start:start + LOAD_BATCH]
+                rows += self._db.execute(
+                    "SELECT key, value, stored_at FROM classification_cache "
+                    f"WHERE key IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall()
+
+        found = {}
+        with self._lock:
+            for key, value, stored_at in rows:
+                if key in self._entries:
+                    # Set while the file was being read: the newer result wins
+                    found[key] = self._entries[key][0]
+                elif not self._expired(stored_at, now):
+                    found[key] = value
+                    self._insert(key, (value, stored_at))
+        return found
+
+    def _decode(self, found: Dict[str, str], lookups: int) -> Dict[str, Any]:
+        """Count the hits and misses of lookups distinct keys and deserialize the results found"""
+        with self._lock:
+            self.hits += len(found)
+            self.misses += lookups - len(found)
+        return {key: json.loads(value) for key, value in found.items()}
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def _insert(self, key: str, item: tuple):
+        size = len(key) + len(item[0])
+        if size > self.max_bytes:
+            return
+        self._entries[key] = item
+        self._bytes += size
+        # Evict least recently used results until both bounds hold
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
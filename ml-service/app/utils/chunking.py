@@ -0,0 +1,99 @@
+"""
+Token-budgeted splitting of long entries and merging of per-chunk answers
+"""
+import math
+import re
+from typing import Dict, List
+
+# Rough tokens-per-character ratio for English text with Llama-family tokenizers;
+# used only to size chunks, so being a little off just moves chunk boundaries
+CHARS_PER_TOKEN = 4
+
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_to_budget(text: str, max_tokens: int, max_chunks: int = 4) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens estimated tokens
+
+    Chunks end on sentence boundaries where possible; a single sentence over
+    the budget is split on words. Text beyond max_chunks chunks is dropped.
+
+    Args:
+        text: Entry text
+        max_tokens: Token budget per chunk
+        max_chunks: Maximum number of chunks to return
+
+    Returns:
+        Chunks in text order; [text] when it already fits
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = ''
+    for piece in _pieces(text, max_chars):
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            if len(chunks) == max_chunks:
+                return chunks
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks[:max_chunks]
+
+
+def _pieces(text: str, max_chars: int):
+    """Sentences of text, with any sentence longer than max_chars cut on words"""
+    for sentence in SENTENCE_BREAK.split(text.strip()):
+        if len(sentence) <= max_chars:
+            yield sentence
+            continue
+        part = ''
+        for word in sentence.split():
+            if part and len(part) + 1 + len(word) > max_chars:
+                yield part
+                part = ''
+            # A single word longer than the budget is cut outright
+            while len(word) > max_chars:
+                yield word[:max_chars]
+                word = word[max_chars:]
+            part = f"{part} {word}" if part else word
+        if part:
+            yield part
+
+
+def merge_themes(chunk_themes: List[List[Dict[str, any]]], weights: List[float],
+                 top_k: int = 3) -> List[Dict[str, any]]:
+    """
+    Reduce per-chunk theme predictions to one list for the whole entry
+
+    A theme's confidence is its length-weighted mean over all chunks, counting
+    chunks that did not report it as 0, so themes running through the entry
+    outrank themes confined to one passage.
+    """
+    total = sum(weights) or 1.0
+    scores: Dict[str, float] = {}
+    for themes, weight in zip(chunk_themes, weights):
+        for item in themes:
+            scores[item['theme']] = scores.get(item['theme'], 0.0) + item['confidence'] * weight
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [{'theme': theme, 'confidence': round(score / total, 3)} for theme, score in ranked]
+
+
+def merge_sentiments(sentiments: List[str], weights: List[float]) -> str:
+    """Length-weighted vote over per-chunk sentiments; a tie between the leaders is neutral"""
+    votes: Dict[str, float] = {}
+    for sentiment, weight in zip(sentiments, weights):
+        votes[sentiment] = votes.get(sentiment, 0.0) + weight
+    ranked = sorted(votes.values(), reverse=True)
+    if len(ranked) > 1 and ranked[0] == ranked[1]:
+        return 'neutral'
+    return max(votes, key=votes.get)
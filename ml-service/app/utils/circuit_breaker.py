@@ -0,0 +1,187 @@
+"""
+Circuit breaker for calls to an unreliable dependency (the Ollama daemon)
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.utils.metrics import CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: float = 30.0, min_calls: int = 5,
+                 failure_rate: float = 0.5, probe_interval: float = 5.0, half_open_calls: int = 1):
+        """
+        Stop calling a dependency once most recent calls fail, until it recovers
+
+        Closed: calls go through and their outcomes are recorded. When at least
+        min_calls finished in the last `window` seconds and failure_rate of
+        them failed, the breaker opens. Open: calls are refused at once with
+        CircuitOpen. Half-open is entered when a background probe succeeds
+        (see probing), or else after probe_interval seconds; it lets
+        half_open_calls trial calls through. A trial success closes the
+        breaker, a failure opens it again.
+
+        Args:
+            name: Dependency name, for logs and metrics
+            window: Seconds of call outcomes the failure rate is computed over
+            min_calls: Calls in the window needed before the breaker can open
+            failure_rate: Fraction of failed calls that opens the breaker
+            probe_interval: Seconds between background probes; without a prober,
+                seconds open before trial calls are allowed
+            half_open_calls: Trial calls allowed at once while half-open
+        """
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.probe_interval = probe_interval
+        self.half_open_calls = half_open_calls
+        # Set while a background probe decides when to half-open
+        self.probing = False
+
+        self.state = CLOSED
+        self.changed_at = time.time()
+        self.last_error: Optional[str] = None
+        self._outcomes = deque()  # (monotonic time, succeeded)
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str) -> 'CircuitBreaker':
+        """Build a breaker configured through CIRCUIT_* environment variables"""
+        return cls(
+            name,
+            window=float(os.getenv('CIRCUIT_WINDOW', 30)),
+            min_calls=int(os.getenv('CIRCUIT_MIN_CALLS', 5)),
+            failure_rate=float(os.getenv('CIRCUIT_FAILURE_RATE', 0.5)),
+            probe_interval=float(os.getenv('CIRCUIT_PROBE_INTERVAL', 5))
+        )
+
+    @contextmanager
+    def guard(self):
+        """
+        Wrap one call: refuse it while open, and record how it ended
+
+        Raises:
+            CircuitOpen: The call was not made
+        """
+        trial = self._admit()
+        try:
+            yield
+        except Exception as e:
+            self._record(False, trial, e)
+            raise
+        except BaseException:
+            # Cancelled: says nothing about the dependency, just give back the trial slot
+            if trial:
+                with self._lock:
+                    self._trials -= 1
+            raise
+        self._record(True, trial)
+
+    def half_open(self):
+        """Allow trial calls now, e.g. after a successful probe"""
+        with self._lock:
+            if self.state == OPEN:
+                self._transition(HALF_OPEN, 'probe succeeded')
+
+    def is_open(self) -> bool:
+        """Whether calls are refused outright, so callers can skip straight to their fallback"""
+        with self._lock:
+            self._maybe_half_open()
+            return self.state == OPEN
+
+    def stats(self) -> Dict[str, any]:
+        """State and recent failure rate, for /health"""
+        with self._lock:
+            self._expire(time.monotonic())
+            failures = sum(1 for _, succeeded in self._outcomes if not succeeded)
+            status = {
+                'state': self.state,
+                'since': self.changed_at,
+                'calls_in_window': len(self._outcomes),
+                'failure_rate': round(failures / len(self._outcomes), 3) if self._outcomes else 0.0
+            }
+            if self.last_error:
+                status['last_error'] = self.last_error
+        return status
+
+    def gauges(self) -> Dict[str, float]:
+        """Gauges for /metrics: 0 closed, 1 half-open, 2 open"""
+        return {f'ml_circuit_{self.name}_state': STATE_VALUES[self.state]}
+
+    def _admit(self) -> bool:
+        """Raise CircuitOpen unless a call may go out; returns whether it is a trial call"""
+        with self._lock:
+            self._maybe_half_open()
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return True
+        raise CircuitOpen(f"{self.name} circuit is {self.state}")
+
+    def _maybe_half_open(self):
+        if self.state == OPEN and not self.probing \
+                and time.monotonic() - self._opened_at >= self.probe_interval:
+            self._transition(HALF_OPEN, f'open for {self.probe_interval:g}s')
+
+    def _record(self, succeeded: bool, trial: bool, error: Optional[Exception] = None):
+        with self._lock:
+            if error is not None:
+                self.last_error = repr(error)
+            if trial:
+                self._trials -= 1
+                if self.state == HALF_OPEN:
+                    if succeeded:
+                        self._outcomes.clear()
+                        self._transition(CLOSED, 'trial call succeeded')
+                    else:
+                        self._open('trial call failed')
+                return
+
+            if self.state != CLOSED:
+                # Admitted before the breaker opened; the window starts over on closing
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, succeeded))
+            self._expire(now)
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if failures >= self.failure_rate * len(self._outcomes):
+                self._open(f'{failures} of the last {len(self._outcomes)} calls failed')
+
+    def _open(self, reason: str):
+        self._opened_at = time.monotonic()
+        self._transition(OPEN, reason)
+
+    def _transition(self, state: str, reason: str):
+        log = logger.info if state == CLOSED else logger.warning
+        log("Circuit %s: %s -> %s (%s)", self.name, self.state, state, reason)
+        self.state = state
+        self.changed_at = time.time()
+        CIRCUIT_TRANSITIONS.inc(name=self.name, state=state)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
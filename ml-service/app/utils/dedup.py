@@ -0,0 +1,255 @@
+"""
+Near-duplicate grouping of journal entries with MinHash signatures and LSH banding
+"""
+import string
+from hashlib import blake2b
+from itertools import chain
+from typing import List, Set, Tuple
+
+import numpy as np
+
+# Hash functions per signature; bands x rows always multiply to this
+NUM_PERM = 64
+
+# Words per shingle; entries with fewer words are one shingle of all of them
+SHINGLE_WORDS = 3
+
+# Candidates whose signature agreement is this close to the threshold, or that have
+# fewer shingles than bins, are checked exactly; the agreement of 64 full bins has
+# a standard error of about 0.06
+SIGNATURE_SLACK = 0.15
+
+# Chance that a pair right at the threshold shares a band and so is compared at all
+CANDIDATE_RECALL = 0.995
+
+# Entries signed at once, bounding the working arrays of shingle_hashes() and minhash()
+SIGNATURE_BLOCK = 1024
+
+# log2(NUM_PERM): the hash bits that pick a signature bin
+BIN_BITS = 6
+
+# Digits and punctuation other than apostrophes become spaces: dates, counts and
+# punctuation vary between otherwise identical templated entries ("Day 41: gym, work, ...")
+_SEPARATORS = str.maketrans({char: ' ' for char in string.digits + string.punctuation if char != "'"})
+
+_rng = np.random.default_rng(0x5eed)
+# Odd multipliers: the shingle hash and the band key mixing
+_MULTIPLIER = _rng.integers(1, 1 << 63, dtype=np.uint64) | np.uint64(1)
+_BAND_MIX = _rng.integers(1, 1 << 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase words of a text, without digits or punctuation"""
+    return text.lower().translate(_SEPARATORS).split()
+
+
+def shingle_set(tokens: List[str]) -> Set[Tuple[str, ...]]:
+    """Word shingles of one normalized entry"""
+    width = min(len(tokens), SHINGLE_WORDS)
+    return set(zip(*(tokens[offset:] for offset in range(width))))
+
+
+def lsh_shape(threshold: float, recall: float = CANDIDATE_RECALL):
+    """
+    (bands, rows) with the most rows per band (the fewest dissimilar candidates)
+    under which entries at `threshold` Jaccard similarity still become
+    candidates with probability at least `recall`
+    """
+    options = [(NUM_PERM // rows, rows) for rows in range(NUM_PERM, 0, -1) if NUM_PERM % rows == 0]
+    for bands, rows in options:
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return NUM_PERM, 1
+
+
+def shingle_hashes(token_lists: List[List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    64-bit hash of every word shingle of every entry, all entries at once
+
+    Returns:
+        Tuple of (entry index of each shingle, ascending; uint64 shingle hashes)
+    """
+    # str hash() is salted per process; a stable digest of each distinct word keeps
+    # groups the same from one run to the next
+    word_hashes = {word: int.from_bytes(blake2b(word.encode(), digest_size=8).digest(), 'little')
+                   for word in set(chain.from_iterable(token_lists))}
+    ids = np.fromiter(map(word_hashes.__getitem__, chain.from_iterable(token_lists)),
+                      dtype=np.uint64)
+    lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # Shingle i covers words i .. i + SHINGLE_WORDS - 1 and belongs to the entry word i is in;
+    # entries shorter than SHINGLE_WORDS get one shingle over all their words
+    width = np.minimum(lengths, SHINGLE_WORDS)
+    counts = np.where(lengths > 0, lengths - width + 1, 0)
+    owners = np.repeat(np.arange(len(token_lists)), counts)
+    positions = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts) + \
+        np.arange(int(counts.sum()))
+    owner_width = width[owners]
+
+    shingles = np.zeros(len(positions), dtype=np.uint64)
+    for offset in range(SHINGLE_WORDS):
+        present = offset < owner_width
+        word = ids[np.where(present, positions + offset, 0)] if len(ids) else np.zeros(0, np.uint64)
+        shingles = shingles * np.uint64(0x9E3779B97F4A7C15) + np.where(present, word, 0).astype(np.uint64)
+    return owners, (shingles ^ (shingles >> np.uint64(29))) * _MULTIPLIER
+
+
+def signatures(token_lists: List[List[str]]) -> np.ndarray:
+    """
+    One-permutation MinHash signatures of word shingle sets, all entries at once
+
+    Returns:
+        uint32 (entries x NUM_PERM); rows of entries without words are all 0
+    """
+    return minhash(*shingle_hashes(token_lists), len(token_lists))
+
+
+def minhash(owners: np.ndarray, shingles: np.ndarray, entries: int) -> np.ndarray:
+    """
+    MinHash signatures from the shingle hashes of shingle_hashes()
+
+    The top bits of each hash pick one of NUM_PERM bins and the next 32 are its
+    value, so a bin holds the minimum of its share of the set. Bins left empty
+    (entries with few shingles) borrow the next filled bin to their right,
+    offset by the distance ("densification"), which keeps equal bins an
+    estimate of Jaccard similarity.
+
+    Returns:
+        uint32 (entries x NUM_PERM); rows of entries without shingles are all 0
+    """
+    # Minimum value per (entry, bin): sort (entry, bin, value) keys, keep each first
+    bins = (shingles >> np.uint64(64 - BIN_BITS)).astype(np.int64)
+    values = (shingles >> np.uint64(32 - BIN_BITS)) & np.uint64(0xffffffff)
+    keys = np.sort(((owners * NUM_PERM + bins).astype(np.uint64) << np.uint64(32)) | values)
+    cells = (keys >> np.uint64(32)).astype(np.int64)
+    first = np.concatenate(([True], cells[1:] != cells[:-1])) if len(keys) else np.zeros(0, bool)
+
+    result = np.zeros((entries, NUM_PERM), dtype=np.uint32)
+    filled = np.zeros((entries, NUM_PERM), dtype=bool)
+    result.flat[cells[first]] = keys[first].astype(np.uint32)
+    filled.flat[cells[first]] = True
+
+    # Densify: position of the next filled bin, wrapping around the row
+    rows = np.flatnonzero(np.bincount(owners, minlength=entries))
+    span = np.arange(2 * NUM_PERM)
+    wrapped = np.where(np.tile(filled[rows], 2), span, 2 * NUM_PERM)
+    following = np.minimum.accumulate(wrapped[:, ::-1], axis=1)[:, ::-1][:, :NUM_PERM]
+    distance = (following - span[:NUM_PERM]).astype(np.uint32)
+    borrowed = np.take_along_axis(result[rows], following % NUM_PERM, axis=1)
+    result[rows] = borrowed + distance * np.uint32(0x9E3779B1)
+    return result
+
+
+def near_duplicate_groups(texts: List[str], threshold: float = 0.8) -> np.ndarray:
+    """
+    Group entries whose normalized word shingles are near-identical
+
+    Entries that normalize to the same words are grouped outright. The others
+    go through MinHash signatures: LSH bands propose candidates (neighbours
+    within each bucket), which are joined when the share of signature bins
+    they agree on, an estimate of the Jaccard similarity of their shingle
+    sets, is clearly above `threshold`, dropped when clearly below, and
+    otherwise (or for short entries) decided by the exact similarity of
+    their hashed shingles. Groups are transitive.
+
+    Args:
+        texts: Entry texts
+        threshold: Jaccard similarity of word shingles at which entries count as duplicates
+
+    Returns:
+        int64 array: for each text, the index of its group's representative
+        (the group's longest text, first in history order on ties)
+    """
+    if not texts:
+        return np.zeros(0, dtype=np.int64)
+
+    parent = list(range(len(texts)))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    # Normalized texts are kept joined (one string per entry rather than one per
+    # word) and split again where the words are needed
+    normalized = [' '.join(normalize(text)) for text in texts]
+
+    # Identical normalized texts need no signature
+    first_seen = {}
+    distinct = []
+    for index, key in enumerate(normalized):
+        if key in first_seen:
+            parent[index] = first_seen[key]
+        else:
+            first_seen[key] = index
+            if key:
+                distinct.append(index)
+
+    if len(distinct) > 1:
+        distinct = np.array(distinct)
+        blocks, hashes = [], []
+        for start in range(0, len(distinct), SIGNATURE_BLOCK):
+            block = distinct[start:start + SIGNATURE_BLOCK].tolist()
+            owners, shingles = shingle_hashes([normalized[i].split() for i in block])
+            blocks.append(minhash(owners, shingles, len(block)))
+            hashes.append(shingles)
+        signature = np.concatenate(blocks)
+        # Shingle hashes of the entry at position p of distinct: hashes[bounds[p]:bounds[p + 1]]
+        hashes = np.concatenate(hashes)
+        shingle_counts = np.array([max(normalized[i].count(' ') + 2 - SHINGLE_WORDS, 1)
+                                   for i in distinct.tolist()])
+        bounds = np.concatenate(([0], np.cumsum(shingle_counts)))
+
+        # Banded so pairs at the threshold are almost always proposed
+        bands, rows = lsh_shape(threshold)
+        band_keys = np.stack([signature[:, columns].astype(np.uint64) @ _BAND_MIX[columns]
+                              for columns in (slice(band * rows, (band + 1) * rows) for band in range(bands))],
+                             axis=1)
+        candidates = []
+        for band in range(bands):
+            # Neighbours within a bucket, ordered by the next band too: templated
+            # histories fill large buckets, and entries agreeing on more bins sort
+            # next to each other rather than each being paired with one head entry
+            order = np.lexsort((band_keys[:, (band + 1) % bands], band_keys[:, band]))
+            sorted_keys = band_keys[order, band]
+            same = sorted_keys[1:] == sorted_keys[:-1]
+            candidates.append(np.stack((order[:-1][same], order[1:][same]), axis=1))
+
+        pairs = np.sort(np.concatenate(candidates), axis=1)
+        pairs = np.unique(pairs[:, 0] * len(distinct) + pairs[:, 1])
+        pairs = np.stack(np.divmod(pairs, len(distinct)), axis=1)
+        agreement = (signature[pairs[:, 0]] == signature[pairs[:, 1]]).mean(axis=1)
+        # Entries with fewer shingles than bins have densified, noisier signatures
+        short = np.minimum(shingle_counts[pairs[:, 0]], shingle_counts[pairs[:, 1]]) < NUM_PERM
+        settled = ~short & (np.abs(agreement - threshold) >= SIGNATURE_SLACK)
+        for a, b in distinct[pairs[settled & (agreement > threshold)]].tolist():
+            union(a, b)
+
+        # The rest get their (hashed) shingle sets compared; densified signatures of short
+        # entries can agree far less than their sets overlap, so none of those is dropped
+        unsure = pairs[~settled & (short | (agreement > threshold - SIGNATURE_SLACK))]
+        shingle_sets = {p: set(hashes[bounds[p]:bounds[p + 1]].tolist()) for p in np.unique(unsure).tolist()}
+        for a, b in unsure.tolist():
+            set_a, set_b = shingle_sets[a], shingle_sets[b]
+            shared = len(set_a & set_b)
+            if shared >= threshold * (len(set_a) + len(set_b) - shared):
+                union(int(distinct[a]), int(distinct[b]))
+
+    roots = np.array([find(i) for i in range(len(texts))], dtype=np.int64)
+    # Representative: the longest text of each group
+    lengths = np.array([len(text) for text in texts])
+    order = np.lexsort((np.arange(len(texts)), -lengths, roots))
+    group_starts = np.flatnonzero(np.concatenate(([True], roots[order][1:] != roots[order][:-1])))
+    representative = np.empty(len(texts), dtype=np.int64)
+    sizes = np.diff(np.concatenate((group_starts, [len(texts)])))
+    representative[order] = np.repeat(order[group_starts], sizes)
+    return representative
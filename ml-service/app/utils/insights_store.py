@@ -0,0 +1,321 @@
+"""
+Incremental per-user insights state, updated with entry deltas instead of full histories
+"""
+import asyncio
+import bisect
+import hashlib
+import threading
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.aggregation import compare_halves, describe_patterns, summarize_sentiments
+from app.utils.analytics import weekday_of
+
+# Entries kept in the recent window (sentiment recent_trend uses the last 10)
+RECENT_WINDOW = 10
+
+
+def content_digest(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+@dataclass(slots=True)
+class EntryRecord:
+    """What the state remembers about one entry"""
+    key: Tuple[str, str]
+    created_at: Optional[str]
+    digest: str
+    themes: Optional[List[Dict[str, any]]]
+    sentiment: Optional[str]
+    timeline: Optional[Dict[str, any]]
+
+
+class ThemeSeries:
+    """
+    Confidences of one theme in history order, with prefix sums for half-split trends
+
+    Entries inserted or removed out of order shift the prefix sums behind them;
+    only that suffix is recomputed, lazily, the next time the series is read.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.confidences = []
+        self.prefix = [0.0]  # sums of the leading confidences; may stop short after a shift
+
+    def append(self, key, confidence: float):
+        if len(self.prefix) == len(self.keys) + 1:
+            self.prefix.append(self.prefix[-1] + confidence)
+        self.keys.append(key)
+        self.confidences.append(confidence)
+
+    def insert(self, key, confidence: float):
+        index = bisect.bisect_left(self.keys, key)
+        self.keys.insert(index, key)
+        self.confidences.insert(index, confidence)
+        del self.prefix[index + 1:]
+
+    def remove(self, key):
+        index = bisect.bisect_left(self.keys, key)
+        del self.keys[index]
+        del self.confidences[index]
+        del self.prefix[index + 1:]
+
+    @property
+    def count(self) -> int:
+        return len(self.keys)
+
+    @property
+    def total_confidence(self) -> float:
+        self._refresh()
+        return self.prefix[-1]
+
+    def trend(self) -> str:
+        """Same first-half vs second-half comparison as HistoryAggregator, in O(1)"""
+        n = self.count
+        if n < 3:
+            return 'stable'
+
+        self._refresh()
+        mid = n // 2
+        first_avg = self.prefix[mid] / mid
+        second_avg = (self.prefix[n] - self.prefix[mid]) / (n - mid)
+        return compare_halves(first_avg, second_avg)
+
+    def _refresh(self):
+        """Recompute the prefix sums behind the earliest out-of-order change"""
+        done = len(self.prefix) - 1
+        if done == self.count:
+            return
+        sums = accumulate(self.confidences[done:], initial=self.prefix[-1])
+        next(sums)  # the initial value, already stored
+        self.prefix.extend(sums)
+
+
+class UserInsightsState:
+    def __init__(self):
+        """
+        Running aggregates over one user's journal history
+
+        Appending entries newer than everything stored costs O(themes per entry).
+        Edits, deletes and back-dated entries insert into or subtract from the
+        affected theme series directly; only the recent window is re-read.
+        """
+        self.records: Dict[str, EntryRecord] = {}
+        self.order = []     # sorted (created_at, entry id) keys
+
+        self.series: Dict[str, ThemeSeries] = {}
+
+        self.sentiment_counts = Counter()
+        self.timeline_theme_counts = Counter()  # top-2 themes per entry, for diversity
+        self.weekday_counts = [0] * 7  # dated entries with text per weekday, Monday first
+        self.recent = deque(maxlen=RECENT_WINDOW)  # (key, timeline item)
+        self.recent_dirty = False
+
+    @property
+    def total_entries(self) -> int:
+        return len(self.records)
+
+    def is_current(self, entry_id, content: str, created_at: str) -> bool:
+        """Whether the stored entry already reflects this content and date"""
+        record = self.records.get(str(entry_id))
+        return (record is not None and record.created_at == created_at
+                and record.digest == content_digest(content))
+
+    def upsert(self, entry_id, content: str, created_at: str,
+               themes: Optional[List[Dict[str, any]]], sentiment: Optional[str]):
+        """
+        Add a new entry or replace an edited one
+
+        Args:
+            entry_id: Stable entry identifier
+            content: Entry text (only its digest is kept)
+            created_at: Entry creation date, used for ordering
+            themes: Theme predictions, or None for an entry without text
+            sentiment: Sentiment, or None for an entry without text
+        """
+        entry_id = str(entry_id)
+        if entry_id in self.records:
+            self.remove(entry_id)
+
+        key = (created_at or '', entry_id)
+        appended = not self.order or key > self.order[-1]
+        if appended:
+            self.order.append(key)
+        else:
+            bisect.insort(self.order, key)
+
+        timeline_item = None
+        if themes is not None:
+            timeline_item = {
+                'date': created_at,
+                'themes': [t['theme'] for t in themes[:2]],  # Top 2 themes
+                'sentiment': sentiment
+            }
+
+        self.records[entry_id] = EntryRecord(key, created_at, content_digest(content),
+                                             themes, sentiment, timeline_item)
+
+        if themes is None:
+            return
+
+        for theme_obj in themes:
+            theme = theme_obj['theme']
+            series = self.series.setdefault(theme, ThemeSeries())
+            if appended:
+                series.append(key, theme_obj['confidence'])
+            else:
+                series.insert(key, theme_obj['confidence'])
+
+        self.sentiment_counts[sentiment] += 1
+        self.timeline_theme_counts.update(timeline_item['themes'])
+        self._count_weekday(created_at, 1)
+
+        if appended and not self.recent_dirty:
+            self.recent.append((key, timeline_item))
+        else:
+            self.recent_dirty = True
+
+    def remove(self, entry_id):
+        """Drop an entry from every aggregate"""
+        record = self.records.pop(str(entry_id), None)
+        if record is None:
+            return
+
+        del self.order[bisect.bisect_left(self.order, record.key)]
+
+        if record.themes is None:
+            return
+
+        for theme_obj in record.themes:
+            series = self.series[theme_obj['theme']]
+            series.remove(record.key)
+            if not series.count:
+                del self.series[theme_obj['theme']]
+
+        self.sentiment_counts[record.sentiment] -= 1
+        self.timeline_theme_counts.subtract(record.timeline['themes'])
+        self._count_weekday(record.created_at, -1)
+        self.recent_dirty = True
+
+    def result(self) -> Dict[str, any]:
+        """Insights in the same shape as HistoryAggregator.result(), derived from the running state"""
+        self._rebuild_recent()
+
+        theme_stats = []
+        for theme, series in sorted(self.series.items(), key=self._first_seen):
+            theme_stats.append({
+                'theme': theme,
+                'count': series.count,
+                'percentage': round((series.count / self.total_entries) * 100, 1),
+                'avg_confidence': round(series.total_confidence / series.count, 3),
+                'trend': series.trend()
+            })
+        theme_stats.sort(key=lambda x: x['count'], reverse=True)
+
+        timeline = [item for _, item in self.recent]
+        return {
+            "themes": theme_stats[:7],  # Top 7 themes
+            "sentiment_trends": self._sentiment_trends(timeline),
+            "patterns": self._patterns(timeline),
+            "timeline": timeline
+        }
+
+    def _first_seen(self, item):
+        """Order themes by their first entry, then by rank within that entry"""
+        theme, series = item
+        first_key = series.keys[0]
+        ranks = [theme_obj['theme'] for theme_obj in self.records[first_key[1]].themes]
+        return first_key, ranks.index(theme)
+
+    def _sentiment_trends(self, timeline):
+        total = sum(self.sentiment_counts.values())
+        if not total:
+            return {}
+        return summarize_sentiments(total, self.sentiment_counts['positive'],
+                                    self.sentiment_counts['negative'], timeline)
+
+    def _patterns(self, timeline):
+        unique_themes = sum(1 for count in self.timeline_theme_counts.values() if count > 0)
+        return describe_patterns(self.total_entries, unique_themes, timeline[-5:], self.weekday_counts)
+
+    def _count_weekday(self, created_at: Optional[str], change: int):
+        weekday = weekday_of(created_at)
+        if weekday is not None:
+            self.weekday_counts[weekday] += change
+
+    def _rebuild_recent(self):
+        """Re-read the recent window from the newest entries after out-of-order changes"""
+        if not self.recent_dirty:
+            return
+
+        self.recent.clear()
+        for key in reversed(self.order):
+            timeline_item = self.records[key[1]].timeline
+            if timeline_item is not None:
+                self.recent.appendleft((key, timeline_item))
+                if len(self.recent) == RECENT_WINDOW:
+                    break
+        self.recent_dirty = False
+
+
+class InsightsStore:
+    def __init__(self, max_users: int = 1000):
+        """
+        In-memory per-user insights states
+
+        Args:
+            max_users: Number of user states kept; the least recently used are
+                       dropped and must be re-synced with their full history
+        """
+        self.max_users = max_users
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        # user id -> [sync lock, holders and waiters]; dropped once nobody needs it
+        self._sync_locks: Dict[str, list] = {}
+
+    def get(self, user_id: str, create: bool = False) -> Optional[UserInsightsState]:
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is None and create:
+                state = self._states[user_id] = UserInsightsState()
+                self._evict()
+            if state is not None:
+                self._states.move_to_end(user_id)
+            return state
+
+    def put(self, user_id: str, state: UserInsightsState):
+        """Store state as user_id's most recently used state, e.g. after it was evicted mid-sync"""
+        with self._lock:
+            self._states[user_id] = state
+            self._states.move_to_end(user_id)
+            self._evict()
+
+    def reset(self, user_id: str):
+        with self._lock:
+            self._states.pop(user_id, None)
+
+    @asynccontextmanager
+    async def syncing(self, user_id: str):
+        """
+        Hold user_id's sync lock, so concurrent syncs of one user (and their
+        resets) read, classify and apply one after the other
+        """
+        entry = self._sync_locks.get(user_id)
+        if entry is None:
+            entry = self._sync_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._sync_locks[user_id]
+
+    def _evict(self):
+        while len(self._states) > self.max_users:
+            self._states.popitem(last=False)
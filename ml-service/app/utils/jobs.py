@@ -0,0 +1,354 @@
+"""
+Background analysis jobs: an in-process queue, a worker pool and SQLite persistence
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from app.utils.admission import Overloaded
+from app.utils.aggregation import HistoryAggregator
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+STATUS_COLUMNS = (
+    'job_id', 'status', 'total_entries', 'entries_to_classify', 'processed_entries',
+    'degraded_entries', 'escalated_entries', 'created_at', 'started_at', 'finished_at', 'error'
+)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def default_db_path() -> str:
+    """
+    analysis_jobs.db in ML_DATA_DIR, or else in the user's data directory
+    ($XDG_DATA_HOME/journal-ml, ~/.local/share/journal-ml), outside the source tree
+    """
+    data_dir = os.getenv('ML_DATA_DIR') or os.path.join(
+        os.getenv('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share'),
+        'journal-ml'
+    )
+    return os.path.join(data_dir, 'analysis_jobs.db')
+
+
+class JobStore:
+    def __init__(self, db_path: str = ':memory:'):
+        """
+        SQLite table of job status, progress and results
+
+        Args:
+            db_path: SQLite file, or ':memory:' for a store that ends with the process
+        """
+        directory = os.path.dirname(db_path)
+        if directory and db_path != ':memory:':
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+            "total_entries INTEGER NOT NULL, entries_to_classify INTEGER NOT NULL, "
+            "processed_entries INTEGER NOT NULL DEFAULT 0, "
+            "degraded_entries INTEGER NOT NULL DEFAULT 0, "
+            "escalated_entries INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "error TEXT, result BLOB)"
+        )
+        self._db.commit()
+
+    def create(self, job_id: str, total_entries: int, entries_to_classify: int):
+        self._write(
+            "INSERT INTO analysis_jobs (job_id, status, total_entries, entries_to_classify, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (job_id, QUEUED, total_entries, entries_to_classify, time.time())
+        )
+
+    def start(self, job_id: str):
+        self._write("UPDATE analysis_jobs SET status = ?, started_at = ? WHERE job_id = ?",
+                    (RUNNING, time.time(), job_id))
+
+    def progress(self, job_id: str, processed: int, degraded: int, escalated: int):
+        self._write(
+            "UPDATE analysis_jobs SET processed_entries = ?, degraded_entries = ?, escalated_entries = ? "
+            "WHERE job_id = ?",
+            (processed, degraded, escalated, job_id)
+        )
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None):
+        self._write(
+            "UPDATE analysis_jobs SET status = ?, finished_at = ?, error = ?, result = ? WHERE job_id = ?",
+            (status, time.time(), error, orjson.dumps(result) if result is not None else None, job_id)
+        )
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(STATUS_COLUMNS)} FROM analysis_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(STATUS_COLUMNS, row)) if row is not None else None
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT result FROM analysis_jobs WHERE job_id = ?",
+                                   (job_id,)).fetchone()
+        return orjson.loads(row[0]) if row is not None and row[0] is not None else None
+
+    def interrupt_unfinished(self) -> int:
+        """Mark jobs left queued or running by a previous process as failed"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE analysis_jobs SET status = ?, finished_at = ?, error = ? WHERE status IN (?, ?)",
+                (FAILED, time.time(), 'Interrupted by a service restart', QUEUED, RUNNING)
+            )
+            self._db.commit()
+        return cursor.rowcount
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs whose results are older than older_than seconds"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM analysis_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - older_than,)
+            )
+            self._db.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _write(self, sql: str, params: tuple):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+
+class AnalysisJobs:
+    def __init__(self, classifier, db_path: str = ':memory:', admission=None, workers: int = 2,
+                 max_queued: int = 100, batch_size: int = 64, progress_interval: float = 1.0,
+                 retention: Optional[float] = 7 * 86400):
+        """
+        Queue of history analyses run in the background by a fixed pool of workers
+
+        Args:
+            classifier: OllamaClassifier used for every job
+            db_path: SQLite file for status, progress and results, or ':memory:'
+                for jobs that end with the process; opened by start()
+            admission: AdmissionController shared with the interactive routes. Each
+                batch of a job takes a slot in it, so jobs count toward load, wait
+                behind interactive requests and degrade to the local tier with them
+            workers: Jobs analyzed concurrently
+            max_queued: Jobs waiting for a worker before submit() is refused
+            batch_size: Entries classified per admission slot
+            progress_interval: Seconds between progress writes while a job runs
+            retention: Seconds finished jobs are kept (None keeps them for ever)
+        """
+        self.classifier = classifier
+        self.db_path = db_path
+        self.store: Optional[JobStore] = None
+        self.admission = admission
+        self.workers = workers
+        self.max_queued = max_queued
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.retention = retention
+
+        self._queue: Optional[asyncio.Queue] = None
+        # job id -> (entries, with_time_analytics), until a worker takes it
+        self._entries: Dict[str, tuple] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._workers: List[asyncio.Task] = []
+        self._closing = False
+
+    @classmethod
+    def from_env(cls, classifier, admission=None) -> 'AnalysisJobs':
+        """Build a job pool configured through ANALYSIS_JOBS_* environment variables"""
+        retention = os.getenv('ANALYSIS_JOBS_RETENTION', str(7 * 86400))
+        return cls(
+            classifier,
+            os.getenv('ANALYSIS_JOBS_DB') or default_db_path(),
+            admission,
+            workers=int(os.getenv('ANALYSIS_JOBS_WORKERS', 2)),
+            max_queued=int(os.getenv('ANALYSIS_JOBS_MAX_QUEUED', 100)),
+            batch_size=int(os.getenv('ANALYSIS_JOBS_BATCH_SIZE', 64)),
+            retention=float(retention) if retention else None
+        )
+
+    async def start(self):
+        """Open the job store, recover from a previous run and start the workers"""
+        self.store = JobStore(self.db_path)
+        interrupted = self.store.interrupt_unfinished()
+        if interrupted:
+            logger.warning("Marked %d unfinished analysis jobs as failed after restart", interrupted)
+        if self.retention is not None:
+            self.store.purge(self.retention)
+
+        self._queue = asyncio.Queue()
+        self._closing = False
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers; running jobs are marked failed, queued ones on the next start"""
+        self._closing = True
+        for task in self._workers + list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._running.values(), return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def submit(self, entries: List[Any], with_time_analytics: bool = False) -> Dict[str, Any]:
+        """
+        Queue a history analysis
+
+        Args:
+            entries: JournalEntry items, as for /analyze-user-history
+            with_time_analytics: Add the time_analytics block to the result
+
+        Returns:
+            The new job's status
+        """
+        if self._queue is None:
+            raise RuntimeError("Analysis job workers are not running")
+        if len(self._entries) >= self.max_queued:
+            raise JobQueueFull(f"{len(self._entries)} analysis jobs already queued")
+
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, len(entries), sum(1 for entry in entries if entry.get('content')))
+        self._entries[job_id] = (entries, with_time_analytics)
+        self._queue.put_nowait(job_id)
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self.store is None:
+            return None
+        status = self.store.status(job_id)
+        if status is None:
+            return None
+        to_classify = status['entries_to_classify']
+        status['progress'] = round(status['processed_entries'] / to_classify, 3) if to_classify else (
+            1.0 if status['status'] == COMPLETED else 0.0)
+        for field in ('created_at', 'started_at', 'finished_at'):
+            if status[field] is not None:
+                status[field] = datetime.fromtimestamp(status[field], timezone.utc).isoformat()
+        return status
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.result(job_id) if self.store is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; finished jobs are left as they are"""
+        status = self.status(job_id)
+        if status is None:
+            return None
+        if status['status'] in FINISHED_STATUSES:
+            pass
+        elif job_id in self._entries:
+            # Still queued: the worker skips it when it comes up
+            del self._entries[job_id]
+            self.store.finish(job_id, CANCELLED)
+        elif job_id in self._running:
+            self._running[job_id].cancel()
+        return self.status(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._entries.pop(job_id, None)
+            if job is None:
+                continue  # cancelled while queued
+
+            task = asyncio.create_task(self._run(job_id, *job))
+            self._running[job_id] = task
+            try:
+                # Returns however the job ends (cancel() cancels just the job);
+                # only raises when this worker itself is cancelled
+                await asyncio.wait({task})
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _admit(self, stack: AsyncExitStack) -> bool:
+        """
+        Take an admission slot for one batch, held until stack closes; while the
+        controller refuses work the job backs off instead of failing
+
+        Returns:
+            Whether the batch must be answered by the local tier
+        """
+        if self.admission is None:
+            return False
+        while True:
+            try:
+                return await stack.enter_async_context(self.admission.slot())
+            except Overloaded:
+                await asyncio.sleep(self.admission.retry_after)
+
+    async def _run(self, job_id: str, entries: List[Any], with_time_analytics: bool = False):
+        self.store.start(job_id)
+        positions = [index for index, entry in enumerate(entries) if entry.get('content')]
+        texts = [entries[index]['content'] for index in positions]
+
+        aggregator = HistoryAggregator(len(entries), with_time_analytics=with_time_analytics)
+        processed = degraded = escalated = 0
+        degraded_mode = False
+        last_saved = time.monotonic()
+        try:
+            for start in range(0, len(texts), self.batch_size):
+                batch = texts[start:start + self.batch_size]
+                async with AsyncExitStack() as stack:
+                    local = await self._admit(stack)
+                    degraded_mode |= local
+                    async for index, result, fell_back, sent in self.classifier.analyze_iter_async(
+                            batch, local=local):
+                        entry = entries[positions[start + index]]
+                        aggregator.add(start + index, entry.get('created_at', ''),
+                                       result['themes'], result['sentiment'])
+                        processed += 1
+                        degraded += fell_back
+                        escalated += sent
+                        if time.monotonic() - last_saved >= self.progress_interval:
+                            self.store.progress(job_id, processed, degraded, escalated)
+                            last_saved = time.monotonic()
+
+            self.store.progress(job_id, processed, degraded, escalated)
+            self.store.finish(job_id, COMPLETED, {
+                "success": True,
+                "total_entries": len(entries),
+                "degraded_entries": degraded,
+                "escalated_entries": escalated,
+                "degraded_mode": degraded_mode,
+                "analysis": aggregator.result()
+            })
+
+        except asyncio.CancelledError:
+            self.store.progress(job_id, processed, degraded, escalated)
+            if self._closing:
+                self.store.finish(job_id, FAILED, error='Interrupted by service shutdown')
+            else:
+                self.store.finish(job_id, CANCELLED)
+            raise
+        except Exception as e:
+            logger.exception("Analysis job %s failed", job_id)
+            self.store.progress(job_id, processed, degraded, escalated)
+            self.store.finish(job_id, FAILED, error=str(e))
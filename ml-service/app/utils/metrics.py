@@ -0,0 +1,232 @@
+"""
+Minimal Prometheus-style metrics and per-request stage timing
+"""
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class WindowedMean:
+    def __init__(self, window: float):
+        """
+        Mean of the values observed in the last `window` seconds
+
+        Args:
+            window: Seconds a value counts for; with nothing recent the mean is 0
+        """
+        self.window = window
+        self._values = deque()  # (monotonic time, value)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._values.append((time.monotonic(), value))
+            self._expire()
+
+    def mean(self) -> float:
+        with self._lock:
+            self._expire()
+            if not self._values:
+                return 0.0
+            return sum(value for _, value in self._values) / len(self._values)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.window
+        while self._values and self._values[0][0] < cutoff:
+            self._values.popleft()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_collector(self, collect: Callable[[], Dict[str, float]]):
+        """Register a callable returning {metric name: value} gauges read at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, value in collect().items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'ml_http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+STAGE_LATENCY = registry.histogram(
+    'ml_stage_duration_seconds', 'Time spent per processing stage', ('stage',))
+OLLAMA_REQUESTS = registry.counter(
+    'ml_ollama_requests_total', 'Ollama generate calls by call type and outcome', ('call', 'outcome'))
+OLLAMA_LATENCY = registry.histogram(
+    'ml_ollama_request_duration_seconds', 'Ollama generate call latency', ('call',))
+OLLAMA_PROMPT_EVAL = registry.histogram(
+    'ml_ollama_prompt_eval_seconds', 'Prompt evaluation time reported by Ollama', ('call',))
+OLLAMA_TOKENS = registry.counter(
+    'ml_ollama_tokens_total', 'Tokens processed by Ollama', ('call', 'kind'))
+FALLBACKS = registry.counter(
+    'ml_classifier_fallbacks_total', 'Classifications that fell back to keyword matching', ('call', 'reason'))
+CASCADE_DECISIONS = registry.counter(
+    'ml_cascade_entries_total', 'Cascade routing of entries: answered locally or escalated to Ollama',
+    ('decision',))
+COALESCED_REQUESTS = registry.counter(
+    'ml_singleflight_requests_total',
+    'Requests that started a computation (leader) or joined an identical in-flight one (coalesced)',
+    ('name', 'role'))
+ADMISSIONS = registry.counter(
+    'ml_admission_requests_total', 'Admission decisions by lane (llm, local)', ('lane', 'decision'))
+CIRCUIT_TRANSITIONS = registry.counter(
+    'ml_circuit_transitions_total', 'Circuit breaker state changes by the state entered', ('name', 'state'))
+BATCH_SIZE = registry.histogram(
+    'ml_batch_size', 'Items per micro-batch', ('name',),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+BATCH_QUEUE_WAIT = registry.histogram(
+    'ml_batch_queue_wait_seconds', 'Time an item waited for its micro-batch to start', ('name',))
+
+# Ollama call latency over the last 30s, read by admission control to detect a saturated LLM
+OLLAMA_RECENT_LATENCY = WindowedMean(30.0)
+
+# Stage timings of the request being handled, for logs and the Server-Timing header
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a processing stage into the stage histogram and the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_ollama_call(call: str, elapsed: float, response=None, outcome: str = 'ok'):
+    """Count an Ollama generate call, its latency and token usage"""
+    OLLAMA_REQUESTS.inc(call=call, outcome=outcome)
+    OLLAMA_LATENCY.observe(elapsed, call=call)
+    OLLAMA_RECENT_LATENCY.observe(elapsed)
+    if response is not None:
+        OLLAMA_TOKENS.inc(response.get('prompt_eval_count') or 0, call=call, kind='prompt')
+        OLLAMA_TOKENS.inc(response.get('eval_count') or 0, call=call, kind='completion')
+        if response.get('prompt_eval_duration') is not None:
+            OLLAMA_PROMPT_EVAL.observe(response.get('prompt_eval_duration') / 1e9, call=call)
+
+
+def record_fallback(call: str, reason: str, count: int = 1):
+    """
+    Count keyword fallbacks; reason is one of exception, timeout, circuit_open,
+    json_parse, no_valid_themes, invalid_sentiment, missing_entry
+    """
+    FALLBACKS.inc(count, call=call, reason=reason)
+
+
+def record_cascade(local: int, escalated: int):
+    """Count entries the cascade answered locally and entries it escalated"""
+    CASCADE_DECISIONS.inc(local, decision='local')
+    CASCADE_DECISIONS.inc(escalated, decision='escalated')
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(parts)
@@ -1,20 +1,289 @@
+"""
+Writing prompt library: indexed by classifier theme, hot-reloaded, ranked against a user's themes
+"""
 import json
+import logging
 import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Library themes that are not classifier labels, and the labels they stand for
+THEME_ALIASES = {
+    'stress': {'challenges': 1.0, 'emotions': 0.5},
+    'anxiety': {'emotions': 1.0, 'challenges': 0.5},
+    'family': {'relationships': 1.0},
+    'friends': {'relationships': 1.0},
+    'goals': {'future_planning': 1.0, 'achievements': 0.5},
+    'self_care': {'health': 1.0},
+}
+
+DEFAULT_THEME = 'daily_life'
+FALLBACK_PROMPT = "What's on your mind today?"
+
+# Seconds between checks of the library file's mtime
+RELOAD_CHECK_INTERVAL = 2.0
+
+# Candidates considered per suggestion when spreading suggestions across themes
+DIVERSITY_POOL = 4
+
+
+@dataclass(frozen=True)
+class PromptIndex:
+    """Immutable snapshot of a prompt library; replaced whole on reload"""
+    texts: List[str]
+    themes: List[str]                 # classifier labels, the columns of weights
+    weights: np.ndarray               # float32 (prompts x themes), rows L2-normalized
+    primary: np.ndarray               # column of each prompt's strongest theme
+    by_theme: Dict[str, np.ndarray]   # label -> rows of the prompts filed under it
+    version: Optional[tuple]          # (mtime_ns, size) of the file it was built from
+
+
+def resolve_theme(theme: str, themes: Sequence[str]) -> Dict[str, float]:
+    """Classifier labels (with weights) a library or request theme stands for; {} if unknown"""
+    if theme in themes:
+        return {theme: 1.0}
+    return {label: weight for label, weight in THEME_ALIASES.get(theme, {}).items() if label in themes}
+
+
+def build_index(library: Dict[str, list], themes: Sequence[str],
+                version: Optional[tuple] = None) -> PromptIndex:
+    """
+    Index a {theme: [prompt, ...]} library by classifier label
+
+    A prompt is a string, or {"text": ..., "themes": {label: weight}} to tag it
+    with more themes than the one it is listed under. The same text listed
+    under several themes becomes one prompt carrying all of them.
+    """
+    themes = list(themes)
+    columns = {theme: column for column, theme in enumerate(themes)}
+    rows: Dict[str, Dict[str, float]] = {}
+    for key, prompts in library.items():
+        labels = resolve_theme(key, themes)
+        if not labels:
+            logger.warning("Prompt library theme %r matches no classifier theme; its prompts only "
+                           "show up as random prompts", key)
+        for prompt in prompts:
+            if isinstance(prompt, str):
+                text, extra = prompt, {}
+            else:
+                text, extra = prompt['text'], prompt.get('themes', {})
+                if isinstance(extra, list):
+                    extra = dict.fromkeys(extra, 1.0)
+            weights = rows.setdefault(text, {})
+            for theme, theme_weight in [*((label, weight) for label, weight in labels.items()),
+                                        *extra.items()]:
+                for label, weight in resolve_theme(theme, themes).items():
+                    weights[label] = max(weights.get(label, 0.0), weight * theme_weight)
+
+    texts = list(rows)
+    matrix = np.zeros((len(texts), len(themes)), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for label, weight in rows[text].items():
+            matrix[row, columns[label]] = weight
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+    primary = matrix.argmax(axis=1) if texts else np.zeros(0, dtype=np.int64)
+    primary[matrix.max(axis=1, initial=0) == 0] = columns.get(DEFAULT_THEME, 0)
+    return PromptIndex(
+        texts=texts,
+        themes=themes,
+        weights=matrix,
+        primary=primary,
+        by_theme={theme: np.flatnonzero(matrix[:, column]) for theme, column in columns.items()},
+        version=version
+    )
+
 
 class PromptLibrary:
-    def __init__(self):
-        self.prompts_path = os.getenv('PROMPT_LIBRARY_PATH', './data/prompts.json')
-        self.prompts = self.load_prompts()
-    
-    def load_prompts(self):
-        """Load prompt library"""
+    def __init__(self, themes: Sequence[str], prompts_path: str = './data/prompts.json',
+                 check_interval: float = RELOAD_CHECK_INTERVAL):
+        """
+        Writing prompts indexed by classifier theme
+
+        The library file is re-read when its mtime or size changes (checked at
+        most every check_interval seconds). The new index is built in a
+        background thread and swapped in whole, so requests keep using the
+        previous one meanwhile and never wait on a reload. A file that fails to
+        parse is logged and the previous index kept.
+
+        Args:
+            themes: Classifier theme labels prompts are indexed by
+            prompts_path: JSON library, {theme: [prompt, ...]}; see build_index
+            check_interval: Seconds between mtime checks
+        """
+        self.themes = list(themes)
+        self.prompts_path = prompts_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._failed_version: Optional[tuple] = None
+        self._checked_at = time.monotonic()
+        self._rng = np.random.default_rng()
+        self._index = self._load()
+
+    @classmethod
+    def from_env(cls, themes: Sequence[str]) -> 'PromptLibrary':
+        """Build a library configured through PROMPT_LIBRARY_* environment variables"""
+        return cls(
+            themes,
+            prompts_path=os.getenv('PROMPT_LIBRARY_PATH', './data/prompts.json'),
+            check_interval=float(os.getenv('PROMPT_LIBRARY_CHECK_INTERVAL', RELOAD_CHECK_INTERVAL))
+        )
+
+    @property
+    def index(self) -> PromptIndex:
+        """The current index, starting a background reload first if the file changed"""
+        self._maybe_reload()
+        return self._index
+
+    def reload(self):
+        """Re-read the library file now and swap in its index"""
+        try:
+            index = self._load()
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # Not retried until the file changes again
+            self._failed_version = self._version()
+            logger.warning("Could not reload prompt library %s, keeping the previous one: %r",
+                           self.prompts_path, e)
+            return
+        self._index = index
+        logger.info("Loaded %d prompts from %s", len(index.texts), self.prompts_path)
+
+    def theme_vector(self, weights: Dict[str, float]) -> np.ndarray:
+        """User theme weights (aliases allowed) as a vector over the classifier labels"""
+        vector = np.zeros(len(self.themes), dtype=np.float32)
+        columns = {theme: column for column, theme in enumerate(self.themes)}
+        for theme, weight in weights.items():
+            for label, share in resolve_theme(theme, self.themes).items():
+                vector[columns[label]] += max(weight, 0.0) * share
+        return vector
+
+    def suggest(self, weights: Dict[str, float], limit: int = 3) -> List[Dict[str, any]]:
+        """
+        Prompts that best match a user's weighted themes
+
+        Prompts are scored by the dot product of their theme weights with the
+        user's theme vector; equal scores are broken at random so repeated
+        calls vary. Among the best limit * DIVERSITY_POOL, prompts filed under
+        a theme not yet suggested come first.
+
+        Args:
+            weights: {theme: weight}, e.g. share x confidence from an analysis
+            limit: Prompts to return
+
+        Returns:
+            [{'theme', 'prompt', 'score'}], best first; only prompts sharing a
+            theme with the user (daily_life when none of theirs is known)
+        """
+        index = self.index
+        if not index.texts:
+            return [{'theme': DEFAULT_THEME, 'prompt': FALLBACK_PROMPT, 'score': 0.0}]
+
+        vector = self.theme_vector(weights)
+        if not vector.any():
+            vector = self.theme_vector({DEFAULT_THEME: 1.0})
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+
+        scores = index.weights @ vector
+        matched = np.count_nonzero(scores)
+        if not matched:
+            return []
+        # Random tie-break, below any score difference that theme weights produce in practice
+        scores += self._rng.random(len(scores), dtype=np.float32) * 1e-4
+        pool = min(matched, limit * DIVERSITY_POOL)
+        candidates = np.argpartition(-scores, pool - 1)[:pool]
+        candidates = candidates[np.argsort(-scores[candidates])].tolist()
+
+        picked, seen = [], set()
+        for row in candidates:
+            if index.primary[row] not in seen:
+                picked.append(row)
+                seen.add(index.primary[row])
+        picked.extend(row for row in candidates if row not in picked)
+
+        return [
+            {
+                'theme': self._theme_of(index, row, vector),
+                'prompt': index.texts[row],
+                'score': round(float(scores[row]), 3)
+            }
+            for row in picked[:limit]
+        ]
+
+    def random_prompt(self) -> Dict[str, str]:
+        """Any prompt of the library, uniformly"""
+        index = self.index
+        if not index.texts:
+            return {'theme': DEFAULT_THEME, 'prompt': FALLBACK_PROMPT}
+        row = int(self._rng.integers(len(index.texts)))
+        return {'theme': index.themes[index.primary[row]], 'prompt': index.texts[row]}
+
+    def get_prompt_by_theme(self, theme: str) -> str:
+        """Random prompt filed under a theme (or its alias), else under daily_life"""
+        index = self.index
+        for label in [*resolve_theme(theme, self.themes), DEFAULT_THEME]:
+            rows = index.by_theme.get(label)
+            if rows is not None and len(rows):
+                return index.texts[int(self._rng.choice(rows))]
+        return FALLBACK_PROMPT
+
+    def get_prompts_by_themes(self, themes: list) -> List[Dict[str, str]]:
+        """One random prompt for each of the top 2 themes"""
+        return [{'theme': theme, 'prompt': self.get_prompt_by_theme(theme)} for theme in themes[:2]]
+
+    def _theme_of(self, index: PromptIndex, row: int, vector: np.ndarray) -> str:
+        """The prompt's theme that contributes most to its match with the user"""
+        contributions = index.weights[row] * vector
+        if contributions.max() > 0:
+            return index.themes[int(contributions.argmax())]
+        return index.themes[index.primary[row]]
+
+    def _version(self) -> Optional[tuple]:
         try:
-            with open(self.prompts_path, 'r') as f:
-                return json.load(f)
+            stat = os.stat(self.prompts_path)
         except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> PromptIndex:
+        version = self._version()
+        if version is None:
             # Return default prompts if file doesn't exist
-            return self.get_default_prompts()
-    
+            return build_index(self.get_default_prompts(), self.themes)
+        with open(self.prompts_path, 'r', encoding='utf-8') as f:
+            library = json.load(f)
+        return build_index(library, self.themes, version)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._reloading or now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            if self._version() in (self._index.version, self._failed_version):
+                return
+            self._reloading = True
+        threading.Thread(target=self._background_reload, name='prompt-library-reload',
+                         daemon=True).start()
+
+    def _background_reload(self):
+        try:
+            self.reload()
+        finally:
+            with self._lock:
+                self._reloading = False
+
     def get_default_prompts(self):
         """Default prompt library"""
         return {
@@ -33,7 +302,7 @@ class PromptLibrary:
                 "Describe a skill you'd like to develop and why it matters to you.",
                 "What's one thing you learned about yourself this week?"
             ],
-            'stress': [
+            'challenges': [
                 "What's been weighing on your mind lately? Write it all out.",
                 "Describe a moment when you felt overwhelmed. What helped?",
                 "What would make tomorrow easier for you?"
@@ -52,25 +321,30 @@ class PromptLibrary:
                 "What made you smile today?",
                 "Describe your perfect day from start to finish.",
                 "What's something mundane that you actually enjoy?"
+            ],
+            'creativity': [
+                "What's an idea you keep coming back to? Sketch it out in words.",
+                "Describe something you made recently and how it felt to make it.",
+                "If you had a free afternoon to create anything, what would it be?"
+            ],
+            'reflection': [
+                "What's something you understand now that you didn't a year ago?",
+                "Look back on this week. What would you do differently?",
+                "Which recent moment do you keep replaying, and why?"
+            ],
+            'achievements': [
+                "What's a goal you reached recently? Who helped you get there?",
+                "Describe a moment you felt proud of yourself.",
+                "What small win from this week deserves more credit?"
+            ],
+            'emotions': [
+                "Name the strongest feeling you had today. Where did it come from?",
+                "Describe how you're feeling right now without judging it.",
+                "When did you last feel completely at ease?"
+            ],
+            'future_planning': [
+                "Where do you hope to be a year from now?",
+                "What's one step you could take this week toward something you want?",
+                "Describe a dream you haven't told anyone about."
             ]
         }
-    
-    def get_prompt_by_theme(self, theme: str):
-        """Get random prompt for a specific theme"""
-        import random
-        prompts = self.prompts.get(theme, self.prompts.get('daily_life'))
-        return random.choice(prompts) if prompts else "What's on your mind today?"
-    
-    def get_prompts_by_themes(self, themes: list):
-        """Get prompts matching multiple themes"""
-        results = []
-        for theme in themes[:2]:  # Top 2 themes
-            prompt = self.get_prompt_by_theme(theme)
-            results.append({
-                'theme': theme,
-                'prompt': prompt
-            })
-        return results
-
-# Initialize library
-prompt_library = PromptLibrary()
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Time-stratified sampling of a history and estimates with confidence intervals
+"""
+import math
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Contiguous date ranges the older part of a history is cut into
+DEFAULT_STRATA = 12
+
+# Most recent entries (history order) always classified: they feed the timeline and recent_trend
+RECENT_ENTRIES = 10
+
+
+@dataclass(slots=True)
+class StratifiedSample:
+    """Which entries of a population to classify, and the design needed to weight them back"""
+    indexes: np.ndarray        # sampled positions into the population, ascending
+    strata: np.ndarray         # stratum of each sampled position
+    stratum_sizes: np.ndarray  # entries per stratum in the population
+    sample_sizes: np.ndarray   # sampled entries per stratum
+    weekdays: np.ndarray       # dated population entries per weekday, Monday first
+    confidence: float
+
+    @property
+    def population(self) -> int:
+        return int(self.stratum_sizes.sum())
+
+    @property
+    def z(self) -> float:
+        return NormalDist().inv_cdf((1 + self.confidence) / 2)
+
+
+def sample_size(population: int, max_error: float, confidence: float = 0.95) -> int:
+    """
+    Entries to classify so an estimated proportion is within max_error of the
+    full-history value at the given confidence
+
+    Sized for the worst case p = 0.5 with a finite population correction, so it
+    levels off (about 385 for ±5% at 95%) however long the history is.
+    Proportional stratification only lowers the variance below this.
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    unbounded = z * z * 0.25 / (max_error * max_error)
+    return min(population, math.ceil(unbounded / (1 + (unbounded - 1) / population)))
+
+
+def stratified_sample(days: np.ndarray, weekdays: np.ndarray, max_error: float,
+                      confidence: float = 0.95, strata: int = DEFAULT_STRATA,
+                      recent: int = RECENT_ENTRIES, seed: Optional[int] = None) -> Optional[StratifiedSample]:
+    """
+    Draw a time-stratified sample of a history
+
+    The last `recent` entries form a stratum that is always taken whole. The
+    rest are ordered by date (undated ones last) and cut into `strata` ranges
+    of equal size; each range gets its proportional share of the sample, and
+    at least two entries so its variance can be estimated.
+
+    Args:
+        days: Entry dates as days since the epoch, NaN when missing (see parse_days)
+        weekdays: Dated entries per weekday, reported instead of the sample's
+        max_error: Half-width of the confidence interval wanted for proportions
+        confidence: Confidence level of the intervals
+        strata: Date ranges the older entries are cut into
+        recent: Most recent entries always classified
+        seed: Seed for the draw; the same seed and history give the same sample
+
+    Returns:
+        The sample, or None when it would cover the whole history anyway
+    """
+    population = len(days)
+    size = sample_size(population, max_error, confidence)
+    recent = min(recent, population)
+    if size + recent >= population:
+        return None
+
+    older = np.argsort(days[:population - recent], kind='stable')
+    groups = [group for group in np.array_split(older, min(strata, len(older))) if len(group)]
+    sizes = np.array([len(group) for group in groups])
+    allocation = np.minimum(np.maximum(_proportional(sizes, size), 2), sizes)
+
+    rng = np.random.default_rng(seed)
+    indexes = [np.arange(population - recent, population)]
+    labels = [np.zeros(recent, dtype=np.int64)]
+    for stratum, (group, count) in enumerate(zip(groups, allocation.tolist()), 1):
+        indexes.append(rng.choice(group, size=count, replace=False))
+        labels.append(np.full(count, stratum, dtype=np.int64))
+
+    indexes = np.concatenate(indexes)
+    labels = np.concatenate(labels)
+    order = np.argsort(indexes)
+    return StratifiedSample(
+        indexes=indexes[order],
+        strata=labels[order],
+        stratum_sizes=np.concatenate(([recent], sizes)),
+        sample_sizes=np.concatenate(([recent], allocation)),
+        weekdays=weekdays,
+        confidence=confidence
+    )
+
+
+def estimate_means(sample: StratifiedSample, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stratified estimate of population column means, and their CI half-widths
+
+    Args:
+        sample: The design the values were drawn with
+        values: (sampled entries x columns), rows in sample.indexes order
+
+    Returns:
+        Tuple of (means, margins), one per column
+    """
+    weights = sample.stratum_sizes / sample.population
+    means = np.zeros(values.shape[1])
+    variance = np.zeros(values.shape[1])
+    for stratum, (size, taken) in enumerate(zip(sample.stratum_sizes, sample.sample_sizes)):
+        if taken == 0:
+            continue
+        rows = values[sample.strata == stratum]
+        means += weights[stratum] * rows.mean(axis=0)
+        if taken > 1 and taken < size:
+            variance += weights[stratum] ** 2 * (1 - taken / size) * rows.var(axis=0, ddof=1) / taken
+    return means, sample.z * np.sqrt(variance)
+
+
+def estimate_ratios(sample: StratifiedSample, numerators: np.ndarray,
+                    denominators: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Combined ratio estimate of sum(numerators) / sum(denominators) per column,
+    with linearized CI half-widths; 0 where no sampled denominator is positive
+    """
+    numerator_means, _ = estimate_means(sample, numerators)
+    denominator_means, _ = estimate_means(sample, denominators)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(denominator_means > 0, numerator_means / denominator_means, 0.0)
+        _, residual_margins = estimate_means(sample, numerators - ratios * denominators)
+        margins = np.where(denominator_means > 0, residual_margins / denominator_means, 0.0)
+    return ratios, margins
+
+
+def estimate_history(sample: StratifiedSample, themes: List[str], confidence: np.ndarray,
+                     positive: np.ndarray, negative: np.ndarray, total_entries: int) -> Dict[str, any]:
+    """
+    Whole-history theme and sentiment figures from the classified sample
+
+    Args:
+        sample: The design the entries were drawn with
+        themes: Theme of each confidence column
+        confidence: (sampled entries x themes), 0 where the entry lacks the theme
+        positive: Sampled entries classified positive
+        negative: Sampled entries classified negative
+        total_entries: History size including entries without text, the
+            denominator of theme percentages
+
+    Returns:
+        {'themes': {theme: count, percentage, avg_confidence and their margins},
+         'sentiment': overall counts, positive_percentage and its margin}
+    """
+    scale = sample.population / total_entries * 100
+    present = (confidence > 0).astype(np.float64)
+    shares, share_margins = estimate_means(sample, present)
+    averages, average_margins = estimate_ratios(sample, confidence.astype(np.float64), present)
+
+    theme_estimates = {
+        theme: {
+            'count': int(round(shares[j] * sample.population)),
+            'percentage': round(float(shares[j]) * scale, 1),
+            'percentage_margin': round(float(share_margins[j]) * scale, 1),
+            'avg_confidence': round(float(averages[j]), 3),
+            'avg_confidence_margin': round(float(average_margins[j]), 3)
+        }
+        for j, theme in enumerate(themes)
+    }
+
+    (positive_share, negative_share), (positive_margin, _) = estimate_means(
+        sample, np.column_stack((positive, negative)).astype(np.float64))
+    positive_count = int(round(positive_share * sample.population))
+    negative_count = int(round(negative_share * sample.population))
+    return {
+        'themes': theme_estimates,
+        'sentiment': {
+            'positive': positive_count,
+            'negative': negative_count,
+            'neutral': sample.population - positive_count - negative_count,
+            'positive_percentage': round(float(positive_share) * 100, 1),
+            'positive_percentage_margin': round(float(positive_margin) * 100, 1)
+        }
+    }
+
+
+def _proportional(sizes: np.ndarray, total: int) -> np.ndarray:
+    """Split total across sizes proportionally, handing out remainders largest first"""
+    exact = sizes * total / sizes.sum()
+    shares = np.floor(exact).astype(np.int64)
+    shortfall = total - int(shares.sum())
+    shares[np.argsort(-(exact - shares), kind='stable')[:shortfall]] += 1
+    return shares
@@ -0,0 +1,49 @@
+"""
+Single-flight coalescing of identical concurrent computations
+"""
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict
+
+import orjson
+
+from app.utils.metrics import COALESCED_REQUESTS
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        """
+        Share one in-flight computation between concurrent callers with the same key
+
+        Args:
+            name: Label for the coalescing metrics
+        """
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await compute(), or the computation already running under key
+
+        The computation runs as its own task, so one caller disconnecting does
+        not cancel it for the others. Every caller gets the same result object
+        (or exception), which must therefore not be mutated.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            COALESCED_REQUESTS.inc(name=self.name, role='leader')
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            COALESCED_REQUESTS.inc(name=self.name, role='coalesced')
+        return await asyncio.shield(task)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+
+def payload_digest(*parts) -> str:
+    """Stable digest of JSON-serializable parts (entries, mode, options)"""
+    return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
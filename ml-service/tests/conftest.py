@@ -0,0 +1,18 @@
+"""
+Shared fixtures: a local stub Ollama server in place of a live model
+"""
+import os
+import tempfile
+
+import pytest
+
+# Keep the job database the app opens at startup out of the user's data directory
+os.environ.setdefault('ML_DATA_DIR', tempfile.mkdtemp(prefix='journal-ml-tests-'))
+
+from app.bench.stub_ollama import StubOllamaServer
+
+
+@pytest.fixture
+def stub():
+    with StubOllamaServer(latency=0.0) as server:
+        yield server
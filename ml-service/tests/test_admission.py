@@ -0,0 +1,142 @@
+"""
+Admission control: bounded lanes, 503 with Retry-After, and degradation to the local tier
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+
+from app.bench.corpus import generate_entries
+from app.models.ollama_classifier import OllamaClassifier
+from app.routes import inference
+from app.schemas import AnalyzeHistoryRequest, ClassifyEntryRequest
+from app.utils.admission import LLM, LOCAL, AdmissionController, Overloaded
+from app.utils.batching import MicroBatcher
+from app.utils.singleflight import SingleFlight
+
+
+@asynccontextmanager
+async def occupied(admission, requests):
+    """Hold admission slots for requests callers until the block exits"""
+    release = asyncio.Event()
+    held = asyncio.Semaphore(0)
+
+    async def hold():
+        async with admission.slot():
+            held.release()
+            await release.wait()
+
+    tasks = [asyncio.ensure_future(hold()) for _ in range(requests)]
+    # Running holders have their slot; the rest are queued behind them
+    for _ in range(min(requests, admission.lanes[LLM].limit)):
+        await held.acquire()
+    await asyncio.sleep(0)
+    try:
+        yield
+    finally:
+        release.set()
+        await asyncio.gather(*tasks)
+
+
+def test_concurrent_classify_requests_share_one_batch_and_slot(stub, monkeypatch):
+    stub.latency = 0.05
+    classifier = OllamaClassifier(use_ollama=True, host=stub.url)
+    # Defaults: 4 LLM slots, degrading at a queue of 8
+    admission = AdmissionController(classifier)
+    batches = []
+
+    async def process(texts):
+        batches.append(len(texts))
+        return await inference.classify_micro_batch(texts)
+
+    monkeypatch.setattr(inference, 'classifier', classifier)
+    monkeypatch.setattr(inference, 'admission', admission)
+    monkeypatch.setattr(inference, 'entry_batcher',
+                        MicroBatcher(process, 'classify-entry', max_batch_size=32, max_wait=0.05))
+    texts = [entry['content'] for entry in generate_entries(32, seed=7)]
+
+    async def burst():
+        return await asyncio.gather(*(inference.classify_entry(ClassifyEntryRequest(text=text))
+                                      for text in texts))
+
+    responses = asyncio.run(burst())
+    assert batches == [32]
+    assert not any(response['degraded_mode'] for response in responses)
+    expected = asyncio.run(classifier.analyze_grouped_async(texts))
+    assert [(response['themes'], response['sentiment']) for response in responses] == \
+        [(result['themes'], result['sentiment']) for result, _ in expected]
+
+
+def test_full_queue_is_refused_with_retry_after(stub, monkeypatch):
+    classifier = OllamaClassifier(use_ollama=True, host=stub.url)
+    admission = AdmissionController(classifier, llm_limit=1, llm_queue=1, degrade_queue_depth=100,
+                                    retry_after=7)
+    monkeypatch.setattr(inference, 'classifier', classifier)
+    monkeypatch.setattr(inference, 'admission', admission)
+    monkeypatch.setattr(inference, 'history_flights', SingleFlight('analyze-user-history'))
+    request = AnalyzeHistoryRequest(entries=generate_entries(5, seed=1))
+
+    async def scenario():
+        # One running, one queued: the lane's queue is full
+        async with occupied(admission, 2):
+            assert admission.lanes[LLM].queued == 1
+            with pytest.raises(HTTPException) as refused:
+                await inference.analyze_user_history(request)
+        return refused.value
+
+    refused = asyncio.run(scenario())
+    assert refused.status_code == 503
+    assert refused.headers == {'Retry-After': '7'}
+
+
+def test_slot_wait_is_bounded_by_queue_timeout(stub):
+    admission = AdmissionController(OllamaClassifier(use_ollama=True, host=stub.url), llm_limit=1,
+                                    queue_timeout=0.05, degrade_queue_depth=100)
+
+    async def scenario():
+        async with occupied(admission, 1):
+            with pytest.raises(Overloaded):
+                async with admission.slot():
+                    pass
+        # Freed slots admit again
+        async with admission.slot() as degraded:
+            return degraded
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_deep_llm_queue_degrades_to_the_local_tier(stub, monkeypatch):
+    classifier = OllamaClassifier(use_ollama=True, host=stub.url)
+    admission = AdmissionController(classifier, llm_limit=1, degrade_queue_depth=1)
+    monkeypatch.setattr(inference, 'classifier', classifier)
+    monkeypatch.setattr(inference, 'admission', admission)
+    monkeypatch.setattr(inference, 'entry_batcher',
+                        MicroBatcher(inference.classify_micro_batch, 'classify-entry'))
+    text = generate_entries(1, seed=5)[0]['content']
+
+    async def scenario():
+        async with occupied(admission, 2):
+            assert admission.degraded()
+            degraded = await inference.classify_entry(ClassifyEntryRequest(text=text))
+        assert not admission.degraded()
+        return degraded
+
+    degraded = asyncio.run(scenario())
+    assert degraded['degraded_mode'] is True
+    assert stub.requests == 0
+    local = classifier.analyze_local([text])[0]
+    assert (degraded['themes'], degraded['sentiment']) == (local['themes'], local['sentiment'])
+    assert admission.stats()['ml_admission_degraded'] == 0
+
+
+def test_local_mode_never_degrades():
+    admission = AdmissionController(OllamaClassifier(), local_limit=1, degrade_queue_depth=0)
+
+    async def scenario():
+        async with admission.slot() as degraded:
+            assert admission.lanes[LOCAL].in_flight == 1
+            assert admission.lanes[LLM].in_flight == 0
+            return degraded
+
+    assert asyncio.run(scenario()) is False
@@ -0,0 +1,89 @@
+"""
+HistoryAggregator: columnar theme and sentiment figures match the per-theme loops they replaced
+"""
+import random
+
+import pytest
+
+from app.bench.corpus import generate_entries
+from app.models.ollama_classifier import OllamaClassifier
+from app.utils.aggregation import HistoryAggregator
+from app.utils.analytics import compare_halves
+
+
+def loop_theme_stats(total, classified):
+    """Per-theme loops over history-ordered (themes, sentiment) pairs"""
+    observations = {}
+    for themes, _ in classified:
+        for theme_obj in themes:
+            observations.setdefault(theme_obj['theme'], []).append(theme_obj['confidence'])
+
+    stats = []
+    for theme, confidences in observations.items():
+        trend = 'stable'
+        if len(confidences) >= 3:
+            mid = len(confidences) // 2
+            first = sum(confidences[:mid])
+            second = sum(confidences) - first
+            trend = compare_halves(first / mid, second / (len(confidences) - mid))
+        stats.append({
+            'theme': theme,
+            'count': len(confidences),
+            'percentage': round((len(confidences) / total) * 100, 1),
+            'avg_confidence': round(sum(confidences) / len(confidences), 3),
+            'trend': trend
+        })
+    stats.sort(key=lambda x: x['count'], reverse=True)
+    return stats[:7]
+
+
+@pytest.fixture(scope='module')
+def classified():
+    entries = generate_entries(300, seed=11)
+    results = OllamaClassifier().analyze_batch([entry['content'] for entry in entries])
+    return [(entry['created_at'], result['themes'], result['sentiment'])
+            for entry, result in zip(entries, results)]
+
+
+def aggregate(classified, order):
+    aggregator = HistoryAggregator(len(classified) + 5)
+    for index in order:
+        date, themes, sentiment = classified[index]
+        aggregator.add(index, date, themes, sentiment)
+    return aggregator.result()
+
+
+def test_theme_stats_match_loops(classified):
+    result = aggregate(classified, range(len(classified)))
+    expected = loop_theme_stats(len(classified) + 5,
+                                [(themes, sentiment) for _, themes, sentiment in classified])
+    assert result['themes'] == expected
+
+
+def test_sentiment_counts_match_loops(classified):
+    overall = aggregate(classified, range(len(classified)))['sentiment_trends']['overall']
+    for sentiment in ('positive', 'negative', 'neutral'):
+        assert overall[sentiment] == sum(1 for _, _, s in classified if s == sentiment)
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_add_order_does_not_change_result(classified, seed):
+    order = list(range(len(classified)))
+    random.Random(seed).shuffle(order)
+    assert aggregate(classified, order) == aggregate(classified, range(len(classified)))
+
+
+def test_equal_counts_keep_first_seen_rank_order():
+    aggregator = HistoryAggregator(2)
+    aggregator.add(1, None, [{'theme': 'work', 'confidence': 0.4}], 'neutral')
+    aggregator.add(0, None, [{'theme': 'family', 'confidence': 0.9},
+                             {'theme': 'health', 'confidence': 0.5}], 'neutral')
+    aggregator.add(1, None, [], 'neutral')
+    assert [stats['theme'] for stats in aggregator.result()['themes']] == ['family', 'health', 'work']
+
+
+def test_empty_history():
+    result = HistoryAggregator(3).result()
+    assert result['themes'] == []
+    assert result['sentiment_trends'] == {}
+    assert result['timeline'] == []
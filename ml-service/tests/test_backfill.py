@@ -0,0 +1,93 @@
+"""
+A backfill killed mid-run resumes from its checkpoint to the same output as an uninterrupted run
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from app.backfill import backfill
+from app.bench.corpus import generate_entries
+from app.bench.stub_ollama import StubOllamaServer
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+ROWS = 320
+
+
+@pytest.fixture(scope='module')
+def slow_stub():
+    # Slow enough that a run of ROWS rows can be killed part way through
+    with StubOllamaServer(latency=0.01) as server:
+        yield server
+
+
+@pytest.fixture
+def export(tmp_path):
+    rows = generate_entries(ROWS, seed=8)
+    for row in rows[::25]:
+        row['content'] = ''  # consumed, but not classified
+    path = tmp_path / 'entries.jsonl'
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows), encoding='utf-8')
+    return path
+
+
+def start_backfill(stub, source, output, *extra):
+    """python -m app.backfill in its own process, so it can be killed"""
+    env = {**os.environ, 'OLLAMA_HOST': stub.url, 'PYTHONPATH': str(SERVICE_DIR)}
+    return subprocess.Popen(
+        [sys.executable, '-m', 'app.backfill', '--input', str(source), '--output', str(output),
+         '--mode', 'ollama', '--workers', '1', '--batch-size', '8', '--no-progress', *extra],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+
+
+def finish(process):
+    _, stderr = process.communicate(timeout=120)
+    assert process.returncode == 0, stderr.decode()
+
+
+def checkpoint_rows(path):
+    try:
+        return json.loads(path.read_text())['rows']
+    except (OSError, ValueError):
+        return 0
+
+
+@pytest.mark.parametrize('suffix', ['.jsonl', '.csv'])
+def test_resume_after_kill_matches_uninterrupted_run(slow_stub, export, tmp_path, suffix, monkeypatch):
+    reference = tmp_path / f'reference{suffix}'
+    monkeypatch.setenv('OLLAMA_HOST', slow_stub.url)
+    backfill(str(export), str(reference), 'ollama', batch_size=8, show_progress=False)
+
+    output = tmp_path / f'labels{suffix}'
+    checkpoint = Path(str(output) + '.checkpoint')
+    process = start_backfill(slow_stub, export, output)
+    deadline = time.monotonic() + 60
+    while checkpoint_rows(checkpoint) < ROWS // 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+
+    done = checkpoint_rows(checkpoint)
+    assert ROWS // 3 <= done < ROWS
+    # A torn write past the checkpoint, as a kill between write and checkpoint leaves
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write('{"id": "torn')
+
+    finish(start_backfill(slow_stub, export, output, '--resume'))
+    assert output.read_bytes() == reference.read_bytes()
+    assert not checkpoint.exists()
+
+
+def test_resume_without_output_fails(slow_stub, export, tmp_path):
+    output = tmp_path / 'labels.jsonl'
+    Path(str(output) + '.checkpoint').write_text(json.dumps({'rows': 16, 'output_bytes': 100}))
+    process = start_backfill(slow_stub, export, output, '--resume')
+    _, stderr = process.communicate(timeout=60)
+    assert process.returncode != 0
+    assert b'is missing' in stderr
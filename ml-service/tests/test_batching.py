@@ -0,0 +1,63 @@
+"""
+Batched classification gives the same answers as classifying entries one at a time
+"""
+import asyncio
+
+import pytest
+
+from app.bench.corpus import generate_entries
+from app.models.linear_classifier import LinearClassifier
+from app.models.ollama_classifier import OllamaClassifier
+
+
+@pytest.fixture(scope='module')
+def texts():
+    texts = [entry['content'] for entry in generate_entries(300, seed=3)]
+    # Edge cases: no keywords at all, and an entry long enough to be chunked
+    return texts + ['', 'zzz qqq', ' '.join(texts[:40])]
+
+
+def test_keyword_batch_matches_single(texts):
+    classifier = OllamaClassifier()
+    assert classifier.analyze_batch(texts) == [classifier.analyze(text) for text in texts]
+    assert classifier.predict_batch(texts, top_k=5) == [classifier.predict(text, 5) for text in texts]
+    assert classifier.predict_sentiment_batch(texts) == [classifier.predict_sentiment(text) for text in texts]
+
+
+def test_linear_batch_matches_single(texts):
+    keyword = OllamaClassifier()
+    records = [{'content': text, **result} for text, result in zip(texts, keyword.analyze_batch(texts))]
+    classifier = OllamaClassifier(linear_model=LinearClassifier.train(records, keyword.themes))
+    assert classifier.analyze_batch(texts) == [classifier.analyze(text) for text in texts]
+
+
+def test_async_local_batch_matches_single(texts):
+    classifier = OllamaClassifier()
+    results, degraded, escalated = asyncio.run(classifier.analyze_batch_async(texts))
+    assert results == classifier.analyze_batch(texts)
+    assert (degraded, escalated) == (0, 0)
+
+
+def test_ollama_batch_matches_single(stub, texts):
+    classifier = OllamaClassifier(use_ollama=True, host=stub.url, max_entry_tokens=256)
+    texts = texts[:40] + texts[-1:]
+    single = [classifier.analyze(text) for text in texts]
+    calls = stub.requests
+
+    results, degraded, escalated = asyncio.run(classifier.analyze_batch_async(texts))
+    assert results == single
+    assert (degraded, escalated) == (0, len(texts))
+    # The long entry is sent as several chunks, each its own request
+    assert stub.requests - calls == calls > len(texts)
+
+
+def test_grouped_prompts_match_one_entry_per_prompt(stub, texts):
+    classifier = OllamaClassifier(use_ollama=True, host=stub.url, max_entry_tokens=256)
+    texts = texts[:40] + texts[-1:]
+    single = [asyncio.run(classifier.analyze_grouped_async([text]))[0] for text in texts]
+    calls = stub.requests
+
+    grouped = asyncio.run(classifier.analyze_grouped_async(texts))
+    assert grouped == single
+    assert not any(fell_back for _, fell_back in grouped)
+    assert stub.requests - calls < len(texts)
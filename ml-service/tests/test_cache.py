@@ -0,0 +1,82 @@
+"""
+Classification cache with a batched SQLite write-behind
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+
+from app.utils.cache import ClassificationCache
+
+
+def test_pending_results_are_served_and_persisted(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ClassificationCache(max_entries=10, db_path=path, flush_interval=60)
+    for i in range(100):
+        cache.set(f'key{i}', {'value': i})
+
+    # Evicted from memory and not yet written: still a hit
+    assert cache.get('key5') == {'value': 5}
+    cache.flush()
+    assert ClassificationCache(db_path=path).get('key99') == {'value': 99}
+
+
+def test_clear_drops_pending_and_stored_results(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ClassificationCache(db_path=path, flush_interval=60)
+    cache.set('written', 1)
+    cache.flush()
+    cache.set('pending', 2)
+    cache.clear()
+    cache.flush()
+    assert cache.get('written') is None and cache.get('pending') is None
+    assert ClassificationCache(db_path=path).get('written') is None
+
+
+def test_async_lookups_read_the_file_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.db')
+    writer = ClassificationCache(db_path=path, flush_interval=60)
+    for i in range(1200):
+        writer.set(f'key{i}', {'value': i})
+    writer.flush()
+
+    cache = ClassificationCache(db_path=path, flush_interval=60)
+    threads = []
+    load = cache._load
+    monkeypatch.setattr(cache, '_load', lambda keys: threads.append(threading.current_thread()) or load(keys))
+
+    keys = [f'key{i}' for i in range(0, 1300, 2)]
+    found = asyncio.run(cache.get_many_async(keys))
+    assert found == {f'key{i}': {'value': i} for i in range(0, 1200, 2)}
+    assert threads and threading.main_thread() not in threads
+    assert (cache.hits, cache.misses) == (600, 50)
+
+    # Now held in memory: no second read of the file
+    assert cache.get('key4') == {'value': 4}
+    assert len(threads) == 1
+
+
+def test_prune_keeps_the_newest_results_within_the_bound(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ClassificationCache(db_path=path, flush_interval=60, db_max_entries=50)
+    for i in range(120):
+        cache.set(f'key{i}', i)
+        time.sleep(0.001)
+    cache.flush()
+    cache.prune()
+
+    stored = ClassificationCache(db_path=path, flush_interval=60, db_max_entries=None)
+    assert stored.get_many(f'key{i}' for i in range(120)) == {f'key{i}': i for i in range(70, 120)}
+
+
+def test_prune_drops_expired_results(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ClassificationCache(db_path=path, ttl=0.05, flush_interval=60)
+    cache.set('old', 1)
+    cache.flush()
+    time.sleep(0.1)
+    cache.set('new', 2)
+    cache.flush()
+    cache.prune()
+    rows = sqlite3.connect(path).execute("SELECT key FROM classification_cache").fetchall()
+    assert rows == [('new',)]
@@ -0,0 +1,62 @@
+"""
+The confidence-gated cascade answers decisive entries locally and only sends the rest to Ollama
+"""
+import asyncio
+
+import pytest
+
+from app.bench.corpus import generate_entries
+from app.models.ollama_classifier import OllamaClassifier
+
+THRESHOLD = 2
+
+
+@pytest.fixture(scope='module')
+def texts():
+    return [entry['content'] for entry in generate_entries(200, seed=5)]
+
+
+def split(texts):
+    """Indexes the cascade should keep local, from the keyword margins"""
+    _, margins = OllamaClassifier()._local_analysis(texts)
+    return [index for index, margin in enumerate(margins.tolist()) if margin >= THRESHOLD]
+
+
+def test_cascade_splits_on_local_margin(stub, texts):
+    local = split(texts)
+    assert 0 < len(local) < len(texts)
+
+    cascade = OllamaClassifier(use_ollama=True, host=stub.url, cascade_threshold=THRESHOLD)
+    ollama = OllamaClassifier(use_ollama=True, host=stub.url)
+    keyword = OllamaClassifier()
+
+    results, degraded, escalated = asyncio.run(cascade.analyze_batch_async(texts))
+    assert (degraded, escalated) == (0, len(texts) - len(local))
+    assert stub.requests == len(texts) - len(local)
+    for index, result in enumerate(results):
+        expected = keyword if index in local else ollama
+        assert result == expected.analyze(texts[index])
+
+
+def test_cascaded_batch_matches_per_entry(stub, texts):
+    cascade = OllamaClassifier(use_ollama=True, host=stub.url, cascade_threshold=THRESHOLD)
+    single = [cascade.analyze(text) for text in texts]
+
+    results, _, _ = asyncio.run(cascade.analyze_batch_async(texts))
+    assert results == single
+    grouped = asyncio.run(cascade.analyze_grouped_async(texts))
+    assert [grouped[index][0] for index in split(texts)] == [single[index] for index in split(texts)]
+
+
+def test_local_mode_never_escalates(stub, texts):
+    cascade = OllamaClassifier(use_ollama=True, host=stub.url, cascade_threshold=THRESHOLD)
+    results, _, escalated = asyncio.run(cascade.analyze_batch_async(texts, local=True))
+    assert results == OllamaClassifier().analyze_batch(texts)
+    assert escalated == 0 and stub.requests == 0
+
+
+@pytest.mark.parametrize('threshold, escalated', [(0, 0), (None, 200)])
+def test_threshold_bounds(stub, texts, threshold, escalated):
+    classifier = OllamaClassifier(use_ollama=True, host=stub.url, cascade_threshold=threshold)
+    _, _, sent = asyncio.run(classifier.analyze_batch_async(texts))
+    assert sent == stub.requests == escalated
@@ -0,0 +1,120 @@
+"""
+Circuit breaker transitions: closed -> open -> half-open -> closed (or open again)
+"""
+import time
+
+import pytest
+
+from app.models.ollama_classifier import OllamaClassifier
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+PROBE_INTERVAL = 0.05
+
+
+def call(breaker, succeed=True):
+    with breaker.guard():
+        if not succeed:
+            raise RuntimeError('dependency failed')
+
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        with pytest.raises(RuntimeError):
+            call(breaker, succeed=False)
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker('test', min_calls=4, failure_rate=0.5, probe_interval=PROBE_INTERVAL)
+
+
+def test_stays_closed_below_min_calls(breaker):
+    fail(breaker, 3)
+    assert breaker.state == CLOSED
+    # The fourth call reaches min_calls; even a success leaves 3 of 4 failed
+    call(breaker)
+    assert breaker.state == OPEN
+
+
+def test_old_outcomes_leave_the_window():
+    breaker = CircuitBreaker('test', window=PROBE_INTERVAL, min_calls=4, failure_rate=0.5)
+    fail(breaker, 3)
+    time.sleep(PROBE_INTERVAL * 1.5)
+    fail(breaker)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['calls_in_window'] == 1
+
+
+def test_opens_at_failure_rate(breaker):
+    for _ in range(2):
+        call(breaker)
+    fail(breaker)
+    assert breaker.state == CLOSED  # 1 of 3, below min_calls
+    fail(breaker)
+    assert breaker.state == OPEN    # 2 of 4 failed
+
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpen):
+        call(breaker)
+
+
+def test_half_opens_after_interval_and_closes_on_success(breaker):
+    fail(breaker, 4)
+    assert breaker.is_open()
+
+    time.sleep(PROBE_INTERVAL * 1.5)
+    assert not breaker.is_open()
+    assert breaker.state == HALF_OPEN
+
+    # One trial at a time: a second call while the first is in flight is refused
+    with breaker.guard():
+        with pytest.raises(CircuitOpen):
+            call(breaker)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['calls_in_window'] == 0
+
+    # The failure window starts over after closing
+    fail(breaker, 3)
+    assert breaker.state == CLOSED
+
+
+def test_failed_trial_reopens(breaker):
+    fail(breaker, 4)
+    time.sleep(PROBE_INTERVAL * 1.5)
+    fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.is_open()  # the open interval restarted with the failed trial
+
+
+def test_probe_decides_when_to_half_open(breaker):
+    breaker.probing = True
+    fail(breaker, 4)
+    time.sleep(PROBE_INTERVAL * 1.5)
+    assert breaker.is_open()
+
+    breaker.half_open()
+    assert breaker.state == HALF_OPEN
+    call(breaker)
+    assert breaker.state == CLOSED
+
+
+def test_classifier_stops_calling_a_failing_ollama(stub):
+    breaker = CircuitBreaker('ollama', min_calls=4, failure_rate=0.5, probe_interval=PROBE_INTERVAL)
+    classifier = OllamaClassifier(use_ollama=True, host=stub.url, breaker=breaker)
+    keyword = OllamaClassifier()
+    texts = ['Work was stressful and I felt anxious', 'A calm walk with my family',
+             'Grateful for a good friend', 'Planning my goals for next year',
+             'Tired after the gym', 'Painted for an hour and loved it']
+
+    stub.failure_rate = 1.0
+    for text in texts:
+        assert classifier.analyze(text) == keyword.analyze(text)
+    assert breaker.state == OPEN
+    assert stub.requests == 4  # refused without a request once open
+
+    stub.failure_rate = 0.0
+    time.sleep(PROBE_INTERVAL * 1.5)
+    answer = classifier.analyze(texts[0])
+    assert stub.requests == 5
+    assert breaker.state == CLOSED
+    assert answer != keyword.analyze(texts[0])
@@ -0,0 +1,132 @@
+"""
+Near-duplicate grouping: MinHash/LSH decisions at the threshold, and the request override
+"""
+import random
+import string
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.bench.corpus import generate_entries
+from app.main import app
+from app.routes import inference
+from app.utils.dedup import NUM_PERM, near_duplicate_groups, normalize, shingle_set
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def repeated_history():
+    text = 'Went for a long run this morning and felt calm and focused for the rest of the day'
+    return [{'id': str(i), 'content': f'Day {i}: {text}', 'created_at': f'2024-03-{i + 1:02d}T08:00:00Z'}
+            for i in range(6)]
+
+
+def analyze(client, **options):
+    return client.post('/api/analyze-user-history', json={'entries': repeated_history(), **options})
+
+
+def test_request_threshold_groups_duplicates(client):
+    body = analyze(client, near_duplicate_threshold=0.8).json()
+    assert body['classifications_saved'] == 5
+
+
+def test_zero_threshold_overrides_service_default(client, monkeypatch):
+    monkeypatch.setattr(inference, 'near_duplicate_threshold', 0.8)
+    assert analyze(client).json()['classifications_saved'] == 5
+
+    body = analyze(client, near_duplicate_threshold=0.0).json()
+    assert 'classifications_saved' not in body
+
+
+@pytest.mark.parametrize('threshold', [-0.1, 1.5])
+def test_threshold_out_of_range_is_rejected(client, threshold):
+    assert analyze(client, near_duplicate_threshold=threshold).status_code == 422
+
+
+def jaccard(a, b):
+    set_a, set_b = shingle_set(normalize(a)), shingle_set(normalize(b))
+    return len(set_a & set_b) / len(set_a | set_b)
+
+
+def edited_pairs(words, count, seed):
+    """(original, edited) pairs: a run of words replaced at the end or in the middle"""
+    rng = random.Random(seed)
+
+    def fresh(n):
+        # Letters only: normalize() drops digits
+        return [''.join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(n)]
+
+    pairs = []
+    for trial in range(count):
+        base = fresh(words)
+        replaced = rng.randrange(words // 3)
+        start = words - replaced if trial % 2 else rng.randrange(words - replaced + 1)
+        edited = base[:start] + fresh(replaced) + base[start + replaced:]
+        pairs.append((' '.join(base), ' '.join(edited)))
+    return pairs
+
+
+# Short entries (fewer shingles than signature bins) are decided exactly; long ones
+# through MinHash agreement, with only borderline candidates checked exactly
+@pytest.mark.parametrize('words', [30, NUM_PERM + 2, 120, 400])
+@pytest.mark.parametrize('threshold', [0.5, 0.8, 0.9])
+def test_pairs_group_exactly_at_threshold(words, threshold):
+    near = 0
+    for a, b in edited_pairs(words, 150, seed=words):
+        similarity = jaccard(a, b)
+        near += abs(similarity - threshold) < 0.05
+        groups = near_duplicate_groups([a, b], threshold)
+        assert (groups[0] == groups[1]) == (similarity >= threshold), similarity
+    assert near >= 5  # the corpus has pairs close to the threshold on both sides
+
+
+def test_similarity_equal_to_threshold_groups():
+    a, b = edited_pairs(30, 1, seed=1)[0]
+    similarity = jaccard(a, b)
+    assert similarity < 1
+    assert near_duplicate_groups([a, b], similarity).tolist() == [0, 0]
+    assert near_duplicate_groups([a, b], similarity + 1e-9).tolist() == [0, 1]
+
+
+def test_clusters_and_representatives():
+    rng = random.Random(9)
+    texts, labels = [], []
+    for cluster in range(20):
+        base = [''.join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(80)]
+        for variant in range(5):
+            words = list(base)
+            words[rng.randrange(80)] = 'edited'
+            texts.append(' '.join(words + ['extra'] * variant))
+            labels.append(cluster)
+    order = list(range(len(texts)))
+    rng.shuffle(order)
+    texts = [texts[i] for i in order]
+    labels = [labels[i] for i in order]
+
+    representative = near_duplicate_groups(texts, 0.8).tolist()
+    for index, group in enumerate(representative):
+        # Same cluster only, represented by its longest entry
+        assert labels[group] == labels[index]
+        assert len(texts[group]) == max(len(t) for t, label in zip(texts, labels) if label == labels[index])
+    assert len(set(representative)) == 20
+
+
+def test_normalized_duplicates_group_outright():
+    texts = ['Day 41: gym, work, dinner.', 'day 42 - GYM work dinner', 'Day 43: gym, work, lunch.', '', '']
+    assert near_duplicate_groups(texts, 0.99).tolist() == [0, 0, 2, 3, 3]
+
+
+def test_edited_copies_in_a_templated_history():
+    # Generated entries reuse a small pool of sentences, so LSH buckets are large;
+    # every edited copy must still be grouped with its original
+    texts = [entry['content'] for entry in generate_entries(3000, seed=42)]
+    copies = random.Random(4).sample(range(len(texts)), 750)
+    texts += [f"Day {index}: {texts[index]} Edit: fixed a typo." for index in copies]
+
+    representative = near_duplicate_groups(texts, 0.8)
+    originals = representative[copies]
+    assert (representative[3000:] == originals).all()
@@ -0,0 +1,112 @@
+"""
+Incremental insights sync matches a full /analyze-user-history run over the same entries
+"""
+import asyncio
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.bench.corpus import generate_entries
+from app.main import app
+from app.models.ollama_classifier import OllamaClassifier
+from app.routes import inference
+from app.schemas import InsightsSyncRequest
+from app.utils.insights_store import InsightsStore
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def full_analysis(client, entries):
+    ordered = sorted(entries.values(), key=lambda entry: (entry['created_at'], entry['id']))
+    body = client.post('/api/analyze-user-history', json={'entries': ordered}).json()
+    return body['analysis']
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_shuffled_sync_with_edits_and_deletes_matches_full_run(client, seed):
+    rng = random.Random(seed)
+    corpus = generate_entries(240, seed=seed)
+    rng.shuffle(corpus)
+    user = f'incremental-{seed}'
+    current = {}
+
+    for start in range(0, 200, 40):
+        upserts = corpus[start:start + 40]
+        edits = [dict(entry, content=rng.choice(corpus)['content'])
+                 for entry in rng.sample(list(current.values()), min(5, len(current)))]
+        moved = [dict(entry, created_at=rng.choice(corpus)['created_at'])
+                 for entry in rng.sample(list(current.values()), min(3, len(current)))]
+        upserts = upserts + edits + moved
+        deletes = [entry['id'] for entry in rng.sample(list(current.values()), min(6, len(current)))
+                   if entry['id'] not in {changed['id'] for changed in edits + moved}]
+        if start == 80:
+            # Entries without text still count toward the total
+            upserts.append(dict(corpus[-1], content=''))
+
+        synced = client.post(f'/api/insights/{user}/entries',
+                             json={'upserts': upserts, 'deletes': deletes, 'reset': start == 0}).json()
+
+        for entry_id in deletes:
+            current.pop(entry_id)
+        current.update((entry['id'], entry) for entry in upserts)
+
+        assert synced['total_entries'] == len(current)
+        assert synced['analysis'] == full_analysis(client, current)
+
+
+def test_deleting_every_entry_of_a_theme_drops_it(client):
+    entries = generate_entries(30, seed=5)
+    synced = client.post('/api/insights/drop-user/entries',
+                         json={'upserts': entries, 'reset': True}).json()
+    assert synced['analysis']['themes']
+
+    synced = client.post('/api/insights/drop-user/entries',
+                         json={'deletes': [entry['id'] for entry in entries[1:]]}).json()
+    assert synced['total_entries'] == 1
+    assert synced['analysis'] == full_analysis(client, {entries[0]['id']: entries[0]})
+
+
+def test_state_evicted_while_classifying_is_kept(stub, monkeypatch):
+    stub.latency = 0.2
+    monkeypatch.setattr(inference, 'classifier', OllamaClassifier(use_ollama=True, host=stub.url))
+    monkeypatch.setattr(inference, 'insights_store', InsightsStore(max_users=2))
+    entries = generate_entries(8, seed=9)
+
+    async def syncs():
+        slow = asyncio.ensure_future(inference.sync_user_entries(
+            'slow', InsightsSyncRequest(upserts=entries)))
+        await asyncio.sleep(0.05)
+        # Two other users fill the store while the first one waits on Ollama
+        for user in ('other-1', 'other-2'):
+            await inference.sync_user_entries(user, InsightsSyncRequest(upserts=[dict(entries[0], content='')]))
+        assert inference.insights_store.get('slow') is None
+        return await slow
+
+    synced = asyncio.run(syncs())
+    state = inference.insights_store.get('slow')
+    assert state is not None and state.total_entries == synced['total_entries'] == len(entries)
+    assert not inference.insights_store._sync_locks
+
+
+def test_syncs_of_one_user_apply_in_turn(stub, monkeypatch):
+    stub.latency = 0.1
+    monkeypatch.setattr(inference, 'classifier', OllamaClassifier(use_ollama=True, host=stub.url))
+    monkeypatch.setattr(inference, 'insights_store', InsightsStore())
+    entries = generate_entries(12, seed=10)
+
+    async def syncs():
+        first = asyncio.ensure_future(inference.sync_user_entries(
+            'user', InsightsSyncRequest(upserts=entries[:6])))
+        await asyncio.sleep(0.02)
+        # Sees the first sync's entries, so only its own are new
+        second = await inference.sync_user_entries('user', InsightsSyncRequest(upserts=entries))
+        return await first, second
+
+    first, second = asyncio.run(syncs())
+    assert (first['total_entries'], second['total_entries']) == (6, 12)
+    assert (first['classified_entries'], second['classified_entries']) == (6, 6)
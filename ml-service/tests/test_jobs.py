@@ -0,0 +1,128 @@
+"""
+Background analysis jobs: submit, progress, cancel, result, and a job store that outlives the process
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.bench.corpus import generate_entries
+from app.main import app
+from app.models.ollama_classifier import OllamaClassifier
+from app.utils.jobs import CANCELLED, COMPLETED, FAILED, QUEUED, RUNNING, AnalysisJobs
+
+
+class GatedClassifier:
+    """Local classifier that waits for the test to release each batch"""
+
+    def __init__(self):
+        self.classifier = OllamaClassifier()
+        self.released = asyncio.Semaphore(0)
+
+    async def analyze_iter_async(self, texts, top_k=3, local=False):
+        await self.released.acquire()
+        async for item in self.classifier.analyze_iter_async(texts, top_k, local=True):
+            yield item
+
+
+async def wait_for(jobs, job_id, *statuses, processed=None):
+    for _ in range(500):
+        status = jobs.status(job_id)
+        if status['status'] in statuses and processed in (None, status['processed_entries']):
+            return status
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} stuck in {status}")
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_submitted_job_returns_the_history_analysis(client):
+    entries = generate_entries(120, seed=4)
+    entries[5]['content'] = ''
+    submitted = client.post('/api/jobs/analyze-user-history', json={'entries': entries})
+    assert submitted.status_code == 202
+    job_id = submitted.json()['job_id']
+
+    for _ in range(500):
+        status = client.get(f'/api/jobs/{job_id}').json()
+        if status['status'] == COMPLETED:
+            break
+        time.sleep(0.01)
+    assert status['entries_to_classify'] == status['processed_entries'] == 119
+    assert status['progress'] == 1.0
+
+    expected = client.post('/api/analyze-user-history', json={'entries': entries}).json()
+    result = client.get(f'/api/jobs/{job_id}/result').json()
+    assert result['analysis'] == expected['analysis']
+    assert result['total_entries'] == 120
+
+
+def test_unknown_job_is_404(client):
+    assert client.get('/api/jobs/missing').status_code == 404
+    assert client.get('/api/jobs/missing/result').status_code == 404
+    assert client.delete('/api/jobs/missing').status_code == 404
+
+
+def test_progress_and_cancel_while_running():
+    async def scenario():
+        classifier = GatedClassifier()
+        jobs = AnalysisJobs(classifier, workers=1, batch_size=10, progress_interval=0)
+        await jobs.start()
+        try:
+            job_id = jobs.submit(generate_entries(30, seed=2))['job_id']
+            queued_id = jobs.submit(generate_entries(10, seed=3))['job_id']
+            assert jobs.status(queued_id)['status'] == QUEUED
+
+            classifier.released.release()
+            status = await wait_for(jobs, job_id, RUNNING, processed=10)
+            assert status['progress'] == round(10 / 30, 3)
+
+            # Queued jobs never reach a worker; running ones stop at their next await
+            assert jobs.cancel(queued_id)['status'] == CANCELLED
+            jobs.cancel(job_id)
+            status = await wait_for(jobs, job_id, CANCELLED)
+            assert status['processed_entries'] == 10
+            assert jobs.result(job_id) is None
+
+            # Finished jobs are left as they are
+            assert jobs.cancel(job_id)['status'] == CANCELLED
+        finally:
+            await jobs.close()
+
+    asyncio.run(scenario())
+
+
+def test_results_outlive_a_restart_and_unfinished_jobs_fail(tmp_path):
+    db_path = str(tmp_path / 'jobs' / 'analysis_jobs.db')
+
+    async def first_run():
+        classifier = GatedClassifier()
+        jobs = AnalysisJobs(classifier, db_path, workers=1, batch_size=10)
+        await jobs.start()
+        done_id = jobs.submit(generate_entries(8, seed=5))['job_id']
+        classifier.released.release()
+        await wait_for(jobs, done_id, COMPLETED)
+        running_id = jobs.submit(generate_entries(8, seed=6))['job_id']
+        await wait_for(jobs, running_id, RUNNING)
+        queued_id = jobs.submit(generate_entries(8, seed=7))['job_id']
+        await jobs.close()
+        return done_id, running_id, queued_id
+
+    async def second_run(done_id, running_id, queued_id):
+        jobs = AnalysisJobs(OllamaClassifier(), db_path)
+        await jobs.start()
+        try:
+            assert jobs.status(done_id)['status'] == COMPLETED
+            assert jobs.result(done_id)['total_entries'] == 8
+            assert jobs.status(running_id)['status'] == FAILED
+            # Left queued by the first process, so failed when this one starts
+            assert jobs.status(queued_id)['status'] == FAILED
+        finally:
+            await jobs.close()
+
+    asyncio.run(second_run(*asyncio.run(first_run())))
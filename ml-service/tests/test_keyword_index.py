@@ -0,0 +1,130 @@
+"""
+Keyword fast paths against the original substring scans, with whole-word matching
+"""
+import pytest
+
+from app.bench.corpus import generate_entries
+from app.models.keyword_index import tokenize
+from app.models.ollama_classifier import (
+    KEYWORD_FORMS, NEGATIVE_WORDS, POSITIVE_WORDS, THEME_KEYWORDS, OllamaClassifier
+)
+
+
+def baseline_sentiment(text):
+    """_fast_sentiment as it was before the keyword index"""
+    text_lower = text.lower()
+    positive_count = sum(1 for word in POSITIVE_WORDS if word in text_lower)
+    negative_count = sum(1 for word in NEGATIVE_WORDS if word in text_lower)
+    if positive_count > negative_count + 1:
+        return 'positive'
+    elif negative_count > positive_count + 1:
+        return 'negative'
+    return 'neutral'
+
+
+def baseline_themes(text, top_k=3):
+    """_fallback_themes as it was before the keyword index"""
+    text_lower = text.lower()
+    theme_scores = {}
+    for theme, keywords in THEME_KEYWORDS.items():
+        score = sum(1 for keyword in keywords if keyword in text_lower)
+        if score > 0:
+            theme_scores[theme] = score
+    sorted_themes = sorted(theme_scores.items(), key=lambda x: x[1], reverse=True)
+    results = [{'theme': theme, 'confidence': min(0.5 + (score * 0.1), 0.9)}
+               for theme, score in sorted_themes[:top_k]]
+    return results or [{'theme': 'daily_life', 'confidence': 0.6}]
+
+
+# Every intended difference from the substring scans: text -> keywords it no longer hits
+INTENDED_DIFFERENCES = {
+    "We sat under the willow.": {'will'},
+    "Bought new hardware for the orchard.": {'hard'},
+    "Richard called.": {'hard'},
+    "Started a new part of the chart, smart move, heart racing.": {'art'},
+    "Walked around the cart with a quart of milk.": {'art'},
+    "Read an article about the earth.": {'art'},
+    "Watered the plant and watched a planet documentary, no explanation needed.": {'plan'},
+    "The airplane landed; planes everywhere.": {'plan'},
+    "William was willing to help.": {'will'},
+    "A crusade against the ambassador.": {'sad'},
+    "I could hardly say goodbye.": {'hard', 'good'},
+    "Feeling hopeless.": {'hope'},
+    "Bought paint in Spain.": {'pain'},
+    "Whatever, we toured a chateau.": {'hate'},
+    "Lost a glove in the clover.": {'love'},
+    "Got my badge at badminton.": {'bad'},
+    "The dog would growl.": {'grow'},
+    "An ideal evening.": {'idea'},
+    "I was unhappy.": {'happy'},
+    "Felt ungrateful and unfortunate.": {'grateful', 'fortunate'},
+    "It was unsuccessful.": {'success'},
+    "An imperfect day.": {'perfect'},
+}
+
+# Matches inside longer words that must keep working
+KEPT = {
+    "Today was long.": {'day'},
+    "Planning the holidays.": {'day', 'plan'},
+    "My achievement and improvement show development.": {'achieve', 'improve', 'develop'},
+    "Feelings about friendship.": {'feel', 'friend'},
+    "Growth: I have grown.": {'grow'},
+    "The greatest workout.": {'great', 'work', 'workout'},
+    "Art and artists.": {'art'},
+    "I will be there.": {'will'},
+    "Hopeful and stressful.": {'hope', 'stress'},
+}
+
+classifier = OllamaClassifier()
+index = classifier.keyword_index
+
+
+def keywords(text):
+    return {index.vocabulary[i] for i in index.match(text)}
+
+
+def baseline_keywords(text):
+    text_lower = text.lower()
+    return {keyword for keyword in index.vocabulary if keyword in text_lower}
+
+
+def test_corpus_matches_baseline():
+    for entry in generate_entries(2000, seed=7):
+        text = entry['content']
+        assert classifier._fast_sentiment(text) == baseline_sentiment(text)
+        assert classifier._fallback_themes(text) == baseline_themes(text)
+
+
+def test_batch_scores_match_single_scores():
+    texts = [entry['content'] for entry in generate_entries(200, seed=3)] + list(INTENDED_DIFFERENCES)
+    batch = index.score_batch(texts)
+    for row, text in zip(batch, texts):
+        assert dict(zip(index.labels, row.tolist())) == index.score(text)
+
+
+@pytest.mark.parametrize('text, dropped', INTENDED_DIFFERENCES.items())
+def test_intended_differences(text, dropped):
+    assert baseline_keywords(text) - keywords(text) == dropped
+    assert keywords(text) <= baseline_keywords(text)
+
+
+@pytest.mark.parametrize('text, expected', KEPT.items())
+def test_inflected_and_compound_words_still_match(text, expected):
+    assert keywords(text) == expected == baseline_keywords(text)
+
+
+def test_every_keyword_lists_its_forms():
+    # An explicit entry per keyword, so a new keyword cannot silently match nothing but itself
+    assert set(KEYWORD_FORMS) == set(index.vocabulary)
+    for keyword, forms in KEYWORD_FORMS.items():
+        assert len(set(forms)) == len(forms)
+        for form in forms:
+            # Each form contains its keyword, so no score exceeds the substring scans
+            assert keyword in form and form != keyword and tokenize(form) == [form]
+
+
+def test_words_match_only_their_keyword_or_listed_forms():
+    for entry in generate_entries(2000, seed=7):
+        for word in tokenize(entry['content']):
+            assert keywords(word) == {keyword for keyword in index.vocabulary
+                                      if word == keyword or word in KEYWORD_FORMS[keyword]}
@@ -0,0 +1,86 @@
+"""
+MicroBatcher: batches leave when full or when their oldest item has waited max_wait
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.utils.batching import MicroBatcher
+
+
+class Recorder:
+    """Batch processor that records each batch and when it arrived"""
+
+    def __init__(self):
+        self.batches = []
+        self.started = time.perf_counter()
+
+    async def __call__(self, items):
+        self.batches.append((list(items), time.perf_counter() - self.started))
+        await asyncio.sleep(0)
+        return [item * 10 for item in items]
+
+
+def test_full_batches_leave_without_waiting():
+    recorder = Recorder()
+
+    async def burst():
+        batcher = MicroBatcher(recorder, 'test', max_batch_size=4, max_wait=0.5)
+        return await asyncio.gather(*(batcher.submit(item) for item in range(10)))
+
+    assert asyncio.run(burst()) == [item * 10 for item in range(10)]
+    assert [items for items, _ in recorder.batches] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    full, _, partial = [at for _, at in recorder.batches]
+    # Full batches go at once; the remainder waits out max_wait
+    assert full < 0.25
+    assert partial >= 0.5
+
+
+def test_partial_batch_leaves_after_max_wait():
+    recorder = Recorder()
+
+    async def trickle():
+        batcher = MicroBatcher(recorder, 'test', max_batch_size=32, max_wait=0.05)
+        first = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(batcher.submit(2))
+        results = await asyncio.gather(first, second)
+        # The timer is per batch: a later item starts a new one
+        third = await batcher.submit(3)
+        return results + [third]
+
+    assert asyncio.run(trickle()) == [10, 20, 30]
+    assert [items for items, _ in recorder.batches] == [[1, 2], [3]]
+    first_at, second_at = [at for _, at in recorder.batches]
+    assert 0.05 <= first_at < 0.25
+    assert second_at - first_at >= 0.05
+
+
+def test_failure_reaches_every_caller_in_the_batch():
+    async def fail(items):
+        raise RuntimeError('down')
+
+    async def burst():
+        batcher = MicroBatcher(fail, 'test', max_batch_size=3, max_wait=0.01)
+        return await asyncio.gather(*(batcher.submit(item) for item in range(3)),
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(burst()))
+
+
+def test_cancelled_callers_are_left_out_of_the_batch():
+    recorder = Recorder()
+
+    async def scenario():
+        batcher = MicroBatcher(recorder, 'test', max_batch_size=8, max_wait=0.02)
+        gone = asyncio.ensure_future(batcher.submit(1))
+        kept = asyncio.ensure_future(batcher.submit(2))
+        await asyncio.sleep(0)
+        gone.cancel()
+        assert await kept == 20
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+
+    asyncio.run(scenario())
+    assert [items for items, _ in recorder.batches] == [[2]]
@@ -0,0 +1,112 @@
+"""
+Prompt library: theme-weighted ranking and hot reload of the library file
+"""
+import json
+import time
+
+import pytest
+
+from app.models.ollama_classifier import OllamaClassifier
+from app.utils.prompts import FALLBACK_PROMPT, PromptLibrary, build_index
+
+THEMES = OllamaClassifier().themes
+
+LIBRARY = {
+    'work': ["Work one.", "Work two.", "Work three."],
+    'health': ["Health one.", "Health two."],
+    'stress': ["Stress one."],
+    'relationships': [
+        "Relationships one.",
+        {'text': "Work with people.", 'themes': {'work': 1.0}},
+    ],
+    'daily_life': ["Daily one."],
+}
+
+
+def write_library(path, library):
+    path.write_text(json.dumps(library), encoding='utf-8')
+
+
+def wait_for_index(library, predicate):
+    for _ in range(200):
+        index = library.index
+        if predicate(index):
+            return index
+        time.sleep(0.01)
+    raise AssertionError("prompt library was not reloaded")
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = tmp_path / 'prompts.json'
+    write_library(path, LIBRARY)
+    return PromptLibrary(THEMES, str(path), check_interval=0)
+
+
+def test_index_resolves_aliases_and_merges_tags():
+    index = build_index({**LIBRARY, 'work': LIBRARY['work'] + ["Relationships one."]}, THEMES)
+    stress = index.weights[index.texts.index("Stress one.")]
+    assert stress[THEMES.index('challenges')] > stress[THEMES.index('emotions')] > 0
+
+    # Listed twice: one prompt filed under both themes
+    row = index.texts.index("Relationships one.")
+    assert index.texts.count("Relationships one.") == 1
+    assert row in index.by_theme['work'] and row in index.by_theme['relationships']
+
+
+def test_suggestions_rank_by_theme_weights(library):
+    suggestions = library.suggest({'work': 1.0, 'relationships': 0.6}, limit=10)
+    # Tagged with both of the user's themes, so it beats prompts carrying one
+    assert suggestions[0]['prompt'] == "Work with people."
+    assert suggestions[0]['theme'] == 'work'
+    assert [s['score'] for s in suggestions] == sorted((s['score'] for s in suggestions), reverse=True)
+    # Only prompts sharing a theme with the user
+    assert {s['theme'] for s in suggestions} == {'work', 'relationships'}
+    assert len(suggestions) == 5
+
+
+def test_suggestions_spread_across_themes(library):
+    suggestions = library.suggest({'work': 1.0, 'health': 0.9}, limit=2)
+    assert {s['theme'] for s in suggestions} == {'work', 'health'}
+
+
+def test_alias_and_unknown_user_themes(library):
+    assert library.suggest({'anxiety': 1.0}, limit=1)[0]['prompt'] == "Stress one."
+    # Nothing known about the user: daily_life prompts
+    assert library.suggest({'astronomy': 1.0})[0]['prompt'] == "Daily one."
+
+
+def test_empty_library_falls_back(tmp_path):
+    path = tmp_path / 'prompts.json'
+    write_library(path, {})
+    library = PromptLibrary(THEMES, str(path))
+    assert library.suggest({'work': 1.0}) == [{'theme': 'daily_life', 'prompt': FALLBACK_PROMPT,
+                                               'score': 0.0}]
+    assert library.random_prompt()['prompt'] == FALLBACK_PROMPT
+
+
+def test_edited_file_is_reloaded(library, tmp_path):
+    first = library.index
+    write_library(tmp_path / 'prompts.json', {**LIBRARY, 'health': ["A new health prompt."]})
+
+    index = wait_for_index(library, lambda index: index is not first)
+    assert "A new health prompt." in index.texts
+    assert "Health one." not in index.texts
+    assert library.get_prompt_by_theme('health') == "A new health prompt."
+
+
+def test_broken_file_keeps_the_previous_index(library, tmp_path):
+    first = library.index
+    (tmp_path / 'prompts.json').write_text('{"work": [', encoding='utf-8')
+    for _ in range(20):
+        assert library.index is first
+        time.sleep(0.01)
+
+    write_library(tmp_path / 'prompts.json', {'work': ["Fixed."]})
+    assert wait_for_index(library, lambda index: index is not first).texts == ["Fixed."]
+
+
+def test_missing_file_uses_default_prompts(tmp_path):
+    library = PromptLibrary(THEMES, str(tmp_path / 'missing.json'))
+    assert len(library.index.texts) == sum(len(prompts) for prompts in library.get_default_prompts().values())
+    assert library.suggest({'creativity': 1.0}, limit=1)[0]['theme'] == 'creativity'
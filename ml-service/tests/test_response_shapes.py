@@ -0,0 +1,65 @@
+"""
+Exact-mode responses keep their original shape: no null fields from the approximate schemas
+"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.bench.corpus import generate_entries
+from app.main import app
+
+# Fields only approximate analyses (and opt-in options) fill in
+OPTIONAL_FIELDS = {'percentage_margin', 'avg_confidence_margin', 'positive_percentage_margin',
+                   'sampled_entries', 'confidence', 'classifications_saved', 'time_analytics'}
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def keys(value):
+    """Every dict key anywhere in a JSON value"""
+    if isinstance(value, dict):
+        return set(value) | set().union(*(keys(item) for item in value.values()))
+    if isinstance(value, list):
+        return set().union(*(keys(item) for item in value))
+    return set()
+
+
+@pytest.fixture(scope='module')
+def entries():
+    return generate_entries(60, seed=11)
+
+
+def test_analyze_user_history(client, entries):
+    body = client.post('/api/analyze-user-history', json={'entries': entries}).json()
+    assert not keys(body) & OPTIONAL_FIELDS
+
+
+def test_analyze_user_history_approximate_adds_margins(client, entries):
+    many = generate_entries(3000, seed=12)
+    body = client.post('/api/analyze-user-history', json={'entries': many, 'approximate': True}).json()
+    assert {'percentage_margin', 'sampled_entries', 'confidence'} <= keys(body)
+    assert 'time_analytics' not in body['analysis']
+
+
+def test_insights_sync_and_get(client, entries):
+    synced = client.post('/api/insights/shape-user/entries',
+                         json={'upserts': entries, 'reset': True}).json()
+    stored = client.get('/api/insights/shape-user').json()
+    for body in (synced, stored):
+        assert not keys(body) & OPTIONAL_FIELDS
+        assert None not in [value for value in body.values()]
+
+
+def test_job_result(client, entries):
+    job = client.post('/api/jobs/analyze-user-history', json={'entries': entries}).json()
+    for _ in range(200):
+        if client.get(f"/api/jobs/{job['job_id']}").json()['status'] == 'completed':
+            break
+        time.sleep(0.01)
+    body = client.get(f"/api/jobs/{job['job_id']}/result").json()
+    assert body['success'] and not keys(body) & OPTIONAL_FIELDS
@@ -0,0 +1,96 @@
+"""
+Stratified sampling: confidence intervals cover the full-history value at their nominal rate
+"""
+import numpy as np
+import pytest
+
+from app.utils.analytics import weekday_counts
+from app.utils.sampling import (estimate_history, estimate_means, estimate_ratios,
+                                sample_size, stratified_sample)
+
+POPULATION = 6000
+DRAWS = 400
+
+
+@pytest.fixture(scope='module')
+def history():
+    """Two years of entries whose theme rate and confidence drift over time"""
+    rng = np.random.default_rng(1)
+    days = np.sort(rng.uniform(18000, 18730, POPULATION))
+    progress = np.linspace(0, 1, POPULATION)
+    present = rng.random((POPULATION, 3)) < np.column_stack((0.1 + 0.6 * progress,  # rising
+                                                             0.5 - 0.3 * progress,  # falling
+                                                             np.full(POPULATION, 0.05)))  # rare
+    confidence = np.where(present, rng.uniform(0.5, 0.6, present.shape) + 0.3 * progress[:, None], 0.0)
+    return days, present.astype(np.float64), confidence
+
+
+def draws(days, max_error, confidence=0.95):
+    weekdays = weekday_counts(days)
+    for seed in range(DRAWS):
+        yield stratified_sample(days, weekdays, max_error, confidence, seed=seed)
+
+
+@pytest.mark.parametrize('max_error, confidence', [(0.05, 0.95), (0.03, 0.9)])
+def test_share_intervals_cover_true_value(history, max_error, confidence):
+    days, present, _ = history
+    truth = present.mean(axis=0)
+
+    covered = np.zeros(present.shape[1])
+    widest = 0.0
+    for sample in draws(days, max_error, confidence):
+        means, margins = estimate_means(sample, present[sample.indexes])
+        covered += np.abs(means - truth) <= margins
+        widest = max(widest, margins.max())
+
+    # Nominal coverage, less three standard errors of a DRAWS-sized binomial
+    slack = 3 * np.sqrt(confidence * (1 - confidence) / DRAWS)
+    assert (covered / DRAWS >= confidence - slack).all(), covered / DRAWS
+    # Sized for the worst-case proportion, so no interval is wider than asked for
+    assert widest <= max_error
+
+
+def test_ratio_intervals_cover_true_average(history):
+    days, present, confidence = history
+    truth = confidence.sum(axis=0) / present.sum(axis=0)
+
+    covered = np.zeros(present.shape[1])
+    for sample in draws(days, 0.05):
+        ratios, margins = estimate_ratios(sample, confidence[sample.indexes], present[sample.indexes])
+        covered += np.abs(ratios - truth) <= margins
+
+    slack = 3 * np.sqrt(0.95 * 0.05 / DRAWS)
+    assert (covered / DRAWS >= 0.95 - slack).all(), covered / DRAWS
+
+
+def test_sample_design(history):
+    days = history[0]
+    sample = stratified_sample(days, weekday_counts(days), 0.05, seed=3)
+
+    assert len(sample.indexes) >= sample_size(POPULATION, 0.05)
+    assert (np.diff(sample.indexes) > 0).all()
+    # The most recent entries are always classified
+    assert set(range(POPULATION - 10, POPULATION)) <= set(sample.indexes.tolist())
+    assert sample.population == POPULATION
+    assert (sample.sample_sizes <= sample.stratum_sizes).all()
+    assert (np.bincount(sample.strata) == sample.sample_sizes).all()
+
+    # Same seed, same sample; short histories are analyzed in full
+    again = stratified_sample(days, weekday_counts(days), 0.05, seed=3)
+    assert (again.indexes == sample.indexes).all()
+    assert stratified_sample(days[:40], weekday_counts(days[:40]), 0.05) is None
+
+
+def test_estimate_history_percentages(history):
+    days, present, confidence = history
+    sample = stratified_sample(days, weekday_counts(days), 0.05, seed=0)
+    rows = sample.indexes
+    estimates = estimate_history(sample, ['rising', 'falling', 'rare'], confidence[rows],
+                                 present[rows, 0], present[rows, 1], total_entries=POPULATION * 2)
+
+    # Entries without text count in the denominator of theme percentages
+    rising = estimates['themes']['rising']
+    assert rising['percentage'] == pytest.approx(present[rows, 0].mean() * 50, abs=5)
+    assert abs(rising['percentage'] - present[:, 0].mean() * 50) <= rising['percentage_margin'] + 0.1
+    sentiment = estimates['sentiment']
+    assert sentiment['positive'] + sentiment['negative'] + sentiment['neutral'] == POPULATION
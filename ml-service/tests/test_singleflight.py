@@ -0,0 +1,98 @@
+"""
+Single-flight: identical concurrent computations run once and every caller shares the outcome
+"""
+import asyncio
+
+import pytest
+
+from app.bench.corpus import generate_entries
+from app.routes import inference
+from app.schemas import AnalyzeHistoryRequest
+from app.utils.singleflight import SingleFlight, payload_digest
+
+
+def test_concurrent_callers_with_one_key_share_one_computation():
+    flights = SingleFlight('test')
+    calls = []
+
+    async def compute(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {'key': key}
+
+    async def burst():
+        return await asyncio.gather(*(flights.run(key, lambda key=key: compute(key))
+                                      for key in ['a'] * 5 + ['b'] * 3))
+
+    results = asyncio.run(burst())
+    assert sorted(calls) == ['a', 'b']
+    assert all(result is results[0] for result in results[:5])
+    assert all(result is results[5] for result in results[5:])
+    assert flights.inflight == 0
+
+
+def test_failure_reaches_every_caller_and_the_next_call_recomputes():
+    flights = SingleFlight('test')
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def scenario():
+        results = await asyncio.gather(*(flights.run('k', fail) for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        await asyncio.gather(flights.run('k', fail), return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight('test')
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def scenario():
+        leader = asyncio.ensure_future(flights.run('k', compute))
+        follower = asyncio.ensure_future(flights.run('k', compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == 'done'
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(scenario())
+
+
+def test_payload_digest_ignores_key_order():
+    assert payload_digest({'a': 1, 'b': [1, 2]}, 'exact') == payload_digest({'b': [1, 2], 'a': 1}, 'exact')
+    assert payload_digest({'a': 1}, 'exact') != payload_digest({'a': 1}, 'approximate')
+
+
+def test_identical_history_requests_are_analyzed_once(monkeypatch):
+    calls = []
+    run_history_analysis = inference.run_history_analysis
+
+    async def counted(*args, **kwargs):
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return await run_history_analysis(*args, **kwargs)
+
+    monkeypatch.setattr(inference, 'run_history_analysis', counted)
+    monkeypatch.setattr(inference, 'history_flights', SingleFlight('analyze-user-history'))
+    entries = generate_entries(40, seed=9)
+
+    async def burst():
+        same = [inference.analyze_user_history(AnalyzeHistoryRequest(entries=entries))
+                for _ in range(4)]
+        other = inference.analyze_user_history(AnalyzeHistoryRequest(entries=entries[1:]))
+        return await asyncio.gather(*same, other)
+
+    responses = asyncio.run(burst())
+    assert len(calls) == 2
+    assert all(response == responses[0] for response in responses[:4])